@@ -4,6 +4,8 @@
 import os
 import subprocess
 from monitoring.logger import Logger
+from lib.build_context import docker_label_args
+from lib.process import error_output, run_logged
 from builders.plugins.plugin_interface import ArtifactBuilder
 
 class GoBinaryBuilder(ArtifactBuilder):
@@ -20,14 +22,15 @@ class GoBinaryBuilder(ArtifactBuilder):
             cmd = ["go", "build", "-o", output_path, "."]
             self.logger.info(f"Building Go binary for {repo_gh_name}")
             docker_image = artifact.get('docker_image', 'ubuntu:22.04')
-            subprocess.run(
-                    ["docker", "run", "--rm", "-v", f"{repo_path}:{repo_path}", "-v", f"{repo_path}:/app", "-w", "/app", docker_image] + cmd,
+            run_logged(
+                    ["docker", "run", "--rm", *docker_label_args(), "-v", f"{repo_path}:{repo_path}", "-v", f"{repo_path}:/app", "-w", "/app", docker_image] + cmd,
+                "go-build",
                 check=True
             )
             self.logger.info(f"Built Go binary at {output_path}")
             return output_path
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to build Go binary for {repo_name}: {e.stderr.decode()}")
+            self.logger.error(f"Failed to build Go binary for {repo_name}: {error_output(e)}")
             raise
 
     def publish(self, artifact_path: str, repo_gh_name: str, artifact:dict):
@@ -36,12 +39,9 @@ class GoBinaryBuilder(ArtifactBuilder):
         version = artifact.get('version', '1.0')
         self.logger.info(f"Publishing {artifact_path} with checksum {checksum} for {repo_gh_name}")
         try:
-            subprocess.run(
-                ["gh", "release", "create", f"v{version}", "--title", f"Version {version}", "--generate-notes", artifact_path, f"{artifact_path}.sha256"],
-                cwd=os.path.dirname(artifact_path),
-                check=True
-            )
+            self.create_release(version, os.path.dirname(artifact_path), [artifact_path, f"{artifact_path}.sha256"])
             self.logger.info(f"Published {artifact_path} to GitHub Releases")
+            return [artifact_path, f"{artifact_path}.sha256"]
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to publish {artifact_path}: {e.stderr.decode()}")
+            self.logger.error(f"Failed to publish {artifact_path}: {error_output(e)}")
             raise
@@ -4,6 +4,8 @@
 import os
 import subprocess
 from monitoring.logger import Logger
+from lib.build_context import docker_label_args
+from lib.process import error_output, run_logged
 from builders.plugins.plugin_interface import ArtifactBuilder
 
 BUILD_SYSTEMS = {
@@ -53,14 +55,15 @@ class JavaBinaryBuilder(ArtifactBuilder):
         try:
             self.logger.info(f"Building Java artifact using {system} for {repo_gh_name}")
 
-            subprocess.run(
+            run_logged(
                 [
-                    "docker", "run", "--rm",
+                    "docker", "run", "--rm", *docker_label_args(),
                     "-v", f"{repo_path}:{repo_path}",
                     "-v", f"{repo_path}:/app",
                     "-w", "/app",
                     docker_image,
                 ] + cmd,
+                f"{system}-build",
                 check=True
             )
 
@@ -81,7 +84,7 @@ class JavaBinaryBuilder(ArtifactBuilder):
             return output_path
 
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to build Java artifact for {repo_gh_name}: {str(e)}")
+            self.logger.error(f"Failed to build Java artifact for {repo_gh_name}: {error_output(e)}")
             raise
 
     def publish(self, artifact_path: str, repo_gh_name: str, artifact: dict):
@@ -95,20 +98,14 @@ class JavaBinaryBuilder(ArtifactBuilder):
         )
 
         try:
-            subprocess.run(
-                [
-                    "gh", "release", "create",
-                    f"v{version}",
-                    "--title", f"Version {version}",
-                    "--generate-notes",
-                    artifact_path,
-                    f"{artifact_path}.sha256",
-                ],
-                cwd=os.path.dirname(artifact_path),
-                check=True
+            self.create_release(
+                version,
+                os.path.dirname(artifact_path),
+                [artifact_path, f"{artifact_path}.sha256"],
             )
             self.logger.info(f"Published {artifact_path} to GitHub Releases")
+            return [artifact_path, f"{artifact_path}.sha256"]
 
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to publish {artifact_path}: {str(e)}")
+            self.logger.error(f"Failed to publish {artifact_path}: {error_output(e)}")
             raise
@@ -1,15 +1,42 @@
 #  Copyright Contributors to the Mainframe Software Hub for Linux Project.
 #  SPDX-License-Identifier: Apache-2.0
 
+import subprocess
+from lib import resilience
 from abc import ABC, abstractmethod
 
 class ArtifactBuilder(ABC):
+    # Builders that can publish several distro builds together implement publish_variants()
+    supports_distro_matrix = False
+
     @abstractmethod
     def build(self, repo_path: str, repo_name: str, artifact: dict) -> str:
         """Builds the artifact and returns its path."""
         pass
 
     @abstractmethod
-    def publish(self, artifact_path: str, repo_name: str, artifact: dict) -> None:
-        """Publishes the artifact to its destination."""
+    def publish(self, artifact_path: str, repo_name: str, artifact: dict) -> list:
+        """Publishes the artifact to its destination and returns the uploaded file paths."""
         pass
+
+    def clone_paths(self, artifact: dict) -> tuple:
+        """Repository paths build() reads itself, checked out even when the artifact's clone strategy is not full."""
+        return ()
+
+    def create_release(self, version: str, cwd: str, asset_paths: list = ()) -> None:
+        """Creates the release of version, with generated notes, attaching asset_paths."""
+        # Creating a release is not idempotent, so only the circuit breaker applies
+        resilience.call(resilience.GITHUB, subprocess.run,
+            ["gh", "release", "create", f"v{version}", "--title", f"Version {version}", "--generate-notes"] + list(asset_paths),
+            cwd=cwd,
+            check=True,
+            retry=False
+        )
+
+    def upload_release_assets(self, version: str, asset_paths: list, cwd: str) -> None:
+        """Uploads extra files to the existing release of version."""
+        resilience.call(resilience.GITHUB, subprocess.run,
+            ["gh", "release", "upload", f"v{version}", "--clobber"] + asset_paths,
+            cwd=cwd,
+            check=True
+        )
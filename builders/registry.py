@@ -0,0 +1,101 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import importlib
+import threading
+from collections.abc import Mapping
+from monitoring.logger import Logger
+
+ENTRY_POINT_GROUP = "zab.builders"
+# Builder key -> "module.Class". Nothing is imported until a key is looked up.
+BUILTIN_BUILDERS = {
+    'script': 'builders.script.loz_script_builder.ScriptBuilder',
+    'binary_go': 'builders.binary.go_binary_builder.GoBinaryBuilder',
+    'binary_java': 'builders.binary.java_binary_builder.JavaBinaryBuilder',
+}
+
+def _split_target(target: str) -> tuple:
+    """(module, attribute) of "package.module.Class" or the entry point form "package.module:Class"."""
+    if ':' in target:
+        return tuple(target.split(':', 1))
+    return tuple(target.rsplit('.', 1))
+
+class BuilderRegistry(Mapping):
+    """Builder keys mapped to builder classes that are imported on first use.
+
+    Keys come from BUILTIN_BUILDERS, then installed packages advertising a
+    zab.builders entry point, then the "builders" section of the global
+    config, later sources winning: a plugin can replace a built-in builder,
+    and the config has the last word. Each builder is imported and instantiated
+    once, the first time an artifact needs it, and then configured by
+    configure(builder) (e.g. with script repository paths). A builder that
+    fails to import is logged and looked up as missing.
+    """
+
+    def __init__(self, targets: dict = None, configure=None, entry_points: bool = True):
+        self.logger = Logger()
+        self.targets = dict(BUILTIN_BUILDERS)
+        self.targets.update(targets or {})
+        self._configured = set(targets or ())
+        self.configure = configure
+        self._entry_points = entry_points
+        self._instances = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+
+    def _discover(self):
+        """Add entry point builders, once. Only their names are read, nothing is imported."""
+        if not self._entry_points:
+            return
+        self._entry_points = False
+        from importlib.metadata import entry_points
+        for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+            if entry_point.name not in self._configured:
+                self.targets[entry_point.name] = entry_point.value
+
+    def _load(self, key: str):
+        module_name, class_name = _split_target(self.targets[key])
+        try:
+            builder = getattr(importlib.import_module(module_name), class_name)()
+        except (ImportError, AttributeError) as e:
+            self.logger.error(f"Failed to load builder {key}: {e}")
+            self._failed.add(key)
+            return None
+        if self.configure is not None:
+            self.configure(builder)
+        self.logger.info(f"Loaded builder {key} from {module_name}")
+        return builder
+
+    def __getitem__(self, key: str):
+        with self._lock:
+            if key in self._instances:
+                return self._instances[key]
+            # Even for a built-in key, which a plugin may replace
+            self._discover()
+            if key not in self.targets or key in self._failed:
+                raise KeyError(key)
+            builder = self._load(key)
+            if builder is None:
+                raise KeyError(key)
+            self._instances[key] = builder
+            return builder
+
+    def __contains__(self, key) -> bool:
+        """Whether key names a builder, without importing it."""
+        with self._lock:
+            self._discover()
+            return key in self.targets and key not in self._failed
+
+    def __iter__(self):
+        with self._lock:
+            self._discover()
+            return iter([key for key in self.targets if key not in self._failed])
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
+
+    @property
+    def loaded(self) -> list:
+        """Keys of the builders imported so far."""
+        with self._lock:
+            return list(self._instances)
@@ -4,9 +4,16 @@
 import os
 import subprocess
 from monitoring.logger import Logger
+from lib import resilience
+from lib.disk_gc import record_image_use
+from lib.build_context import docker_label_args, pinned_script_repo
+from lib.process import error_output, run_logged
+from lib.script_cache import DEFAULT_SCRIPT_REPO
 from builders.plugins.plugin_interface import ArtifactBuilder
 
 class ScriptBuilder(ArtifactBuilder):
+    supports_distro_matrix = True
+
     def __init__(self):
         self.logger = Logger()
         self.script_repo_paths = {}  # Will be set by BuildOrchestrator
@@ -21,16 +28,31 @@ class ScriptBuilder(ArtifactBuilder):
         output, _ = p2.communicate()
         return output.strip()
 
+    def _recompress_assets(self, tarball_path: str, recompress: dict) -> list:
+        from lib.checksum import generate_checksum
+        from lib.compression import recompress_tarballs
+        results = recompress_tarballs([tarball_path], recompress.get('codecs', ['zstd']), recompress.get('levels'))
+        assets = []
+        for result in results:
+            generate_checksum(result['output'])
+            assets += [result['output'], f"{result['output']}.sha256"]
+        return assets
+
+    def clone_paths(self, artifact: dict) -> tuple:
+        script_path = (artifact.get('build_script') or {}).get('path')
+        return (script_path,) if script_path else ()
+
     def build(self, repo_path: str, repo_gh_name: str, artifact: dict) -> str:
         build_script = artifact.get('build_script', {})
         version = artifact.get('version', '1.0')
-        repo_name = build_script.get('repo_name', 'linux-on-ibm-z-scripts')
+        repo_name = build_script.get('repo_name', DEFAULT_SCRIPT_REPO)
         script_path = build_script.get('path')
         if not script_path:
             self.logger.error("No build_script.path specified for ScriptBuilder")
             raise ValueError("build_script.path required")
 
-        script_repo_path = self.script_repo_paths.get(repo_name)
+        # A build keeps the script snapshot it started with, even if the cache has moved on since
+        script_repo_path = pinned_script_repo(repo_name) or self.script_repo_paths.get(repo_name)
         if not script_repo_path:
             self.logger.error(f"Script repository {repo_name} not found in cloned repositories")
             raise ValueError(f"Script repository {repo_name} not found")
@@ -55,13 +77,15 @@ class ScriptBuilder(ArtifactBuilder):
                 docker_pwd = os.environ.get('DOCKER_PASSWORD')
                 gh_token = os.environ.get('GH_TOKEN')
                 gh_push_user = os.environ.get('GH_PUSH_USER')
-                subprocess.run(
-                        ["docker", "run", "--rm", "-e", f"DOCKER_USERNAME={docker_user}", "-e", f"DOCKER_PASSWORD={docker_pwd}", "-e", f"GH_TOKEN={gh_token}", "-e", f"GH_PUSH_USER={gh_push_user}", "-v", "/var/run/docker.sock:/var/run/docker.sock", "-v", f"{repo_path}:{repo_path}", "-v", f"{script_repo_path}:{script_repo_path}", "-w", repo_path, docker_image] + cmd,
+                run_logged(
+                        ["docker", "run", "--rm", *docker_label_args(), "-e", f"DOCKER_USERNAME={docker_user}", "-e", f"DOCKER_PASSWORD={docker_pwd}", "-e", f"GH_TOKEN={gh_token}", "-e", f"GH_PUSH_USER={gh_push_user}", "-v", "/var/run/docker.sock:/var/run/docker.sock", "-v", f"{repo_path}:{repo_path}", "-v", f"{script_repo_path}:{script_repo_path}", "-w", repo_path, docker_image] + cmd,
+                    "build-script",
                     check=True
                 )
             else:
-                subprocess.run(
-                        ["docker", "run", "--rm", "-v", f"{repo_path}:{repo_path}", "-v", f"{repo_path}:/app", "-v", f"{script_repo_path}:{script_repo_path}", "-w", "/app", docker_image] + cmd,
+                run_logged(
+                        ["docker", "run", "--rm", *docker_label_args(), "-v", f"{repo_path}:{repo_path}", "-v", f"{repo_path}:/app", "-v", f"{script_repo_path}:{script_repo_path}", "-w", "/app", docker_image] + cmd,
+                    "build-script",
                     check=True
                 )
             if not os.path.exists(output_path):
@@ -70,16 +94,19 @@ class ScriptBuilder(ArtifactBuilder):
             self.logger.info(f"Built {artifact_type} for {repo_gh_name} using {script_path}")
             return output_path
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to run script {script_path}: {e.stderr.decode()}")
+            self.logger.error(f"Failed to run script {script_path}: {error_output(e)}")
             raise
 
     def publish(self, artifact_path: str, repo_gh_name: str, artifact: dict):
+        return self.publish_variants([artifact_path], repo_gh_name, artifact)
+
+    def _prepare_variant(self, artifact_path: str, repo_gh_name: str, artifact: dict) -> dict:
         from lib.checksum import generate_checksum
         checksum = generate_checksum(artifact_path)
         art_dirname = os.path.dirname(artifact_path)
         version = artifact.get('version', '1.0')
-        artifact_path_with_distro = f"{repo_gh_name}-{version}-linux-s390x.tar.gz"
-        distro_details = "ubuntu-22.04" # Default
+        artifact_path_with_distro = artifact_path
+        distro_details = None
 
         try:
            with open(f"{art_dirname}/.distro_zab.txt", 'r') as file:
@@ -89,58 +116,92 @@ class ScriptBuilder(ArtifactBuilder):
                os.rename(artifact_path, artifact_path_with_distro)
                os.rename(f"{artifact_path}.sha256", f"{artifact_path_with_distro}.sha256")
         except Exception as e:
-           print(f"An error occurred: {e}")
+           self.logger.warning(f"Could not name {artifact_path} after its distro: {e}")
 
-        rpm_path = f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.rpm" if os.path.exists(f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.rpm") else None
-        deb_path = f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.deb" if os.path.exists(f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.deb") else None
-        container_path = f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.container.tar" if os.path.exists(f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.container.tar") else None
-        self.logger.info(f"Publishing {artifact_path} with checksum {checksum}")
-        try:
-            subprocess.run(
-                ["gh", "release", "create", f"v{version}", "--title", f"Version {version}", "--generate-notes", f"{artifact_path_with_distro}", f"{artifact_path_with_distro}.sha256"],
-                cwd=os.path.dirname(artifact_path),
-                check=True
-            )
-            if rpm_path is not None:
-                rpm_path_with_distro = f"{art_dirname}/{repo_gh_name}-{version}-{distro_details}-linux-s390x.rpm"
-                os.rename(rpm_path, rpm_path_with_distro)
-                subprocess.run(
-                    ["gh", "release", "upload", f"v{version}", rpm_path_with_distro],
-                    cwd=os.path.dirname(artifact_path_with_distro),
-                    check=True
-                )
-            if deb_path is not None:
-                deb_path_with_distro = f"{art_dirname}/{repo_gh_name}-{version}-{distro_details}-linux-s390x.deb"
-                os.rename(deb_path, deb_path_with_distro)
-                subprocess.run(
-                    ["gh", "release", "upload", f"v{version}", deb_path_with_distro],
-                    cwd=os.path.dirname(artifact_path_with_distro),
-                    check=True
+        packages = []
+        for extension in ("rpm", "deb"):
+            package_path = f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.{extension}"
+            if os.path.exists(package_path):
+                if distro_details:
+                    package_path_with_distro = f"{art_dirname}/{repo_gh_name}-{version}-{distro_details}-linux-s390x.{extension}"
+                    os.rename(package_path, package_path_with_distro)
+                    package_path = package_path_with_distro
+                packages.append(package_path)
+        container_path = f"{art_dirname}/{repo_gh_name}-{version}-linux-s390x.container.tar"
+
+        release_assets = [artifact_path_with_distro, f"{artifact_path_with_distro}.sha256"]
+        recompress = artifact.get('recompress')
+        if recompress:
+            recompressed_assets = self._recompress_assets(artifact_path_with_distro, recompress)
+            # The .tar.gz stays in the release unless explicitly dropped, for existing consumers
+            release_assets = release_assets + recompressed_assets if recompress.get('keep_gz', True) else recompressed_assets
+        return {
+            'checksum': checksum,
+            'distro': distro_details,
+            'release_assets': release_assets,
+            'packages': packages,
+            'container_path': container_path if os.path.exists(container_path) else None,
+        }
+
+    def publish_variants(self, artifact_paths: list, repo_gh_name: str, artifact: dict):
+        """Publishes the tarballs of several distro builds to one release in a single pass.
+
+        Variants whose tarball is byte-identical to an earlier one are not
+        uploaded again.
+        """
+        version = artifact.get('version', '1.0')
+        release_assets = []
+        packages = []
+        container_paths = []
+        published_checksums = {}
+        for artifact_path in artifact_paths:
+            variant = self._prepare_variant(artifact_path, repo_gh_name, artifact)
+            if variant['checksum'] in published_checksums:
+                self.logger.info(
+                    f"Skipping {variant['distro']} variant of {repo_gh_name}, identical to {published_checksums[variant['checksum']]}"
                 )
-            if container_path is not None:
-                registry = artifact.get('registry', 'ghcr.io')
-                image_name = artifact.get('image_name', repo_gh_name)
-                gh_token = os.environ.get('GH_TOKEN')
-                gh_push_user = os.environ.get('GH_PUSH_USER') # linuxonzapps, for example
-                docker_login_p1 = ["echo", f"{gh_token}"]
-                docker_login_p2 = ["docker", "login", f"{registry}", "-u", gh_push_user, "--password-stdin"]
-                docker_exec_pipe = self.execute_pipe_command(docker_login_p1, docker_login_p2)
-                self.logger.info(f"docker login returned with: {docker_exec_pipe}")
-                # Load image from tar
-                load_cmd = ["docker", "load", "-i", container_path]
-                # Obtain image tag and retag it with registry
-                extract_image_tag_p1 = ["tar", "-xOf", f"{container_path}", "manifest.json"]
-                extract_image_tag_p2 = ["jq", ".[].RepoTags[]"]
-                image_tag = self.execute_pipe_command(extract_image_tag_p1, extract_image_tag_p2).strip('"')
-                self.logger.info(f"Container image: {image_tag}")
-                # Tag the image - e.g., docker tag $image_tag $registry/linuxonzapps/$image_tag
-                image_tag_cmd = ["docker", "tag", f"{image_tag}", f"{registry}/{gh_push_user}/{image_tag}"]
-                result = subprocess.run(image_tag_cmd, check=True, capture_output=True)
-                # Push to registry
-                push_cmd = ["docker", "push", f"{registry}/{gh_push_user}/{image_tag}"]
-                subprocess.run(push_cmd, check=True, capture_output=True)
-                self.logger.info(f"Published container image to {registry}/{gh_push_user}/{image_tag}")
-            self.logger.info(f"Published {artifact_path} to GitHub Releases")
+                continue
+            published_checksums[variant['checksum']] = variant['distro']
+            self.logger.info(f"Publishing {artifact_path} with checksum {variant['checksum']}")
+            release_assets += variant['release_assets']
+            packages += variant['packages']
+            if variant['container_path'] is not None:
+                container_paths.append(variant['container_path'])
+
+        release_dir = os.path.dirname(artifact_paths[0])
+        try:
+            self.create_release(version, release_dir, release_assets)
+            if packages:
+                self.upload_release_assets(version, packages, release_dir)
+            for container_path in container_paths:
+                self._push_container(container_path, repo_gh_name, artifact)
+            self.logger.info(f"Published {len(published_checksums)} variants of {repo_gh_name} to GitHub Releases")
+            return release_assets + packages
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Failed to publish {artifact_path}: {e.stderr.decode()}")
+            self.logger.error(f"Failed to publish {repo_gh_name} {version}: {error_output(e)}")
             raise
+
+    def _push_container(self, container_path: str, repo_gh_name: str, artifact: dict):
+        registry = artifact.get('registry', 'ghcr.io')
+        image_name = artifact.get('image_name', repo_gh_name)
+        gh_token = os.environ.get('GH_TOKEN')
+        gh_push_user = os.environ.get('GH_PUSH_USER') # linuxonzapps, for example
+        docker_login_p1 = ["echo", f"{gh_token}"]
+        docker_login_p2 = ["docker", "login", f"{registry}", "-u", gh_push_user, "--password-stdin"]
+        docker_exec_pipe = self.execute_pipe_command(docker_login_p1, docker_login_p2)
+        self.logger.info(f"docker login returned with: {docker_exec_pipe}")
+        # Load image from tar
+        load_cmd = ["docker", "load", "-i", container_path]
+        # Obtain image tag and retag it with registry
+        extract_image_tag_p1 = ["tar", "-xOf", f"{container_path}", "manifest.json"]
+        extract_image_tag_p2 = ["jq", ".[].RepoTags[]"]
+        image_tag = self.execute_pipe_command(extract_image_tag_p1, extract_image_tag_p2).strip('"')
+        self.logger.info(f"Container image: {image_tag}")
+        # Tag the image - e.g., docker tag $image_tag $registry/linuxonzapps/$image_tag
+        image_tag_cmd = ["docker", "tag", f"{image_tag}", f"{registry}/{gh_push_user}/{image_tag}"]
+        result = subprocess.run(image_tag_cmd, check=True, capture_output=True)
+        # Push to registry
+        push_cmd = ["docker", "push", f"{registry}/{gh_push_user}/{image_tag}"]
+        resilience.call(registry, subprocess.run, push_cmd, check=True, capture_output=True)
+        record_image_use(image_tag, f"{registry}/{gh_push_user}/{image_tag}")
+        self.logger.info(f"Published container image to {registry}/{gh_push_user}/{image_tag}")
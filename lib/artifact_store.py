@@ -0,0 +1,203 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from monitoring.logger import Logger
+from lib.sizes import format_size
+
+DEFAULT_STORE_DIR = "/tmp/zab-artifacts"
+DEFAULT_MAX_SIZE = "20G"
+
+def file_digest(path: str) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(block)
+    return sha256_hash.hexdigest()
+
+class ArtifactStore:
+    """Content-addressed store for published artifacts.
+
+    Layout under root:
+        objects/<aa>/<sha256>                  one read-only copy per unique content
+        views/<repo>/<version>/<distro>/<file>  hardlinks to objects
+        index.json                              entries and object sizes/last use
+
+    Byte-identical artifacts (e.g. from several distros) share one object.
+    """
+
+    def __init__(self, root: str = DEFAULT_STORE_DIR):
+        self.root = root
+        self.logger = Logger()
+        self._digests = {}
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "views"), exist_ok=True)
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.root, "index.json")
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.root, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"objects": {}, "entries": []}
+
+    def _write_index(self, index: dict):
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _view_path(self, repo_name: str, version: str, distro: str, filename: str) -> str:
+        return os.path.join(self.root, "views", repo_name, version, distro, filename)
+
+    def digest(self, path: str) -> str:
+        """SHA256 of path, memoised on (path, size, mtime) to avoid rehashing large tarballs."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(path)
+        return self._digests[key]
+
+    def object_path(self, digest: str) -> str:
+        """Path of the object with digest, None if the store does not hold it."""
+        object_path = self._object_path(digest)
+        return object_path if os.path.exists(object_path) else None
+
+    def put(self, path: str, repo_name: str, version: str, distro: str = "default", commit: str = None,
+            filename: str = None) -> str:
+        """Add a file to the store and link it under its named view (filename, default its own name). Returns its digest."""
+        digest = self.digest(path)
+        object_path = self._object_path(digest)
+        filename = filename or os.path.basename(path)
+        with self._locked():
+            if not os.path.exists(object_path):
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                tmp_path = f"{object_path}.tmp"
+                # A copy, not a hardlink: the caller's file stays its own, and writes to it cannot reach the object
+                try:
+                    subprocess.run(["cp", "--reflink=auto", path, tmp_path], check=True, capture_output=True)
+                except (subprocess.CalledProcessError, OSError):
+                    shutil.copyfile(path, tmp_path)
+                os.chmod(tmp_path, 0o444)
+                os.replace(tmp_path, object_path)
+            view_path = self._view_path(repo_name, version, distro, filename)
+            os.makedirs(os.path.dirname(view_path), exist_ok=True)
+            if os.path.lexists(view_path):
+                os.remove(view_path)
+            os.link(object_path, view_path)
+
+            index = self._read_index()
+            now = time.time()
+            index["objects"][digest] = {"size": os.path.getsize(object_path), "last_used": now}
+            index["entries"] = [
+                e for e in index["entries"]
+                if (e["repo"], e["version"], e["distro"], e["filename"]) != (repo_name, version, distro, filename)
+            ]
+            index["entries"].append({
+                "repo": repo_name,
+                "version": version,
+                "distro": distro,
+                "filename": filename,
+                "digest": digest,
+                "commit": commit,
+                "added": now,
+            })
+            self._write_index(index)
+        self.logger.info(f"Stored {filename} for {repo_name} {version} ({distro}) as {digest[:12]}")
+        return digest
+
+    def lookup(self, repo_name: str, version: str = None, distro: str = None) -> list:
+        """Entries for a repository, optionally narrowed by version and distro, newest first."""
+        entries = [
+            dict(e, path=self._view_path(e["repo"], e["version"], e["distro"], e["filename"]))
+            for e in self._read_index()["entries"]
+            if e["repo"] == repo_name
+            and (version is None or e["version"] == version)
+            and (distro is None or e["distro"] == distro)
+        ]
+        return sorted(entries, key=lambda e: e["added"], reverse=True)
+
+    def touch(self, digests: list):
+        """Mark objects as used so garbage collection keeps them longer."""
+        with self._locked():
+            index = self._read_index()
+            now = time.time()
+            for digest in digests:
+                if digest in index["objects"]:
+                    index["objects"][digest]["last_used"] = now
+            self._write_index(index)
+
+    def previous(self, repo_name: str, version: str, path: str):
+        """Return (version, path) of the newest stored counterpart of path, or None.
+
+        Counterparts have the same file name with the version substituted.
+        A stored file identical to path itself is skipped.
+        """
+        filename = os.path.basename(path)
+        digest = self.digest(path)
+        for entry in self.lookup(repo_name):
+            if entry["filename"] == filename.replace(version, entry["version"]) and entry["digest"] != digest:
+                self.touch([entry["digest"]])
+                return entry["version"], entry["path"]
+        return None
+
+    def total_size(self) -> int:
+        return sum(o["size"] for o in self._read_index()["objects"].values())
+
+    def gc(self, max_bytes: int) -> int:
+        """Evict least recently used objects until the store fits in max_bytes. Returns bytes freed."""
+        freed = 0
+        with self._locked():
+            index = self._read_index()
+            total = sum(o["size"] for o in index["objects"].values())
+            evicted = set()
+            for digest, obj in sorted(index["objects"].items(), key=lambda item: item[1]["last_used"]):
+                if total - freed <= max_bytes:
+                    break
+                evicted.add(digest)
+                freed += obj["size"]
+            if not evicted:
+                return 0
+            for entry in index["entries"]:
+                if entry["digest"] in evicted:
+                    view_path = self._view_path(entry["repo"], entry["version"], entry["distro"], entry["filename"])
+                    if os.path.lexists(view_path):
+                        os.remove(view_path)
+                    self._prune_empty_dirs(os.path.dirname(view_path))
+            for digest in evicted:
+                object_path = self._object_path(digest)
+                if os.path.exists(object_path):
+                    os.remove(object_path)
+                del index["objects"][digest]
+            index["entries"] = [e for e in index["entries"] if e["digest"] not in evicted]
+            self._write_index(index)
+        self.logger.info(f"Artifact store GC evicted {len(evicted)} objects, freed {format_size(freed)}")
+        return freed
+
+    def _prune_empty_dirs(self, directory: str):
+        views_root = os.path.join(self.root, "views")
+        while directory != views_root and os.path.isdir(directory) and not os.listdir(directory):
+            os.rmdir(directory)
+            directory = os.path.dirname(directory)
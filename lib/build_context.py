@@ -0,0 +1,106 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import contextvars
+import subprocess
+import threading
+import uuid
+from contextlib import contextmanager
+from monitoring.logger import Logger
+
+LABEL_KEY = "zab.build"
+
+_current_build = contextvars.ContextVar("zab_build", default=None)
+
+class BuildCancelled(Exception):
+    """Raised at a checkpoint of a build that was superseded by a newer commit."""
+
+class BuildHandle:
+    """One in-flight build of a repository branch.
+
+    Every container the build starts carries the label zab.build=<id>, so
+    cancel() can kill them without tracking container ids.
+    """
+
+    def __init__(self, repo_name: str, branch: str, sha: str = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.repo_name = repo_name
+        self.branch = branch
+        self.sha = sha
+        # Script repository snapshots the build started with: name -> (path, sha)
+        self.script_repos = {}
+        # The clone the build works in, once checked out
+        self.repo_path = None
+        # Where its clone and workspaces go: the ramdisk, or None for the temp dir
+        self.workspace_dir = None
+        self.reason = None
+        self._cancelled = threading.Event()
+        self.logger = Logger()
+
+    @property
+    def label(self) -> str:
+        return f"{LABEL_KEY}={self.id}"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise BuildCancelled(self.reason)
+
+    def cancel(self, reason: str):
+        """Stop the build: later checkpoints raise BuildCancelled and its running containers are killed."""
+        self.reason = reason
+        self._cancelled.set()
+        self.logger.warning(f"Cancelling build {self.id} of {self.repo_name}@{self.branch}: {reason}")
+        try:
+            result = subprocess.run(["docker", "ps", "-q", "--filter", f"label={self.label}"],
+                                    check=True, capture_output=True, text=True)
+            container_ids = result.stdout.split()
+            if container_ids:
+                subprocess.run(["docker", "kill"] + container_ids, check=True, capture_output=True)
+                self.logger.info(f"Killed {len(container_ids)} containers of build {self.id}")
+        except (subprocess.CalledProcessError, OSError) as e:
+            # The checkpoints still keep the build from publishing
+            self.logger.warning(f"Failed to kill containers of build {self.id}: {e}")
+
+def current_build() -> BuildHandle:
+    """Handle of the build running in this context, or None outside a repository build."""
+    return _current_build.get()
+
+@contextmanager
+def build_scope(handle: BuildHandle):
+    token = _current_build.set(handle)
+    try:
+        yield handle
+    finally:
+        _current_build.reset(token)
+
+def pinned_script_repo(name: str) -> str:
+    """Path of the snapshot of script repository name that the current build uses, or None."""
+    handle = _current_build.get()
+    if handle is None or name not in handle.script_repos:
+        return None
+    return handle.script_repos[name][0]
+
+def check_cancelled():
+    handle = _current_build.get()
+    if handle is not None:
+        handle.check()
+
+def docker_label_args() -> list:
+    """Extra `docker run` arguments that tie the container to the current build.
+
+    Raises BuildCancelled if the build was already superseded, so no new
+    container is started for it.
+    """
+    handle = _current_build.get()
+    if handle is None:
+        return []
+    handle.check()
+    return ["--label", handle.label]
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """executor.submit() that runs fn with the caller's build context, which worker threads do not inherit."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
@@ -0,0 +1,104 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import fcntl
+import hashlib
+import json
+import os
+import statistics
+import threading
+import time
+from monitoring.logger import Logger
+from lib.templates import thaw
+
+HISTORY_FILE = "history.jsonl"
+# Builds per artifact that estimates are taken from
+ESTIMATE_WINDOW = 10
+
+def build_key(repo_name: str, sha: str, artifact, script_sha: str = None) -> str:
+    """Identity of one artifact build: the same repository commit built with the same spec (and build scripts)."""
+    identity = {'repo': repo_name, 'sha': sha, 'artifact': thaw(artifact)}
+    if script_sha:
+        identity['scripts'] = script_sha
+    payload = json.dumps(identity, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def artifact_label(artifact, builder_key: str) -> str:
+    return artifact.get('name') or builder_key
+
+class BuildHistory:
+    """Append-only log of artifact builds, one JSON object per line.
+
+    Each record has key, repo, artifact, builder, sha, status ("success" or
+    "failed"), seconds, bytes, peak_memory (of the build containers, if
+    sampled), workspace_bytes (on disk when it finished) and timestamp. Past successes answer whether a build key is
+    already published, how long and how large an artifact's build usually
+    is, and what its regression baseline is.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.logger = Logger()
+        self.lock = threading.Lock()
+        self._records = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _load(self) -> list:
+        if self._records is None:
+            records = []
+            try:
+                with open(self.path, 'r') as f:
+                    for line in f:
+                        try:
+                            records.append(json.loads(line))
+                        except ValueError:
+                            # A torn last line from a killed run
+                            continue
+            except FileNotFoundError:
+                pass
+            self._records = records
+        return self._records
+
+    def records(self, repo_name: str = None, artifact: str = None) -> list:
+        with self.lock:
+            return [r for r in self._load()
+                    if (repo_name is None or r['repo'] == repo_name) and (artifact is None or r['artifact'] == artifact)]
+
+    def record(self, **entry) -> dict:
+        entry.setdefault('timestamp', time.time())
+        line = json.dumps(entry) + "\n"
+        with self.lock:
+            self._load().append(entry)
+            # Other processes (CI shards, the daemon) append to the same file
+            with open(self.path, 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(line)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        return entry
+
+    def succeeded(self, key: str) -> dict:
+        """Latest successful build with key, or None."""
+        with self.lock:
+            for record in reversed(self._load()):
+                if record.get('key') == key and record['status'] == 'success':
+                    return record
+        return None
+
+    def workspace_size(self, repo_name: str, artifact: str) -> int:
+        """Largest workspace of the artifact's recent successful builds, None without one."""
+        sizes = [r['workspace_bytes'] for r in self.records(repo_name, artifact)
+                 if r['status'] == 'success' and r.get('workspace_bytes')][-ESTIMATE_WINDOW:]
+        return max(sizes) if sizes else None
+
+    def estimate(self, repo_name: str, artifact: str) -> dict:
+        """Median seconds and bytes of the artifact's recent successful builds, None for an unknown artifact."""
+        successes = [r for r in self.records(repo_name, artifact) if r['status'] == 'success'][-ESTIMATE_WINDOW:]
+        if not successes:
+            return None
+        return {
+            'seconds': statistics.median(r['seconds'] for r in successes),
+            'bytes': int(statistics.median(r.get('bytes', 0) for r in successes)),
+            'samples': len(successes),
+        }
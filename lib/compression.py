@@ -0,0 +1,127 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import json
+import os
+import shutil
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from monitoring.logger import Logger
+
+CODECS = {
+    "zstd": {
+        "extension": ".tar.zst",
+        "default_level": 19,
+        "command": lambda level, threads: ["zstd", f"-{level}", f"-T{threads}", "--long=27", "-q", "-c"],
+    },
+    "xz": {
+        "extension": ".tar.xz",
+        "default_level": 6,
+        "command": lambda level, threads: ["xz", f"-{level}", f"-T{threads}", "-c"],
+    },
+}
+
+# In the log directory, next to the other logs
+STATS_FILE = "compression_stats.jsonl"
+
+def recompressed_path(tarball_path: str, codec: str) -> str:
+    """Return the path of the <codec> variant of a .tar.gz tarball."""
+    base = tarball_path[:-len(".tar.gz")] if tarball_path.endswith(".tar.gz") else tarball_path
+    return f"{base}{CODECS[codec]['extension']}"
+
+def _decompress_command(tarball_path: str) -> list:
+    # pigz decompresses on a separate reader/writer thread and is a drop-in for gzip
+    gunzip = "pigz" if shutil.which("pigz") else "gzip"
+    return [gunzip, "-dc", tarball_path]
+
+def _recompress_one(tarball_path: str, codec: str, level: int, threads: int) -> dict:
+    output_path = recompressed_path(tarball_path, codec)
+    partial_path = f"{output_path}.partial"
+    start = time.monotonic()
+    try:
+        with open(partial_path, "wb") as out:
+            p1 = subprocess.Popen(_decompress_command(tarball_path), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            p2 = subprocess.Popen(CODECS[codec]["command"](level, threads), stdin=p1.stdout, stdout=out, stderr=subprocess.PIPE)
+            p1.stdout.close()
+            _, codec_err = p2.communicate()
+            _, gunzip_err = p1.communicate()
+        if p1.returncode != 0:
+            raise subprocess.CalledProcessError(p1.returncode, p1.args, stderr=gunzip_err)
+        if p2.returncode != 0:
+            raise subprocess.CalledProcessError(p2.returncode, p2.args, stderr=codec_err)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    seconds = time.monotonic() - start
+    source_bytes = os.path.getsize(tarball_path)
+    output_bytes = os.path.getsize(output_path)
+    return {
+        "source": tarball_path,
+        "output": output_path,
+        "codec": codec,
+        "level": level,
+        "threads": threads,
+        "source_bytes": source_bytes,
+        "output_bytes": output_bytes,
+        "ratio": round(output_bytes / source_bytes, 4) if source_bytes else 0.0,
+        "seconds": round(seconds, 3),
+    }
+
+def recompress_tarballs(tarball_paths: list, codecs: list, levels: dict = None, max_workers: int = None) -> list:
+    """Recompress .tar.gz tarballs to zstd and/or xz in parallel.
+
+    Each tarball is decompressed and piped straight into a multi-threaded
+    encoder, so no uncompressed copy ever touches the disk. The available
+    CPUs are split between the concurrent jobs.
+
+    Args:
+        tarball_paths (list): Paths of the .tar.gz files to recompress.
+        codecs (list): Codec names from CODECS, e.g. ["zstd"].
+        levels (dict): Optional compression level per codec.
+        max_workers (int): Maximum number of concurrent jobs.
+
+    Returns:
+        list: One result dict per output with sizes, ratio and wall time.
+
+    Raises:
+        ValueError: If an unknown codec is requested.
+        subprocess.CalledProcessError: If a compressor fails.
+    """
+    logger = Logger()
+    levels = levels or {}
+    unknown = [codec for codec in codecs if codec not in CODECS]
+    if unknown:
+        logger.error(f"Unsupported compression codecs {unknown}, expected one of {sorted(CODECS)}")
+        raise ValueError(f"Unsupported compression codecs {unknown}")
+
+    jobs = [(path, codec) for path in tarball_paths for codec in codecs]
+    if not jobs:
+        return []
+    workers = min(len(jobs), max_workers or len(jobs))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_recompress_one, path, codec, int(levels.get(codec, CODECS[codec]["default_level"])), threads)
+            for path, codec in jobs
+        ]
+        results = [future.result() for future in futures]
+
+    for result in results:
+        logger.info(
+            f"Recompressed {result['source']} to {result['codec']}: "
+            f"{result['source_bytes']} -> {result['output_bytes']} bytes "
+            f"(ratio {result['ratio']}) in {result['seconds']}s"
+        )
+    _record_stats(results)
+    return results
+
+def _record_stats(results: list):
+    log_dir = Logger().log_dir
+    os.makedirs(log_dir, exist_ok=True)
+    with open(os.path.join(log_dir, STATS_FILE), "a") as f:
+        for result in results:
+            f.write(json.dumps(dict(result, timestamp=time.time())) + "\n")
@@ -0,0 +1,99 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import fnmatch
+import math
+import os
+import subprocess
+from monitoring.logger import Logger
+from lib.artifact_store import ArtifactStore
+
+DEFAULT_PATTERNS = ["*.tar.*", "*_s390x", "*.jar"]
+DELTA_SUFFIX = ".zstpatch"
+APPLY_TOOL_NAME = "apply-delta.sh"
+
+# Shipped as a release asset so users only need zstd (>= 1.4.5) to apply a delta
+APPLY_TOOL = """#!/bin/sh
+# Usage: apply-delta.sh <previous-artifact> <delta> [output]
+# Rebuilds the new artifact from the previous release's artifact and a
+# .zstpatch delta, then verifies it against <output>.sha256 when present.
+set -eu
+if [ "$#" -lt 2 ]; then
+    echo "Usage: $0 <previous-artifact> <delta> [output]" >&2
+    exit 1
+fi
+old="$1"
+delta="$2"
+out="${3:-$(basename "$delta" | sed -e 's/\\.from-.*\\.zstpatch$//')}"
+zstd -q -d --long=31 --patch-from="$old" "$delta" -o "$out"
+if [ -f "$out.sha256" ]; then
+    expected="$(cut -d' ' -f1 < "$out.sha256")"
+    actual="$(sha256sum "$out" | cut -d' ' -f1)"
+    if [ "$expected" != "$actual" ]; then
+        echo "Checksum mismatch for $out" >&2
+        exit 1
+    fi
+fi
+echo "$out"
+"""
+
+def _window_log(*paths) -> int:
+    largest = max(os.path.getsize(p) for p in paths)
+    return min(31, max(27, math.ceil(math.log2(largest + 1))))
+
+def create_delta(old_path: str, new_path: str, delta_path: str, level: int = 19) -> str:
+    """Create a zstd --patch-from delta that turns old_path into new_path.
+
+    Args:
+        old_path (str): Artifact of the previous release.
+        new_path (str): Artifact of the new release.
+        delta_path (str): Where to write the delta.
+        level (int): zstd compression level for the delta.
+
+    Returns:
+        str: The delta path.
+
+    Raises:
+        subprocess.CalledProcessError: If zstd fails.
+    """
+    cmd = ["zstd", "-q", "-f", f"-{level}", f"--long={_window_log(old_path, new_path)}",
+           f"--patch-from={old_path}", new_path, "-o", delta_path]
+    subprocess.run(cmd, check=True, capture_output=True)
+    return delta_path
+
+def create_release_deltas(store: ArtifactStore, repo_name: str, version: str, asset_paths: list, options: dict) -> list:
+    """Create deltas from the previous stored release for each published asset.
+
+    Returns the list of files to upload: deltas, their checksums and the
+    apply tool. An empty list means no previous artifact was stored.
+    """
+    from lib.checksum import generate_checksum
+    logger = Logger()
+    options = options if isinstance(options, dict) else {}
+    patterns = options.get('patterns', DEFAULT_PATTERNS)
+    level = int(options.get('level', 19))
+    uploads = []
+    for path in asset_paths:
+        filename = os.path.basename(path)
+        if filename.endswith(".sha256") or not any(fnmatch.fnmatch(filename, p) for p in patterns):
+            continue
+        previous = store.previous(repo_name, version, path)
+        if previous is None:
+            logger.info(f"No previous artifact stored for {filename}, skipping delta")
+            continue
+        previous_version, previous_path = previous
+        delta_path = f"{path}.from-{previous_version}{DELTA_SUFFIX}"
+        create_delta(previous_path, path, delta_path, level)
+        generate_checksum(delta_path)
+        logger.info(
+            f"Created delta {os.path.basename(delta_path)} ({os.path.getsize(delta_path)} bytes) "
+            f"from {previous_version} for {filename} ({os.path.getsize(path)} bytes)"
+        )
+        uploads += [delta_path, f"{delta_path}.sha256"]
+    if uploads:
+        tool_path = os.path.join(os.path.dirname(uploads[0]), APPLY_TOOL_NAME)
+        with open(tool_path, "w") as f:
+            f.write(APPLY_TOOL)
+        os.chmod(tool_path, 0o755)
+        uploads.append(tool_path)
+    return uploads
@@ -0,0 +1,308 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import fcntl
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from lib.github_api import CLONE_PREFIX, METADATA_PREFIX
+from lib.sizes import format_size, parse_size
+from lib.workspace import WORKSPACE_PREFIX
+from monitoring.logger import Logger
+from monitoring.metrics import GC_FREED_BYTES
+
+CATEGORIES = ("workspaces", "mirrors", "build_cache", "images", "artifact_store", "logs")
+DEFAULT_QUOTAS = {
+    "workspaces": "50G",
+    "mirrors": "5G",
+    # Off unless configured: docker's build cache is shared by the whole host, not only this system's builds
+    "build_cache": None,
+    "images": "30G",
+    "artifact_store": "20G",
+    "logs": "5G",
+}
+# Temporary directories this system creates: clones, metadata clones and artifact workspaces
+TEMP_PREFIXES = (CLONE_PREFIX, METADATA_PREFIX, WORKSPACE_PREFIX)
+# Nothing used more recently than this is evicted, whatever the quota: it may belong to a running build
+DEFAULT_MIN_AGE = 3600
+DEFAULT_INTERVAL = 1800
+DEFAULT_STATE_DIR = "/tmp/zab-gc"
+IMAGES_FILE = "images.json"
+
+class DiskEntry:
+    """Something that can be evicted: its size in bytes and when it was last used."""
+
+    def __init__(self, name: str, size: int, last_used: float, remove):
+        self.name = name
+        self.size = size
+        self.last_used = last_used
+        self.remove = remove
+
+def tree_usage(path: str) -> tuple:
+    """(bytes on disk, newest mtime) of everything under path, without following symlinks."""
+    total = 0
+    newest = 0.0
+    stack = [path]
+    while stack:
+        current = stack.pop()
+        try:
+            info = os.lstat(current)
+        except FileNotFoundError:
+            continue
+        total += info.st_blocks * 512
+        newest = max(newest, info.st_mtime)
+        # An overlay workspace's mount shows its lower layer, which is counted where it lives
+        if os.path.isdir(current) and not os.path.islink(current) and not (current != path and os.path.ismount(current)):
+            try:
+                stack.extend(os.path.join(current, name) for name in os.listdir(current))
+            except OSError:
+                continue
+    return total, newest
+
+def _remove_path(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Overlay workspaces left mounted: remove the mount, not the files of its lower layer
+        for name in os.listdir(path):
+            if os.path.ismount(os.path.join(path, name)):
+                subprocess.run(["umount", os.path.join(path, name)], check=True, capture_output=True)
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+class ImageLedger:
+    """When this system last used each docker image, so images can be evicted by last use.
+
+    docker does not record when an image was last run. Only images in the
+    ledger are ever removed, so images other workloads on the host pulled
+    are left alone.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    @contextmanager
+    def _locked(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(f"{self.path}.lock", "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write(self, images: dict):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(images, f)
+        os.replace(tmp_path, self.path)
+
+    def touch(self, *images: str, now: float = None):
+        now = time.time() if now is None else now
+        with self._locked():
+            ledger = self._read()
+            ledger.update({image: now for image in images if image})
+            self._write(ledger)
+
+    def images(self) -> dict:
+        with self._locked():
+            return self._read()
+
+    def forget(self, image: str):
+        with self._locked():
+            ledger = self._read()
+            if ledger.pop(image, None) is not None:
+                self._write(ledger)
+
+_ledger = ImageLedger(os.path.join(DEFAULT_STATE_DIR, IMAGES_FILE))
+
+def configure_images(state_dir: str):
+    global _ledger
+    _ledger = ImageLedger(os.path.join(state_dir, IMAGES_FILE))
+
+def record_image_use(*images: str):
+    """Note that images were just used by a build, for eviction by last use."""
+    try:
+        _ledger.touch(*images)
+    except OSError as e:
+        Logger().warning(f"Failed to record use of images {', '.join(images)}: {e}")
+
+def image_size(image: str) -> int:
+    """Size of a local image in bytes, None if docker does not have it."""
+    result = subprocess.run(["docker", "image", "inspect", "--format", "{{.Size}}", image], capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    try:
+        return int(result.stdout.strip())
+    except ValueError:
+        return None
+
+class DiskCollector:
+    """Keeps each category of disk use this system causes under its quota.
+
+    Categories:
+        workspaces      clones and artifact workspaces left in the temp dirs
+                        (TEMP_PREFIXES) by failed or killed runs
+        mirrors         script repository snapshots other than the current ones
+        build_cache     the docker build cache, pruned by docker itself. Build cache
+                        records carry no labels to filter on, so this prunes the
+                        cache of every build on the host; off unless given a quota
+        images          docker images that builds used (see ImageLedger)
+        artifact_store  objects in the artifact store, by its own LRU
+        logs            per-build logs and command output under the log directory
+
+    Within a category the least recently used entries are evicted first,
+    until the category fits its quota. Entries used within min_age, and
+    protected paths, are never evicted.
+    """
+
+    def __init__(self, quotas: dict = None, min_age: float = DEFAULT_MIN_AGE, temp_dirs: tuple = None,
+                 script_cache=None, artifact_store=None, log_dir: str = None, clock=time.time):
+        self.quotas = {category: parse_size(quota) for category, quota in {**DEFAULT_QUOTAS, **(quotas or {})}.items()
+                       if quota is not None}
+        unknown = set(self.quotas) - set(CATEGORIES)
+        if unknown:
+            raise ValueError(f"Unknown gc categories {', '.join(sorted(unknown))}, expected some of {', '.join(CATEGORIES)}")
+        self.min_age = min_age
+        # The system temp dir, and the ramdisk if builds use one
+        self.temp_dirs = tuple(temp_dirs) if temp_dirs else (tempfile.gettempdir(),)
+        self.script_cache = script_cache
+        self.artifact_store = artifact_store
+        self.log_dir = log_dir
+        self.clock = clock
+        self.logger = Logger()
+        # Collections from the background thread and a pre-run step must not overlap
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def collect(self, categories: tuple = CATEGORIES, protected=()) -> dict:
+        """Evict what is over quota in categories. Returns bytes freed per category."""
+        protected = {os.path.realpath(path) for path in protected if path}
+        freed = {}
+        with self._lock:
+            for category in categories:
+                if category not in self.quotas:
+                    continue
+                try:
+                    freed[category] = getattr(self, f"_collect_{category}")(self.quotas[category], protected)
+                except (subprocess.SubprocessError, OSError, ValueError) as e:
+                    self.logger.warning(f"Garbage collection of {category} failed: {e}")
+                    continue
+                if freed[category]:
+                    GC_FREED_BYTES.labels(category=category).inc(freed[category])
+        return freed
+
+    def _evict(self, category: str, entries: list, quota: int, protected: set) -> int:
+        total = sum(entry.size for entry in entries)
+        if total <= quota:
+            return 0
+        cutoff = self.clock() - self.min_age
+        freed = 0
+        evicted = 0
+        for entry in sorted(entries, key=lambda entry: entry.last_used):
+            if total - freed <= quota:
+                break
+            if entry.last_used > cutoff or os.path.realpath(entry.name) in protected:
+                continue
+            try:
+                entry.remove()
+            except (subprocess.CalledProcessError, OSError) as e:
+                self.logger.warning(f"Failed to evict {entry.name} from {category}: {e}")
+                continue
+            freed += entry.size
+            evicted += 1
+        if total - freed > quota:
+            self.logger.warning(f"{category} uses {format_size(total - freed)}, over its quota of {format_size(quota)}, "
+                                f"but the rest was used within the last {self.min_age:.0f}s")
+        self.logger.info(f"GC evicted {evicted} {category} entries, freed {format_size(freed)}")
+        return freed
+
+    def _path_entries(self, paths: list) -> list:
+        entries = []
+        for path in paths:
+            size, last_used = tree_usage(path)
+            entries.append(DiskEntry(path, size, last_used, lambda path=path: _remove_path(path)))
+        return entries
+
+    def _collect_workspaces(self, quota: int, protected: set) -> int:
+        paths = [entry.path for temp_dir in self.temp_dirs if os.path.isdir(temp_dir) for entry in os.scandir(temp_dir)
+                 if entry.name.startswith(TEMP_PREFIXES) and entry.is_dir(follow_symlinks=False)]
+        return self._evict("workspaces", self._path_entries(paths), quota, protected)
+
+    def _collect_mirrors(self, quota: int, protected: set) -> int:
+        if self.script_cache is None:
+            return 0
+        entries = []
+        for name, path in self.script_cache.stale_snapshots():
+            size, last_used = tree_usage(path)
+            entries.append(DiskEntry(path, size, last_used,
+                                     lambda name=name, path=path: self.script_cache.remove_snapshot(name, path)))
+        return self._evict("mirrors", entries, quota, protected)
+
+    def _collect_logs(self, quota: int, protected: set) -> int:
+        if not self.log_dir:
+            return 0
+        paths = []
+        for subdir in ("builds", "commands"):
+            directory = os.path.join(self.log_dir, subdir)
+            if os.path.isdir(directory):
+                paths += [entry.path for entry in os.scandir(directory)]
+        return self._evict("logs", self._path_entries(paths), quota, protected)
+
+    def _collect_images(self, quota: int, protected: set) -> int:
+        entries = []
+        for image, last_used in _ledger.images().items():
+            size = image_size(image)
+            if size is None:
+                # Removed by someone else
+                _ledger.forget(image)
+                continue
+            entries.append(DiskEntry(image, size, last_used, lambda image=image: self._remove_image(image)))
+        return self._evict("images", entries, quota, protected)
+
+    @staticmethod
+    def _remove_image(image: str):
+        # No --force: docker refuses to remove images that containers still use
+        subprocess.run(["docker", "image", "rm", image], check=True, capture_output=True)
+        _ledger.forget(image)
+
+    def _collect_artifact_store(self, quota: int, protected: set) -> int:
+        if self.artifact_store is None:
+            return 0
+        return self.artifact_store.gc(quota)
+
+    def _collect_build_cache(self, quota: int, protected: set) -> int:
+        # docker keeps its own last-use times for build cache records and evicts by them. They cannot be
+        # filtered by label, so this evicts the cache of other builds on the host as well
+        result = subprocess.run(["docker", "builder", "prune", "--force", "--keep-storage", str(quota)],
+                                check=True, capture_output=True, text=True)
+        match = re.search(r"Total reclaimed space:\s*(\S+)", result.stdout)
+        freed = parse_size(match.group(1)) if match else 0
+        self.logger.info(f"GC pruned the docker build cache to {format_size(quota)}, freed {format_size(freed)}")
+        return freed
+
+    def start_background(self, interval: float = DEFAULT_INTERVAL, protected=lambda: ()):
+        """Collect every interval seconds in a daemon thread, sparing the paths protected() returns at the time."""
+        def loop():
+            while not self._stopping.wait(interval):
+                self.collect(protected=protected())
+        self._thread = threading.Thread(target=loop, name="disk-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
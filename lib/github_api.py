@@ -2,24 +2,156 @@
 #  SPDX-License-Identifier: Apache-2.0
 
 import os
+import shutil
 import subprocess
 import tempfile
+from lib import resilience
 from monitoring.logger import Logger
 
+def clone_into(cmd: list, target_dir: str):
+    """Run a git clone command into target_dir, starting from an empty directory so it can be retried."""
+    # A failed attempt can leave a partial checkout behind, git refuses to clone into it
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.makedirs(target_dir)
+    subprocess.run(cmd, check=True, capture_output=True)
+
+CLONE_PREFIX = "zab-clone-"
+METADATA_PREFIX = "zab-meta-"
+# How much of a repository a build checks out, narrowest first:
+#   metadata  commit and trees, plus only the files the builder itself reads
+#   sparse    ... plus the paths the artifact lists
+#   full      the whole tree
+CLONE_STRATEGIES = ("metadata", "sparse", "full")
+
+def sparse_patterns(paths) -> list:
+    """Non-cone sparse-checkout patterns for repository paths, anchored at the top of the tree."""
+    return sorted({"/" + path.strip("/") for path in paths if path.strip("/")})
+
+def widest_checkout(layouts) -> tuple:
+    """The (strategy, paths) that covers every (strategy, paths) of layouts."""
+    strategy = CLONE_STRATEGIES[0]
+    paths = set()
+    for layout_strategy, layout_paths in layouts:
+        if layout_strategy not in CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy {layout_strategy}, expected one of {', '.join(CLONE_STRATEGIES)}")
+        strategy = max(strategy, layout_strategy, key=CLONE_STRATEGIES.index)
+        paths.update(layout_paths)
+    return strategy, () if strategy == "full" else tuple(sorted(paths))
+
 class GitHubRepo:
     def __init__(self, repo_url: str):
         self.repo_url = repo_url
         self.logger = Logger()
 
-    def clone(self, commit: str = "main") -> str:
-        temp_dir = tempfile.mkdtemp()
-        cmd = ["git", "clone", "--depth", "1", "--branch", commit, self.repo_url, temp_dir]
+    def clone(self, commit: str = "main", strategy: str = "full", paths=(), parent_dir: str = None) -> str:
+        """Shallow clone of commit into parent_dir (default the temp dir). Other than full, a blob-less clone that checks out only paths.
+
+        Files outside paths are not downloaded at all, which matters for
+        huge repositories whose builds fetch their sources themselves.
+        """
+        if strategy not in CLONE_STRATEGIES:
+            raise ValueError(f"Unknown clone strategy {strategy}, expected one of {', '.join(CLONE_STRATEGIES)}")
+        temp_dir = tempfile.mkdtemp(prefix=CLONE_PREFIX, dir=parent_dir)
+        if strategy == "full":
+            cmd = ["git", "clone", "--depth", "1", "--branch", commit, self.repo_url, temp_dir]
+        else:
+            # --sparse checks out only top-level files until the patterns are set
+            cmd = ["git", "clone", "--depth", "1", "--filter=blob:none", "--sparse", "--branch", commit, self.repo_url, temp_dir]
         try:
-            subprocess.run(cmd, check=True, capture_output=True)
-            self.logger.info(f"Cloned {self.repo_url} at commit {commit}")
+            resilience.call(self.repo_url, clone_into, cmd, temp_dir)
+            if strategy != "full":
+                self._set_sparse(temp_dir, paths)
+            self.logger.info(f"Cloned {self.repo_url} at commit {commit}" + ("" if strategy == "full" else
+                             f" ({strategy}, {len(sparse_patterns(paths))} paths)"))
             cmd = ["chmod", "-R", "777", temp_dir]
             subprocess.run(cmd, check=True, capture_output=True)
             return temp_dir
+        except Exception as e:
+            # Including a failed sparse checkout or an open breaker, nothing of the clone is left behind
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if isinstance(e, subprocess.CalledProcessError):
+                self.logger.error(f"Clone failed: {(e.stderr or b'').decode(errors='replace')}")
+            raise
+
+    def clone_metadata(self, commit: str = "main") -> str:
+        """Shallow clone of commit without a checkout or file contents.
+
+        Trees are there, so paths can be checked with has_path(); blobs are
+        fetched one at a time by read_file().
+        """
+        temp_dir = tempfile.mkdtemp(prefix=METADATA_PREFIX)
+        cmd = ["git", "clone", "--depth", "1", "--filter=blob:none", "--no-checkout", "--branch", commit, self.repo_url, temp_dir]
+        try:
+            resilience.call(self.repo_url, clone_into, cmd, temp_dir)
+            return temp_dir
+        except Exception:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+    def _set_sparse(self, repo_path: str, paths):
+        # Blobs of the paths are fetched from the remote during the checkout
+        resilience.call(self.repo_url, subprocess.run,
+                        ["git", "-C", repo_path, "sparse-checkout", "set", "--no-cone", "--", *sparse_patterns(paths)],
+                        check=True, capture_output=True)
+
+    def sparse_paths(self, repo_path: str) -> list:
+        """Sparse-checkout patterns of a clone, None if it has the whole tree."""
+        result = subprocess.run(["git", "-C", repo_path, "config", "--get", "core.sparseCheckout"], capture_output=True, text=True)
+        if result.returncode != 0 or result.stdout.strip() != "true":
+            return None
+        result = subprocess.run(["git", "-C", repo_path, "sparse-checkout", "list"], check=True, capture_output=True, text=True)
+        return result.stdout.split()
+
+    def widen(self, repo_path: str, strategy: str, paths=()) -> str:
+        """Check out more of a clone if it lacks something strategy and paths need. Never narrows it."""
+        current = self.sparse_paths(repo_path)
+        if current is None:
+            return repo_path
+        try:
+            if strategy == "full":
+                resilience.call(self.repo_url, subprocess.run, ["git", "-C", repo_path, "sparse-checkout", "disable"],
+                                check=True, capture_output=True)
+                self.logger.info(f"Widened clone of {self.repo_url} in {repo_path} to the full tree")
+            elif not set(sparse_patterns(paths)) <= set(current):
+                self._set_sparse(repo_path, current + list(paths))
+                self.logger.info(f"Widened clone of {self.repo_url} in {repo_path} to {len(sparse_patterns(current + list(paths)))} paths")
         except subprocess.CalledProcessError as e:
-            self.logger.error(f"Clone failed: {e.stderr.decode()}")
+            self.logger.error(f"Widening clone failed: {e.stderr.decode()}")
             raise
+        return repo_path
+
+    def has_path(self, repo_path: str, path: str) -> bool:
+        result = subprocess.run(["git", "-C", repo_path, "cat-file", "-e", f"HEAD:{path}"], capture_output=True)
+        return result.returncode == 0
+
+    def read_file(self, repo_path: str, path: str) -> str:
+        """Contents of path at HEAD, or None if the commit does not have it."""
+        if not self.has_path(repo_path, path):
+            return None
+        result = resilience.call(self.repo_url, subprocess.run, ["git", "-C", repo_path, "show", f"HEAD:{path}"],
+                                 check=True, capture_output=True, text=True)
+        return result.stdout
+
+    def update(self, repo_path: str, commit: str = "main") -> str:
+        """Move an existing clone to commit, keeping ignored files such as build caches."""
+        fetch_cmd = ["git", "-C", repo_path, "fetch", "--depth", "1", "origin", commit]
+        cmds = [
+            ["git", "-C", repo_path, "checkout", "--force", "FETCH_HEAD"],
+            # Untracked outputs of the previous build go, .gitignore'd caches stay
+            ["git", "-C", repo_path, "clean", "-fd"],
+            ["chmod", "-R", "777", repo_path],
+        ]
+        try:
+            resilience.call(self.repo_url, subprocess.run, fetch_cmd, check=True, capture_output=True)
+            for cmd in cmds:
+                subprocess.run(cmd, check=True, capture_output=True)
+            self.logger.info(f"Updated clone of {self.repo_url} in {repo_path} to {commit}")
+            return repo_path
+        except subprocess.CalledProcessError as e:
+            self.logger.error(f"Updating clone failed: {e.stderr.decode()}")
+            raise
+
+    def head(self, repo_path: str) -> str:
+        """Commit sha checked out (or, in a metadata clone, pointed to) by HEAD."""
+        result = subprocess.run(["git", "-C", repo_path, "rev-parse", "HEAD"], check=True, capture_output=True, text=True)
+        return result.stdout.strip()
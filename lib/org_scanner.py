@@ -0,0 +1,209 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from lib import resilience
+from monitoring.logger import Logger
+
+API_URL = "https://api.github.com"
+DEFAULT_CACHE_DIR = "/tmp/zab-github-cache"
+TEMPLATE_FILE = ".build-template.yaml"
+PER_PAGE = 100
+# Repositories looked up per GraphQL query, well below the node limit
+GRAPHQL_BATCH = 50
+RATE_LIMIT_RETRIES = 5
+NETWORK_ERRORS = (requests.ConnectionError, requests.Timeout)
+
+class GraphQLError(Exception):
+    """A GraphQL query answered with errors and nothing usable."""
+
+class OrgScanner:
+    """Lists an organization's repositories that carry a .build-template.yaml.
+
+    Pages of /orgs/{org}/repos are fetched concurrently over one pooled
+    session and cached on disk with their ETag, so unchanged pages come back
+    as 304s, which do not count against the rate limit. The template check
+    is a batched GraphQL query, and only repositories pushed since the
+    previous scan are checked again. When X-RateLimit-Remaining runs out,
+    requests wait for X-RateLimit-Reset.
+    """
+
+    def __init__(self, token: str, api_url: str = API_URL, cache_dir: str = DEFAULT_CACHE_DIR, max_workers: int = 8,
+                 session: requests.Session = None, sleep=time.sleep, clock=time.time):
+        self.api_url = api_url.rstrip('/')
+        self.cache_dir = cache_dir
+        self.max_workers = max_workers
+        self.sleep = sleep
+        self.clock = clock
+        self.logger = Logger()
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        })
+        self.rate_lock = threading.Lock()
+        self.rate_remaining = None
+        self.rate_reset = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json")
+
+    def _read_cache(self, key: str):
+        try:
+            with open(self._cache_path(key), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, key: str, entry: dict):
+        path = self._cache_path(key)
+        with open(f"{path}.partial", 'w') as f:
+            json.dump(entry, f)
+        os.replace(f"{path}.partial", path)
+
+    def _wait_for_rate_limit(self):
+        with self.rate_lock:
+            if self.rate_remaining is None or self.rate_remaining > 0:
+                return
+            wait = self.rate_reset - self.clock()
+        if wait > 0:
+            self.logger.warning(f"GitHub API rate limit exhausted, waiting {int(wait)}s for reset")
+            self.sleep(wait + 1)
+
+    def _record_rate_limit(self, response: requests.Response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        with self.rate_lock:
+            self.rate_remaining = int(remaining)
+            if reset is not None:
+                self.rate_reset = int(reset)
+
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """One API request that waits out the primary and secondary rate limits."""
+        for _ in range(RATE_LIMIT_RETRIES):
+            self._wait_for_rate_limit()
+            response = resilience.call(self.api_url, self.session.request, method, url, timeout=30,
+                                       retry_on=NETWORK_ERRORS, **kwargs)
+            self._record_rate_limit(response)
+            if response.status_code in (403, 429) and (
+                    response.headers.get("Retry-After") or response.headers.get("X-RateLimit-Remaining") == "0"):
+                retry_after = response.headers.get("Retry-After")
+                if retry_after:
+                    self.logger.warning(f"GitHub API secondary rate limit, retrying in {retry_after}s")
+                    self.sleep(int(retry_after))
+                continue
+            return response
+        return response
+
+    def _get_page(self, url: str, params: dict) -> tuple:
+        """GET a JSON page through the ETag cache. Returns (body, Link header)."""
+        key = f"{url}?{json.dumps(params, sort_keys=True)}"
+        cached = self._read_cache(key)
+        headers = {"If-None-Match": cached['etag']} if cached and cached.get('etag') else {}
+        response = self._request("GET", url, params=params, headers=headers)
+        if response.status_code == 304 and cached:
+            return cached['body'], cached.get('link')
+        response.raise_for_status()
+        body = response.json()
+        link = response.headers.get("Link")
+        if response.headers.get("ETag"):
+            self._write_cache(key, {'etag': response.headers["ETag"], 'body': body, 'link': link})
+        return body, link
+
+    @staticmethod
+    def _last_page(link: str) -> int:
+        match = re.search(r'<[^>]*[?&]page=(\d+)[^>]*>;\s*rel="last"', link or "")
+        return int(match.group(1)) if match else 1
+
+    def list_repositories(self, org: str) -> list:
+        """Every repository of org, all pages."""
+        url = f"{self.api_url}/orgs/{org}/repos"
+        first, link = self._get_page(url, {"per_page": PER_PAGE, "page": 1})
+        last = self._last_page(link)
+        repos = list(first)
+        if last > 1:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                pages = executor.map(lambda page: self._get_page(url, {"per_page": PER_PAGE, "page": page})[0], range(2, last + 1))
+                for page in pages:
+                    repos += page
+        self.logger.info(f"Listed {len(repos)} repositories of {org} across {last} pages")
+        return repos
+
+    def _query_templates(self, org: str, names: list) -> dict:
+        """Whether each of names has a template. Names the query failed for are left out; raises GraphQLError if it failed for all."""
+        fields = " ".join(
+            f'r{i}: repository(owner: {json.dumps(org)}, name: {json.dumps(name)}) '
+            f'{{ object(expression: "HEAD:{TEMPLATE_FILE}") {{ ... on Blob {{ oid }} }} }}'
+            for i, name in enumerate(names)
+        )
+        response = self._request("POST", f"{self.api_url}/graphql", json={"query": f"query {{ {fields} }}"})
+        response.raise_for_status()
+        body = response.json()
+        data = body.get('data') or {}
+        errors = body.get('errors') or []
+        # Rate limits, node limits and timeouts come back as 200 with errors and null or partial data
+        failed = {error['path'][0] for error in errors if error.get('path')}
+        if errors and not all(error.get('path') for error in errors):
+            failed = {f"r{i}" for i in range(len(names))}
+        result = {name: bool((data.get(f"r{i}") or {}).get('object')) for i, name in enumerate(names)
+                  if f"r{i}" not in failed and f"r{i}" in data}
+        if not result:
+            messages = "; ".join(error.get('message', '') for error in errors) or "no data"
+            raise GraphQLError(f"Template query for {len(names)} repositories of {org} failed: {messages}")
+        if len(result) < len(names):
+            self.logger.warning(f"Template query failed for {len(names) - len(result)} of {len(names)} repositories of {org}")
+        return result
+
+    def repositories_with_template(self, org: str, repos: list) -> list:
+        """The repos (API objects) that have a .build-template.yaml on their default branch.
+
+        Results are cached per repository and pushed_at, so a repository
+        that has not been pushed to since the last scan is not queried. A
+        repository whose query failed keeps its previous result, if any, and
+        is queried again on the next scan.
+        """
+        key = f"templates:{self.api_url}/{org}"
+        cached = (self._read_cache(key) or {}).get('repos', {})
+        known = {}
+        stale = []
+        for repo in repos:
+            entry = cached.get(repo['name'])
+            if entry is not None and entry['pushed_at'] == repo.get('pushed_at'):
+                known[repo['name']] = entry['has_template']
+            else:
+                stale.append(repo['name'])
+        batches = [stale[i:i + GRAPHQL_BATCH] for i in range(0, len(stale), GRAPHQL_BATCH)]
+        if batches:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for future in [executor.submit(self._query_templates, org, batch) for batch in batches]:
+                    try:
+                        known.update(future.result())
+                    except GraphQLError as e:
+                        self.logger.warning(str(e))
+        entries = {repo['name']: {'pushed_at': repo.get('pushed_at'), 'has_template': known[repo['name']]}
+                   for repo in repos if repo['name'] in known}
+        failed = [repo['name'] for repo in repos if repo['name'] not in known]
+        for name in failed:
+            # The old entry no longer matches pushed_at, so the next scan asks again
+            if name in cached:
+                entries[name] = cached[name]
+        self._write_cache(key, {'repos': entries})
+        self.logger.info(f"Checked {len(stale) - len(failed)} of {len(repos)} repositories of {org} for {TEMPLATE_FILE}")
+        return [repo for repo in repos if known.get(repo['name'], (cached.get(repo['name']) or {}).get('has_template'))]
+
+    def scan(self, org: str) -> list:
+        return self.repositories_with_template(org, self.list_repositories(org))
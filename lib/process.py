@@ -0,0 +1,250 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import contextvars
+import gzip
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from lib.build_context import current_build
+from lib.sizes import parse_size
+from monitoring.logger import Logger, current_log_context
+from monitoring.metrics import COMMAND_FAILURES, COMMAND_OUTPUT_BYTES, COMMAND_SECONDS
+from monitoring.tracing import span
+
+# Output kept in memory per command, for the failure message
+TAIL_BYTES = 64 * 1024
+TAIL_LINES = 20
+CHUNK_SIZE = 64 * 1024
+# How often a running build container's memory is sampled; the peak is only as exact as this
+MEMORY_POLL_SECONDS = 5.0
+
+_resource_usage = contextvars.ContextVar("zab_resource_usage", default=None)
+
+class CommandFailed(subprocess.CalledProcessError):
+    """A logged command that exited non-zero, carrying the end of its output.
+
+    stderr holds the last TAIL_BYTES of combined output; log_path the full,
+    gzip-compressed log.
+    """
+
+    def __init__(self, returncode: int, cmd, tail: bytes, log_path: str = None):
+        super().__init__(returncode, cmd, stderr=tail)
+        self.log_path = log_path
+
+    @property
+    def tail(self) -> str:
+        return self.stderr.decode(errors='replace')
+
+    def __str__(self) -> str:
+        lines = self.tail.rstrip().splitlines()[-TAIL_LINES:]
+        message = super().__str__()
+        if self.log_path:
+            message += f" Full log: {self.log_path}."
+        if lines:
+            message += "\n" + "\n".join(lines)
+        return message
+
+class OutputTail:
+    """Ring buffer of the last max_bytes of a stream."""
+
+    def __init__(self, max_bytes: int = TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+
+    def append(self, chunk: bytes):
+        self.buffer += chunk
+        if len(self.buffer) > self.max_bytes:
+            del self.buffer[:len(self.buffer) - self.max_bytes]
+
+    def value(self) -> bytes:
+        return bytes(self.buffer)
+
+class CommandOutput:
+    """A pipe whose write end is given to a child process as stdout/stderr.
+
+    A reader thread drains it as the child writes, into a gzip file at
+    log_path (if given) and an OutputTail, so memory stays bounded however
+    much the command prints and the child never blocks on a full pipe.
+    """
+
+    def __init__(self, log_path: str = None, tail_bytes: int = TAIL_BYTES):
+        self.log_path = log_path
+        self.tail = OutputTail(tail_bytes)
+        self.bytes = 0
+        self.fd = None
+        self._reader = None
+
+    def __enter__(self):
+        read_fd, self.fd = os.pipe()
+        log_file = None
+        if self.log_path:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            # Level 1: logs compress well even at the fastest setting, and the child must not wait on us
+            log_file = gzip.open(self.log_path, 'wb', compresslevel=1)
+        self._reader = threading.Thread(target=self._drain, args=(read_fd, log_file), daemon=True)
+        self._reader.start()
+        return self
+
+    def _drain(self, read_fd: int, log_file):
+        try:
+            while True:
+                chunk = os.read(read_fd, CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.bytes += len(chunk)
+                self.tail.append(chunk)
+                if log_file is not None:
+                    log_file.write(chunk)
+        finally:
+            os.close(read_fd)
+            if log_file is not None:
+                log_file.close()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # The child has its own copy; EOF comes once it (and anything it spawned) exits
+        os.close(self.fd)
+        self._reader.join()
+
+class ResourceUsage:
+    """Peak memory of the build containers started within track_resources(), in bytes (None if never sampled)."""
+
+    def __init__(self):
+        self.peak_memory = None
+        self._lock = threading.Lock()
+
+    def observe_memory(self, used: int):
+        with self._lock:
+            if self.peak_memory is None or used > self.peak_memory:
+                self.peak_memory = used
+
+@contextmanager
+def track_resources():
+    """Collect the resource usage of containers run in this context, including threads started with its copy."""
+    usage = ResourceUsage()
+    token = _resource_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _resource_usage.reset(token)
+
+class ContainerMemory:
+    """Samples the memory use of a `docker run` container with `docker stats` while it runs.
+
+    The container id is read from the --cidfile the command was given.
+    """
+
+    def __init__(self, cidfile: str, usage: ResourceUsage, interval: float = MEMORY_POLL_SECONDS):
+        self.cidfile = cidfile
+        self.usage = usage
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._poll, name="container-memory", daemon=True)
+        self._thread.start()
+        return self
+
+    def _container_id(self) -> str:
+        try:
+            with open(self.cidfile) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _poll(self):
+        container_id = None
+        # The first sample is taken quickly, short builds would otherwise have none
+        wait = min(self.interval, 0.5)
+        while not self._stopping.wait(wait):
+            container_id = container_id or self._container_id()
+            if container_id is None:
+                continue
+            used = container_memory(container_id)
+            if used is not None:
+                self.usage.observe_memory(used)
+            wait = self.interval
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stopping.set()
+        self._thread.join()
+
+def container_memory(container_id: str) -> int:
+    """Current memory use of a running container in bytes, None if it cannot be read."""
+    try:
+        result = subprocess.run(["docker", "stats", "--no-stream", "--format", "{{.MemUsage}}", container_id],
+                                capture_output=True, text=True, timeout=30)
+        # e.g. "1.234GiB / 7.6GiB"
+        return parse_size(result.stdout.split("/")[0]) if result.returncode == 0 else None
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return None
+
+@contextmanager
+def _watch_memory(cmd: list):
+    """Add --cidfile to a `docker run` in a track_resources() context and sample its memory. Yields the command to run."""
+    usage = _resource_usage.get()
+    if usage is None or list(cmd[:2]) != ["docker", "run"]:
+        yield cmd
+        return
+    cid_dir = tempfile.mkdtemp(prefix="zab-cid-")
+    cidfile = os.path.join(cid_dir, "cid")
+    try:
+        with ContainerMemory(cidfile, usage, MEMORY_POLL_SECONDS):
+            yield list(cmd[:2]) + ["--cidfile", cidfile] + list(cmd[2:])
+    finally:
+        shutil.rmtree(cid_dir, ignore_errors=True)
+
+def command_log_path(name: str) -> str:
+    """Where the output of a command called name goes: next to the current build's log, or under logs/commands."""
+    log_dir = Logger().log_dir
+    handle = current_build()
+    context = current_log_context()
+    scope = "-".join(context[field] for field in ('artifact', 'distro') if context.get(field))
+    filename = "-".join(part for part in (scope, name, uuid.uuid4().hex[:6]) if part) + ".log.gz"
+    if handle is not None:
+        return os.path.join(log_dir, "builds", f"{handle.repo_name}-{handle.id}", filename)
+    return os.path.join(log_dir, "commands", filename)
+
+def run_logged(cmd: list, name: str, tail_bytes: int = TAIL_BYTES, **kwargs) -> subprocess.CompletedProcess:
+    """subprocess.run(cmd) with its combined output streamed to a compressed log file.
+
+    Raises CommandFailed, with the end of the output, if cmd exits non-zero.
+    """
+    logger = Logger()
+    log_path = command_log_path(name)
+    logger.info(f"Running {name}, output in {log_path}")
+    with span(name, "command", log=log_path) as command_span, COMMAND_SECONDS.labels(command=name).time():
+        with CommandOutput(log_path, tail_bytes) as output, _watch_memory(cmd) as run_cmd:
+            try:
+                result = subprocess.run(run_cmd, stdout=output.fd, stderr=subprocess.STDOUT, **kwargs)
+            except subprocess.CalledProcessError as e:
+                failure = e
+            else:
+                failure = None
+        if command_span is not None:
+            command_span.args['output_bytes'] = output.bytes
+            command_span.args['failed'] = failure is not None
+    COMMAND_OUTPUT_BYTES.labels(command=name).inc(output.bytes)
+    if failure is not None:
+        COMMAND_FAILURES.labels(command=name).inc()
+        raise CommandFailed(failure.returncode, cmd, output.tail.value() or _output_of(failure), log_path)
+    logger.info(f"{name} wrote {output.bytes} bytes of output")
+    return result
+
+def _output_of(error: subprocess.CalledProcessError) -> bytes:
+    output = error.stderr or error.output or b""
+    return output.encode() if isinstance(output, str) else output
+
+def error_output(error: Exception) -> str:
+    """What a failed command said, for log messages: its captured stderr, or the error itself."""
+    if isinstance(error, CommandFailed):
+        return str(error)
+    output = getattr(error, 'stderr', None)
+    if isinstance(output, bytes):
+        output = output.decode(errors='replace')
+    return output.strip() if output else str(error)
@@ -0,0 +1,110 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import os
+import subprocess
+import threading
+from contextlib import contextmanager
+from lib.sizes import format_size, parse_size
+from monitoring.logger import Logger
+from monitoring.metrics import RAMDISK_RESERVED_BYTES, WORKSPACE_PLACEMENTS
+
+DEFAULT_PATH = "/dev/shm/zab"
+DEFAULT_BUDGET = "8G"
+# Room reserved per estimated byte, for builds that grow a little past their history
+DEFAULT_HEADROOM = 1.5
+MOUNTS_FILE = "/proc/mounts"
+
+def filesystem_type(path: str) -> str:
+    """Type of the filesystem path is on, per the longest matching mount point, or None."""
+    path = os.path.realpath(path)
+    best, fs_type = "", None
+    try:
+        with open(MOUNTS_FILE) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) < 3:
+                    continue
+                # Mount points escape spaces as \040
+                mount_point = fields[1].replace("\\040", " ")
+                if (path == mount_point or path.startswith(mount_point.rstrip("/") + "/")) and len(mount_point) >= len(best):
+                    best, fs_type = mount_point, fields[2]
+    except OSError:
+        return None
+    return fs_type
+
+class RamDisk:
+    """A size-limited tmpfs that repository builds known to be small run on.
+
+    A build reserves its estimated footprint (its clone and workspaces) times
+    headroom from budget for as long as it runs. Builds without an estimate,
+    or whose reservation does not fit in what is left of the budget and of
+    the tmpfs, get None and run in the temp dir on disk.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, budget=DEFAULT_BUDGET, headroom: float = DEFAULT_HEADROOM):
+        self.path = path
+        self.budget = parse_size(budget)
+        self.headroom = headroom
+        self.available = False
+        self.reserved = 0
+        self.logger = Logger()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: dict):
+        config = config or {}
+        return cls(
+            path=config.get('path', DEFAULT_PATH),
+            budget=config.get('budget', DEFAULT_BUDGET),
+            headroom=float(config.get('headroom', DEFAULT_HEADROOM)),
+        )
+
+    def open(self) -> bool:
+        """Make sure path is on a tmpfs, mounting one of budget bytes there if not. Returns whether it can be used.
+
+        Mounting needs CAP_SYS_ADMIN; pointing path into an existing tmpfs
+        such as /dev/shm does not.
+        """
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            if filesystem_type(self.path) != "tmpfs":
+                subprocess.run(["mount", "-t", "tmpfs", "-o", f"size={self.budget},mode=1777", "zab-ramdisk", self.path],
+                               check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            self.logger.warning(f"Cannot mount a tmpfs on {self.path}, building on disk: {e.stderr.decode().strip()}")
+            return False
+        except OSError as e:
+            self.logger.warning(f"Cannot use {self.path} as a ramdisk, building on disk: {e}")
+            return False
+        self.available = True
+        self.logger.info(f"Using tmpfs {self.path} for builds that fit in {format_size(self.budget)}")
+        return True
+
+    def free(self) -> int:
+        stat = os.statvfs(self.path)
+        return stat.f_bavail * stat.f_frsize
+
+    @contextmanager
+    def reserve(self, estimate: int):
+        """Yield the directory to build in for a build expected to need estimate bytes: the ramdisk, or None for disk."""
+        needed = int(estimate * self.headroom) if estimate else 0
+        granted = False
+        if self.available and needed:
+            with self._lock:
+                # The tmpfs may be shared with other processes, so its free space counts too
+                if self.reserved + needed <= self.budget and needed <= self.free():
+                    self.reserved += needed
+                    granted = True
+        WORKSPACE_PLACEMENTS.labels(medium="ramdisk" if granted else "disk").inc()
+        if not granted:
+            yield None
+            return
+        RAMDISK_RESERVED_BYTES.inc(needed)
+        self.logger.info(f"Building on ramdisk {self.path}, reserved {format_size(needed)}")
+        try:
+            yield self.path
+        finally:
+            with self._lock:
+                self.reserved -= needed
+            RAMDISK_RESERVED_BYTES.dec(needed)
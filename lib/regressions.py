@@ -0,0 +1,96 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import statistics
+from lib.sizes import format_size
+
+# History fields compared against the baseline
+METRICS = ('seconds', 'bytes', 'peak_memory')
+DEFAULT_WINDOW = 20
+DEFAULT_MIN_SAMPLES = 5
+# Robust z-score above which a value counts as a regression
+DEFAULT_THRESHOLD = 3.5
+# ... and the least relative increase, so steady artifacts do not flag noise
+DEFAULT_MIN_INCREASE = 0.25
+# ... and the least absolute increase, so tiny artifacts do not either
+MIN_DELTA = {'seconds': 30, 'bytes': 1024 ** 2, 'peak_memory': 64 * 1024 ** 2}
+# Scales the median absolute deviation to a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+class Regression:
+    """One metric of an artifact build that is well above its recent baseline."""
+
+    def __init__(self, repo: str, artifact: str, metric: str, value: float, baseline: float, limit: float, samples: int):
+        self.repo = repo
+        self.artifact = artifact
+        self.metric = metric
+        self.value = value
+        self.baseline = baseline
+        self.limit = limit
+        self.samples = samples
+
+    @property
+    def ratio(self) -> float:
+        return self.value / self.baseline if self.baseline else float('inf')
+
+    def _format(self, value: float) -> str:
+        return f"{value:.0f}s" if self.metric == 'seconds' else format_size(int(value))
+
+    def describe(self) -> str:
+        return (f"{self.repo}/{self.artifact} {self.metric} {self._format(self.value)} is {self.ratio:.1f}x "
+                f"the median {self._format(self.baseline)} of the last {self.samples} builds (limit {self._format(self.limit)})")
+
+    def to_dict(self) -> dict:
+        return {'repo': self.repo, 'artifact': self.artifact, 'metric': self.metric, 'value': self.value,
+                'baseline': self.baseline, 'limit': self.limit, 'samples': self.samples}
+
+class RegressionDetector:
+    """Compares a finished build with the artifact's recent successful builds in the history.
+
+    A metric regressed when it is above median + threshold * MAD_SCALE *
+    MAD of the last window builds, and at least min_increase and
+    MIN_DELTA above the median. The median absolute deviation keeps one
+    earlier outlier from hiding or causing a regression.
+    """
+
+    def __init__(self, history, window: int = DEFAULT_WINDOW, min_samples: int = DEFAULT_MIN_SAMPLES,
+                 threshold: float = DEFAULT_THRESHOLD, min_increase: float = DEFAULT_MIN_INCREASE):
+        self.history = history
+        self.window = window
+        self.min_samples = min_samples
+        self.threshold = threshold
+        self.min_increase = min_increase
+
+    @classmethod
+    def from_config(cls, history, config: dict):
+        config = config or {}
+        return cls(
+            history,
+            window=int(config.get('window', DEFAULT_WINDOW)),
+            min_samples=int(config.get('min_samples', DEFAULT_MIN_SAMPLES)),
+            threshold=float(config.get('threshold', DEFAULT_THRESHOLD)),
+            min_increase=float(config.get('min_increase', DEFAULT_MIN_INCREASE)),
+        )
+
+    def limit(self, metric: str, values: list) -> tuple:
+        """(median, limit) of a baseline."""
+        median = statistics.median(values)
+        mad = statistics.median(abs(value - median) for value in values)
+        return median, max(median + self.threshold * MAD_SCALE * mad, median * (1 + self.min_increase),
+                           median + MIN_DELTA[metric])
+
+    def check(self, repo_name: str, artifact: str, values: dict) -> list:
+        """Regressions of values (metric -> value of the new build) against the builds already in the history."""
+        successes = [r for r in self.history.records(repo_name, artifact) if r['status'] == 'success']
+        regressions = []
+        for metric in METRICS:
+            value = values.get(metric)
+            if value is None:
+                continue
+            baseline = [r[metric] for r in successes if r.get(metric) is not None][-self.window:]
+            if len(baseline) < self.min_samples:
+                continue
+            median, limit = self.limit(metric, baseline)
+            if value > limit:
+                regressions.append(Regression(repo_name, artifact, metric, value, median, limit, len(baseline)))
+        return regressions
@@ -0,0 +1,203 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import urllib.error
+import urllib.request
+from lib import resilience
+from monitoring.logger import Logger
+from monitoring.metrics import REMOTE_CACHE_BYTES, REMOTE_CACHE_REQUESTS
+
+DEFAULT_TIMEOUT = 60
+ENTRY_VERSION = 1
+CHUNK_SIZE = 1024 * 1024
+DIGEST = re.compile(r"[0-9a-f]{64}")
+
+def check_entry(entry, key: str):
+    """Raise ValueError unless entry is a well-formed entry of build key."""
+    if not isinstance(entry, dict) or entry.get('version') != ENTRY_VERSION or entry.get('key') != key:
+        raise ValueError(f"Remote cache entry {key} is not a version {ENTRY_VERSION} entry for that key")
+    files = entry.get('files')
+    if not isinstance(files, list) or not files:
+        raise ValueError(f"Remote cache entry {key} names no files")
+    for file in files:
+        name = file.get('name') if isinstance(file, dict) else None
+        # Names become paths in the artifact store, so they must stay file names
+        if not isinstance(name, str) or name in ("", ".", "..") or os.path.basename(name) != name:
+            raise ValueError(f"Remote cache entry {key} has a file with name {name!r}")
+        if not isinstance(file.get('digest'), str) or not DIGEST.fullmatch(file['digest']):
+            raise ValueError(f"Remote cache entry {key} has file {name} without a sha256 digest")
+        if not isinstance(file.get('distro'), (str, type(None))):
+            raise ValueError(f"Remote cache entry {key} has file {name} with distro {file['distro']!r}")
+    if not isinstance(entry.get('seconds', 0), (int, float)):
+        raise ValueError(f"Remote cache entry {key} has seconds {entry['seconds']!r}")
+
+class RemoteCache:
+    """Build results shared by orchestrators on several hosts, over plain HTTP.
+
+    Protocol, relative to url:
+        GET/PUT ac/<build key>   JSON entry of a successful build: its
+                                 metadata and files (name, digest, size,
+                                 distro)
+        GET/PUT cas/<sha256>     contents of a file
+    A missing entry or file is a 404. Files are uploaded before the entry
+    that names them, so an entry is never seen before its files are there,
+    and downloads are checked against their digest. Any server that stores
+    PUT bodies and serves them back works, e.g. nginx with WebDAV or
+    bazel-remote.
+    """
+
+    def __init__(self, url: str, token: str = None, timeout: float = DEFAULT_TIMEOUT):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            config['url'],
+            token=os.environ.get('REMOTE_CACHE_TOKEN'),
+            timeout=float(config.get('timeout', DEFAULT_TIMEOUT)),
+        )
+
+    def _request(self, method: str, path: str, data=None, headers: dict = None):
+        headers = dict(headers or {})
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        request = urllib.request.Request(f"{self.url}/{path}", data=data, method=method, headers=headers)
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _get(self, path: str, sink) -> bool:
+        """Stream path into sink; False if the cache does not have it."""
+        # A retried transfer starts over
+        sink.reset()
+        try:
+            with self._request("GET", path) as response:
+                shutil.copyfileobj(response, sink, CHUNK_SIZE)
+            return True
+        except urllib.error.HTTPError as e:
+            # A miss is an answer, not a failure of the remote
+            if e.code == 404:
+                return False
+            raise
+
+    def _exists(self, path: str) -> bool:
+        try:
+            with self._request("HEAD", path):
+                return True
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+
+    def _put_file(self, path: str, file_path: str):
+        with open(file_path, "rb") as f:
+            with self._request("PUT", path, data=f, headers={'Content-Length': str(os.path.getsize(file_path)),
+                                                              'Content-Type': 'application/octet-stream'}):
+                pass
+
+    def _put_json(self, path: str, payload: dict):
+        body = json.dumps(payload, sort_keys=True).encode()
+        with self._request("PUT", path, data=body, headers={'Content-Type': 'application/json'}):
+            pass
+
+    def get(self, key: str) -> dict:
+        """The entry of build key, None on a miss. Raises ValueError for a malformed entry."""
+        sink = _Buffer()
+        try:
+            found = resilience.call(self.url, self._get, f"ac/{key}", sink)
+            entry = json.loads(sink.getvalue()) if found else None
+            if entry is not None:
+                check_entry(entry, key)
+        except Exception:
+            REMOTE_CACHE_REQUESTS.labels(operation="get", result="error").inc()
+            raise
+        REMOTE_CACHE_REQUESTS.labels(operation="get", result="hit" if entry else "miss").inc()
+        return entry
+
+    def download(self, digest: str, dest_dir: str, name: str) -> str:
+        """Fetch the file with digest into dest_dir/name and return its path, after checking its contents."""
+        path = os.path.join(dest_dir, name)
+        with open(path, "wb") as f:
+            sink = _HashingWriter(f)
+            if not resilience.call(self.url, self._get, f"cas/{digest}", sink):
+                raise FileNotFoundError(f"Remote cache has no file {digest}")
+        if sink.hexdigest() != digest:
+            os.remove(path)
+            raise ValueError(f"Remote cache file {name} has digest {sink.hexdigest()}, expected {digest}")
+        REMOTE_CACHE_BYTES.labels(direction="down").inc(sink.size)
+        return path
+
+    def put(self, key: str, metadata: dict, files: list) -> dict:
+        """Upload the files of build key, then its entry. files are dicts with path, digest and distro. Returns the entry."""
+        entry_files = []
+        try:
+            for file in files:
+                size = os.path.getsize(file['path'])
+                cas_path = f"cas/{file['digest']}"
+                # Identical outputs of other builds are there already
+                if not resilience.call(self.url, self._exists, cas_path):
+                    resilience.call(self.url, self._put_file, cas_path, file['path'])
+                    REMOTE_CACHE_BYTES.labels(direction="up").inc(size)
+                entry_files.append({'name': os.path.basename(file['path']), 'digest': file['digest'], 'size': size,
+                                    'distro': file.get('distro')})
+            entry = dict(metadata, key=key, version=ENTRY_VERSION, files=entry_files)
+            resilience.call(self.url, self._put_json, f"ac/{key}", entry)
+        except Exception:
+            REMOTE_CACHE_REQUESTS.labels(operation="put", result="error").inc()
+            raise
+        REMOTE_CACHE_REQUESTS.labels(operation="put", result="ok").inc()
+        self.logger.info(f"Uploaded {len(entry_files)} files of {key[:12]} to remote cache {self.url}")
+        return entry
+
+    def fetch(self, entry: dict, store, repo_name: str, version: str, commit: str = None) -> list:
+        """Put the files of entry into the local artifact store, downloading those it does not hold. Returns their store paths."""
+        paths = []
+        with tempfile.TemporaryDirectory(prefix="zab-cache-") as download_dir:
+            for file in entry['files']:
+                distro = file.get('distro') or "default"
+                path = store.object_path(file['digest']) or self.download(file['digest'], download_dir, file['name'])
+                store.put(path, repo_name, version, distro, commit, filename=file['name'])
+                paths += [stored['path'] for stored in store.lookup(repo_name, version, distro)
+                          if stored['filename'] == file['name']]
+        return paths
+
+class _Buffer:
+    def __init__(self):
+        self.chunks = []
+
+    def reset(self):
+        self.chunks = []
+
+    def write(self, data: bytes):
+        self.chunks.append(data)
+
+    def getvalue(self) -> bytes:
+        return b"".join(self.chunks)
+
+class _HashingWriter:
+    """File wrapper that hashes what is written through it."""
+
+    def __init__(self, f):
+        self.f = f
+        self.reset()
+
+    def reset(self):
+        self.f.seek(0)
+        self.f.truncate()
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.f.write(data)
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
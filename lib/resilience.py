@@ -0,0 +1,227 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import random
+import re
+import subprocess
+import threading
+import time
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from monitoring.logger import Logger
+from monitoring.metrics import REMOTE_REJECTED, REMOTE_RETRIES
+from monitoring.tracing import span
+
+GITHUB = "github.com"
+RETRYABLE_ERRORS = (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError)
+# What git, gh and docker print when the network or the remote let them down, rather than the request
+TRANSIENT_OUTPUT = re.compile(
+    r"could not resolve host|temporary failure in name resolution|connection timed out|timed out|timeout"
+    r"|connection reset|connection refused|connection closed|network is unreachable|early eof"
+    r"|remote end hung up unexpectedly|unexpected disconnect|rpc failed|tls handshake|ssl_error"
+    r"|http[ /]?5\d\d|error: 5\d\d|\b50[234]\b|service unavailable|bad gateway|too many requests",
+    re.IGNORECASE)
+# Local problems an OSError can also be, which no retry fixes
+LOCAL_OS_ERRORS = (FileNotFoundError, FileExistsError, PermissionError, IsADirectoryError, NotADirectoryError)
+
+class CircuitOpenError(Exception):
+    """Raised without calling out while the circuit breaker of a remote is open."""
+
+    def __init__(self, remote: str, retry_in: float):
+        super().__init__(f"{remote} is unavailable, circuit open for another {int(retry_in)}s")
+        self.remote = remote
+        self.retry_in = retry_in
+
+def remote_of(target: str) -> str:
+    """Host a target talks to: a URL, an scp-style git remote, an image reference or a host name.
+
+    Images without a registry host ("ubuntu:22.04", "library/ubuntu") are on docker.io.
+    """
+    if "://" in target:
+        return urlparse(target).hostname or target
+    if "@" in target and ":" in target.split("@", 1)[1]:
+        return target.split("@", 1)[1].split(":", 1)[0]
+    first, _, rest = target.partition("/")
+    if rest:
+        return first if ("." in first or ":" in first or first == "localhost") else "docker.io"
+    if ":" in first or "." not in first:
+        return "docker.io"
+    return first
+
+def is_transient(error: Exception) -> bool:
+    """Whether error is a transport or timeout failure, which may pass and says the remote is unwell.
+
+    Failed commands count only if their output says so: a missing branch or
+    an existing release fails the same way every time, with the remote
+    answering fine.
+    """
+    if isinstance(error, subprocess.TimeoutExpired):
+        return True
+    if isinstance(error, subprocess.CalledProcessError):
+        output = b"".join(o if isinstance(o, bytes) else o.encode() for o in (error.stderr, error.stdout) if o)
+        return bool(TRANSIENT_OUTPUT.search(output.decode(errors="replace")))
+    if isinstance(error, HTTPError):
+        return error.code >= 500 or error.code in (408, 429)
+    return isinstance(error, OSError) and not isinstance(error, LOCAL_OS_ERRORS)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter: attempt n waits up to base_delay * factor**n, capped at max_delay."""
+
+    def __init__(self, attempts: int = 3, base_delay: float = 2.0, max_delay: float = 60.0, factor: float = 2.0):
+        self.attempts = max(1, int(attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.factor = factor
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.factor ** attempt))
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures of a remote.
+
+    While open, calls fail fast. After reset_seconds one trial call is let
+    through (half-open): success closes the breaker, failure opens it again.
+    """
+
+    def __init__(self, remote: str, failure_threshold: int = 5, reset_seconds: float = 300.0, clock=time.monotonic):
+        self.remote = remote
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+        self.logger = Logger()
+
+    @property
+    def state(self) -> str:
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            return "half-open" if self.clock() - self.opened_at >= self.reset_seconds else "open"
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call to the remote may go ahead."""
+        with self.lock:
+            if self.opened_at is None:
+                return
+            waited = self.clock() - self.opened_at
+            if waited < self.reset_seconds or self.trial_running:
+                raise CircuitOpenError(self.remote, max(self.reset_seconds - waited, 0))
+            self.trial_running = True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                self.logger.info(f"Circuit for {self.remote} closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def release(self):
+        """End a trial call that neither reached nor failed to reach the remote."""
+        with self.lock:
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+                self.logger.warning(f"Circuit for {self.remote} open after {self.failures} failures, "
+                                    f"failing fast for {int(self.reset_seconds)}s")
+
+class Resilience:
+    """Retries and per-remote circuit breakers shared by every stage that talks to the network."""
+
+    def __init__(self, policy: RetryPolicy = None, failure_threshold: int = 5, reset_seconds: float = 300.0,
+                 sleep=time.sleep, clock=time.monotonic):
+        self.policy = policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.sleep = sleep
+        self.clock = clock
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.logger = Logger()
+
+    @classmethod
+    def from_config(cls, config: dict):
+        retry = config.get('retry') or {}
+        breaker = config.get('breaker') or {}
+        return cls(
+            RetryPolicy(
+                attempts=retry.get('attempts', 3),
+                base_delay=float(retry.get('base_delay', 2)),
+                max_delay=float(retry.get('max_delay', 60)),
+            ),
+            failure_threshold=int(breaker.get('failure_threshold', 5)),
+            reset_seconds=float(breaker.get('reset_seconds', 300)),
+        )
+
+    def breaker(self, remote: str) -> CircuitBreaker:
+        with self.lock:
+            if remote not in self.breakers:
+                self.breakers[remote] = CircuitBreaker(remote, self.failure_threshold, self.reset_seconds, self.clock)
+            return self.breakers[remote]
+
+    def call(self, target: str, fn, *args, retry: bool = True, retry_on: tuple = RETRYABLE_ERRORS, **kwargs):
+        """Call fn(*args, **kwargs) through the breaker of target's remote.
+
+        With retry, transient failures in retry_on (see is_transient) are
+        retried with backoff; only pass retry=True for idempotent operations.
+        Only they count towards the breaker, other errors are raised at once.
+        Raises CircuitOpenError while the remote's breaker is open, otherwise
+        the last error.
+        """
+        breaker = self.breaker(remote_of(target))
+        attempts = self.policy.attempts if retry else 1
+        for attempt in range(attempts):
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                REMOTE_REJECTED.labels(remote=breaker.remote).inc()
+                raise
+            try:
+                with span(_call_name(fn, args), "remote", remote=breaker.remote, attempt=attempt + 1):
+                    result = fn(*args, **kwargs)
+            except retry_on as e:
+                if not is_transient(e):
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if attempt + 1 >= attempts:
+                    raise
+                delay = self.policy.delay(attempt)
+                self.logger.warning(f"Attempt {attempt + 1}/{attempts} against {breaker.remote} failed ({e}), retrying in {delay:.1f}s")
+                REMOTE_RETRIES.labels(remote=breaker.remote).inc()
+                self.sleep(delay)
+            except Exception:
+                breaker.release()
+                raise
+            else:
+                breaker.record_success()
+                return result
+
+def _call_name(fn, args: tuple) -> str:
+    """'git clone', 'gh release', ... for commands, else the function's name."""
+    if args and isinstance(args[0], (list, tuple)) and args[0] and all(isinstance(a, str) for a in args[0][:2]):
+        return " ".join(args[0][:2])
+    return getattr(fn, '__name__', type(fn).__name__)
+
+_resilience = Resilience()
+
+def get_resilience() -> Resilience:
+    return _resilience
+
+def configure(config: dict) -> Resilience:
+    """Replace the shared instance with one built from the `resilience` config block."""
+    global _resilience
+    _resilience = Resilience.from_config(config or {})
+    return _resilience
+
+def call(target: str, fn, *args, **kwargs):
+    """Resilience.call() on the shared instance."""
+    return _resilience.call(target, fn, *args, **kwargs)
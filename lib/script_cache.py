@@ -0,0 +1,198 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import fcntl
+import os
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from lib import resilience
+from lib.resilience import CircuitOpenError
+from monitoring.logger import Logger
+
+DEFAULT_SCRIPT_CACHE_DIR = "/tmp/zab-scripts"
+# Script repository of build scripts that do not name theirs
+DEFAULT_SCRIPT_REPO = "linux-on-ibm-z-scripts"
+
+class ScriptRepoCache:
+    """Local snapshots of script repositories, kept up to date with their remote.
+
+    Layout under root/<name>:
+        git/              bare repository that shallow fetches accumulate in
+        snapshots/<sha>/  exported tree of one commit, never modified
+        current           symlink to the newest snapshot
+        checked           mtime is the last freshness check
+
+    sync() asks the remote for the ref's sha with `git ls-remote`, at most
+    once per check_interval, and only fetches when it changed. Updates run
+    under a file lock and swap the current symlink atomically. A build
+    keeps using the snapshot path it was given, so older snapshots are
+    kept around (the newest `keep`, and any a caller says builds still
+    use) rather than updated in place. snapshot() brings back the snapshot
+    of a given commit, such as the one a plan was made with.
+    """
+
+    def __init__(self, root: str = DEFAULT_SCRIPT_CACHE_DIR, check_interval: float = 60, keep: int = 3, clock=time.time):
+        self.root = root
+        self.check_interval = check_interval
+        self.keep = keep
+        self.clock = clock
+        self.logger = Logger()
+        os.makedirs(root, exist_ok=True)
+
+    def _repo_dir(self, name: str) -> str:
+        return os.path.join(self.root, name)
+
+    @contextmanager
+    def _locked(self, name: str):
+        with open(os.path.join(self.root, f".{name}.lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def current(self, name: str) -> tuple:
+        """(snapshot path, sha) that name currently points to, or None before the first sync."""
+        link = os.path.join(self._repo_dir(name), "current")
+        try:
+            target = os.readlink(link)
+        except FileNotFoundError:
+            return None
+        return os.path.join(self._repo_dir(name), target), os.path.basename(target)
+
+    def _fresh(self, name: str) -> bool:
+        try:
+            return self.clock() - os.path.getmtime(os.path.join(self._repo_dir(name), "checked")) < self.check_interval
+        except FileNotFoundError:
+            return False
+
+    def _mark_checked(self, name: str):
+        path = os.path.join(self._repo_dir(name), "checked")
+        with open(path, "a"):
+            pass
+        now = self.clock()
+        os.utime(path, (now, now))
+
+    def remote_sha(self, url: str, ref: str = "HEAD") -> str:
+        result = resilience.call(url, subprocess.run, ["git", "ls-remote", url, ref],
+                                 check=True, capture_output=True, text=True)
+        lines = result.stdout.split("\n", 1)
+        if not lines[0]:
+            raise ValueError(f"{url} has no ref {ref}")
+        return lines[0].split("\t")[0]
+
+    def sync(self, name: str, url: str, ref: str = "HEAD", pinned=()) -> tuple:
+        """(snapshot path, sha) of the latest commit of url's ref, fetching it if the cache is stale.
+
+        If the remote cannot be reached, the last snapshot is used. Snapshots
+        in pinned, which running builds use, survive the pruning an update does.
+        """
+        current = self.current(name)
+        if current is not None and self._fresh(name):
+            return current
+        os.makedirs(self._repo_dir(name), exist_ok=True)
+        with self._locked(name):
+            # Another process may have updated it while this one waited
+            current = self.current(name)
+            if current is not None and self._fresh(name):
+                return current
+            try:
+                sha = self.remote_sha(url, ref)
+            except (subprocess.CalledProcessError, CircuitOpenError, ValueError) as e:
+                if current is None:
+                    raise
+                self.logger.warning(f"Cannot check script repo {name} for updates, using {current[1][:12]}: {e}")
+                return current
+            if current is None or current[1] != sha:
+                previous = current[1][:12] if current else "nothing"
+                current = self._update(name, url, ref, pinned)
+                self.logger.info(f"Updated script repo {name} from {previous} to {current[1][:12]}")
+            self._mark_checked(name)
+            return current
+
+    def snapshot(self, name: str, url: str, sha: str) -> str:
+        """Path of the snapshot of commit sha, fetching that commit if it is not kept. Does not change current."""
+        snapshot = os.path.join(self._repo_dir(name), "snapshots", sha)
+        os.makedirs(self._repo_dir(name), exist_ok=True)
+        with self._locked(name):
+            if not os.path.isdir(snapshot):
+                git_dir = self._fetch(name, url, sha)
+                self._export(name, git_dir, sha)
+                self.logger.info(f"Restored snapshot {sha[:12]} of script repo {name}")
+            # Freshly used, so pruning keeps it a while longer
+            now = self.clock()
+            os.utime(snapshot, (now, now))
+        return snapshot
+
+    def _fetch(self, name: str, url: str, ref: str) -> str:
+        git_dir = os.path.join(self._repo_dir(name), "git")
+        if not os.path.isdir(git_dir):
+            subprocess.run(["git", "init", "-q", "--bare", git_dir], check=True, capture_output=True)
+        # Objects from earlier fetches stay in git_dir, so only what changed is transferred
+        resilience.call(url, subprocess.run, ["git", "-C", git_dir, "fetch", "-q", "--depth", "1", url, ref],
+                        check=True, capture_output=True)
+        return git_dir
+
+    def _export(self, name: str, git_dir: str, sha: str) -> str:
+        snapshot = os.path.join(self._repo_dir(name), "snapshots", sha)
+        if not os.path.isdir(snapshot):
+            tmp_path = os.path.join(self._repo_dir(name), "snapshots", f".{sha}.{os.getpid()}.tmp")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            archive = subprocess.Popen(["git", "-C", git_dir, "archive", "--format=tar", sha], stdout=subprocess.PIPE)
+            extract = subprocess.run(["tar", "-x", "-C", tmp_path], stdin=archive.stdout, capture_output=True)
+            archive.stdout.close()
+            if archive.wait() != 0 or extract.returncode != 0:
+                shutil.rmtree(tmp_path, ignore_errors=True)
+                raise subprocess.CalledProcessError(extract.returncode or archive.returncode, "git archive", stderr=extract.stderr)
+            os.rename(tmp_path, snapshot)
+        return snapshot
+
+    def _update(self, name: str, url: str, ref: str, pinned=()) -> tuple:
+        repo_dir = self._repo_dir(name)
+        git_dir = self._fetch(name, url, ref)
+        sha = subprocess.run(["git", "-C", git_dir, "rev-parse", "FETCH_HEAD"],
+                             check=True, capture_output=True, text=True).stdout.strip()
+        snapshot = self._export(name, git_dir, sha)
+        now = self.clock()
+        os.utime(snapshot, (now, now))
+        link_tmp = os.path.join(repo_dir, f".current.{os.getpid()}")
+        if os.path.lexists(link_tmp):
+            os.unlink(link_tmp)
+        os.symlink(os.path.join("snapshots", sha), link_tmp)
+        os.replace(link_tmp, os.path.join(repo_dir, "current"))
+        self._prune(name, sha, pinned)
+        return snapshot, sha
+
+    def stale_snapshots(self) -> list:
+        """(name, path) of every snapshot that is not its repository's current one."""
+        stale = []
+        for repo in os.scandir(self.root):
+            snapshots_dir = os.path.join(repo.path, "snapshots")
+            if not repo.is_dir() or not os.path.isdir(snapshots_dir):
+                continue
+            current = self.current(repo.name)
+            stale += [(repo.name, entry.path) for entry in os.scandir(snapshots_dir)
+                      if entry.is_dir() and not entry.name.startswith(".") and (current is None or entry.path != current[0])]
+        return stale
+
+    def remove_snapshot(self, name: str, path: str):
+        """Remove a snapshot of name, unless a sync has made it current meanwhile."""
+        with self._locked(name):
+            current = self.current(name)
+            if current is not None and current[0] == path:
+                return
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _prune(self, name: str, current_sha: str, pinned=()):
+        snapshots_dir = os.path.join(self._repo_dir(name), "snapshots")
+        snapshots = [entry for entry in os.scandir(snapshots_dir) if entry.is_dir() and not entry.name.startswith(".")]
+        snapshots.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+        # The current snapshot, plus the newest others that builds may still be using
+        others = [entry for entry in snapshots if entry.name != current_sha]
+        pinned = {os.path.realpath(path) for path in pinned}
+        for entry in others[self.keep - 1:]:
+            if os.path.realpath(entry.path) not in pinned:
+                shutil.rmtree(entry.path, ignore_errors=True)
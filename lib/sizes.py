@@ -0,0 +1,27 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import re
+
+UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+def parse_size(value) -> int:
+    """Parse a byte size such as 512, "800M" or "20G" into bytes.
+
+    Raises:
+        ValueError: If the value is not a valid size.
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*", str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size {value!r}")
+    return int(float(match.group(1)) * UNITS[match.group(2).upper()])
+
+def format_size(num_bytes: int) -> str:
+    """Format a byte count for log messages, e.g. 1536 -> "1.5K"."""
+    for unit in ("", "K", "M", "G"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f}{unit}" if unit else f"{num_bytes}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f}T"
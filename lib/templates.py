@@ -0,0 +1,207 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import os
+import threading
+from types import MappingProxyType
+import yaml
+from monitoring.logger import Logger
+
+try:
+    # libyaml parses several times faster than the pure Python loader
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# A repository's own build config: its template, overrides and schedule
+REPO_TEMPLATE_FILE = ".build-template.yaml"
+# Template of a repository whose entry names none
+DEFAULT_TEMPLATE = "templates/loz-script-project.yaml"
+
+class TemplateError(ValueError):
+    """A template or .build-template.yaml that does not match the config schema."""
+
+class RepoConfigError(TemplateError):
+    """A repository's .build-template.yaml that cannot be parsed or applied to its template."""
+
+def freeze(value):
+    """Immutable view of parsed YAML: mappings become MappingProxyType, lists tuples."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    return value
+
+def thaw(value):
+    """Mutable deep copy of a frozen (or plain) value."""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(v) for v in value]
+    return value
+
+# Declarative schema of a merged build config. Unknown keys are allowed so
+# builders can grow options without touching it.
+SCALAR = (str, int, float)
+MAPPING = (dict, MappingProxyType)
+SEQUENCE = (list, tuple)
+BUILD_SCRIPT_SCHEMA = {
+    'type': MAPPING,
+    'required': ('path',),
+    'fields': {
+        'path': {'type': str},
+        'repo_name': {'type': str},
+        'gh_name': {'type': str},
+        'args': {'type': SCALAR},
+        'docker_image': {'type': str},
+    },
+}
+ARTIFACT_SCHEMA = {
+    'type': MAPPING,
+    'required': ('type',),
+    'fields': {
+        'type': {'type': str},
+        'language': {'type': str},
+        'version': {'type': SCALAR},
+        'docker_image': {'type': str},
+        'image_name': {'type': str},
+        'registry': {'type': str},
+        'build_script': BUILD_SCRIPT_SCHEMA,
+        'distros': {'type': SEQUENCE, 'items': {'type': (str,) + MAPPING}},
+        'max_parallel': {'type': int},
+        'delta': {'type': MAPPING + (bool,)},
+        'recompress': {'type': MAPPING},
+        'clone': {'type': MAPPING, 'fields': {
+            'strategy': {'type': str},
+            'paths': {'type': SEQUENCE, 'items': {'type': str}},
+        }},
+    },
+}
+CONFIG_SCHEMA = {
+    'type': MAPPING,
+    'required': ('artifacts',),
+    'fields': {
+        'artifacts': {'type': SEQUENCE, 'items': ARTIFACT_SCHEMA},
+        'architecture': {'type': str},
+        'schedule': {'type': str},
+        'webhook': {'type': (bool, str)},
+    },
+}
+
+def _type_name(value_type: type) -> str:
+    # Frozen YAML reads as what it was written as
+    return {MappingProxyType: 'dict', tuple: 'list'}.get(value_type, value_type.__name__)
+
+def compile_schema(schema: dict):
+    """Turn a schema dict into a validator(value, path, errors) closure, once."""
+    expected = schema['type'] if isinstance(schema['type'], tuple) else (schema['type'],)
+    type_names = "/".join(sorted({_type_name(t) for t in expected}))
+    # bool is an int, but never a valid number of anything here
+    rejects_bool = bool not in expected
+    required = schema.get('required', ())
+    fields = {name: compile_schema(sub) for name, sub in schema.get('fields', {}).items()}
+    items = compile_schema(schema['items']) if 'items' in schema else None
+
+    def validate(value, path: str, errors: list):
+        if not isinstance(value, expected) or (rejects_bool and isinstance(value, bool)):
+            errors.append(f"{path}: expected {type_names}, got {_type_name(type(value))}")
+            return
+        if fields or required:
+            for name in required:
+                if name not in value:
+                    errors.append(f"{path}: missing required '{name}'")
+            for name, check in fields.items():
+                if name in value:
+                    check(value[name], f"{path}.{name}", errors)
+        if items is not None:
+            for i, item in enumerate(value):
+                items(item, f"{path}[{i}]", errors)
+    return validate
+
+_validate_config = compile_schema(CONFIG_SCHEMA)
+
+def validate_config(config, source: str = "config"):
+    """Raise TemplateError listing every schema violation of a merged build config."""
+    errors = []
+    _validate_config(config, source, errors)
+    if errors:
+        raise TemplateError("; ".join(errors))
+
+def load_yaml(path: str):
+    """Frozen contents of a YAML file."""
+    with open(path, 'r') as f:
+        return loads_yaml(f)
+
+def loads_yaml(stream):
+    """Frozen contents of a YAML string or stream."""
+    return freeze(yaml.load(stream, Loader=SafeLoader) or {})
+
+def resolve_webhook(value, global_webhook: bool) -> bool:
+    """A template's webhook setting as a bool: the {{global_webhook}} placeholder, a bool or a YAML-ish string."""
+    if value == '{{global_webhook}}':
+        return global_webhook
+    if isinstance(value, str):
+        return value.strip().lower() in ('true', 'yes', 'on', '1')
+    return bool(value)
+
+class TemplateResolver:
+    """Parses build templates once and resolves them per repository.
+
+    Parsed files are cached by path and invalidated when their mtime or size
+    changes, so a long-running daemon picks up edited templates. Resolved
+    configs are frozen: artifact specs can be shared between threads and
+    repositories without copying.
+    """
+
+    def __init__(self, config_dir: str = "config"):
+        self.config_dir = config_dir
+        self.logger = Logger()
+        self._parsed = {}
+        self._lock = threading.Lock()
+
+    def parse(self, path: str):
+        """Frozen contents of the YAML file at path, parsed at most once per version of the file."""
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._parsed.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        content = load_yaml(path)
+        with self._lock:
+            self._parsed[path] = (key, content)
+        return content
+
+    def load(self, template_path: str, repo_name: str, global_schedule: str, global_webhook: bool) -> MappingProxyType:
+        """Template config/<template_path> with its placeholders filled in for repo_name."""
+        path = os.path.join(self.config_dir, template_path)
+        try:
+            template = self.parse(path)
+        except FileNotFoundError:
+            self.logger.error(f"Template file {path} not found")
+            raise
+        artifacts = tuple(
+            MappingProxyType(dict(artifact, image_name=artifact['image_name'].replace('{{repo_name}}', repo_name)))
+            if 'image_name' in artifact else artifact
+            for artifact in template.get('artifacts', ())
+        )
+        return MappingProxyType(dict(
+            template,
+            artifacts=artifacts,
+            schedule=template.get('schedule', global_schedule).replace('{{global_schedule}}', global_schedule),
+            webhook=resolve_webhook(template.get('webhook', global_webhook), global_webhook),
+        ))
+
+    @staticmethod
+    def apply_overrides(template, overrides) -> MappingProxyType:
+        """template with each artifact updated by the overrides of its type, later overrides winning."""
+        by_type = {}
+        for override in overrides:
+            by_type.setdefault(override['type'], {}).update(override)
+        if not by_type:
+            return template
+        artifacts = tuple(
+            MappingProxyType({**artifact, **by_type[artifact['type']]}) if artifact.get('type') in by_type else artifact
+            for artifact in template.get('artifacts', ())
+        )
+        return MappingProxyType(dict(template, artifacts=artifacts))
@@ -0,0 +1,100 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import os
+import shutil
+import stat
+import subprocess
+import tempfile
+import threading
+from monitoring.logger import Logger
+
+WORKSPACE_PREFIX = "zab-ws-"
+STRATEGIES = ("overlay", "reflink", "hardlink")
+
+# Workspaces of this process that have not been removed yet, which garbage collection must spare
+_active = set()
+_active_lock = threading.Lock()
+
+def active_workspaces() -> set:
+    with _active_lock:
+        return set(_active)
+
+def _copy_command(strategy: str, source_path: str, workspace: str) -> list:
+    if strategy == "hardlink":
+        # Hardlink farm: instant and free, but files are shared with the
+        # source, so only safe for builds that replace files instead of
+        # writing them in place
+        return ["cp", "-al", f"{source_path}/.", workspace]
+    return ["cp", "-a", "--reflink=auto", f"{source_path}/.", workspace]
+
+def _mount_overlay(source_path: str, root: str) -> str:
+    upper, work, merged = (os.path.join(root, d) for d in ("upper", "work", "merged"))
+    for d in (upper, work, merged):
+        os.makedirs(d)
+    subprocess.run(
+        ["mount", "-t", "overlay", "overlay", "-o", f"lowerdir={source_path},upperdir={upper},workdir={work}", merged],
+        check=True,
+        capture_output=True
+    )
+    return merged
+
+def create_workspace(source_path: str, label: str = "", strategy: str = "reflink", parent_dir: str = None) -> str:
+    """Create a private writable view of source_path in parent_dir (default the temp dir) and return its path.
+
+    Strategies:
+        overlay   overlayfs mount with source_path as the read-only lower layer.
+                  Needs CAP_SYS_ADMIN, and when builds run on the host's docker
+                  daemon the mount must propagate to it (e.g. -v /tmp:/tmp:rshared)
+        reflink   cp --reflink=auto, copy-on-write on btrfs/xfs and a plain
+                  copy elsewhere
+        hardlink  hardlink farm of source_path
+
+    Jobs building in separate workspaces cannot overwrite each other's
+    outputs, and none of them writes to source_path.
+    """
+    logger = Logger()
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown workspace strategy {strategy}, expected one of {STRATEGIES}")
+    workspace = tempfile.mkdtemp(prefix=f"{WORKSPACE_PREFIX}{label}-" if label else WORKSPACE_PREFIX, dir=parent_dir)
+    with _active_lock:
+        _active.add(workspace)
+    if strategy == "overlay":
+        try:
+            merged = _mount_overlay(source_path, workspace)
+        except (subprocess.CalledProcessError, OSError) as e:
+            _discard(workspace)
+            details = e.stderr.decode() if isinstance(e, subprocess.CalledProcessError) else e
+            logger.error(f"Failed to mount overlay workspace for {source_path}: {details}")
+            raise
+        logger.info(f"Created overlay workspace {merged} on {source_path}")
+        return merged
+    try:
+        subprocess.run(_copy_command(strategy, source_path, workspace), check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        _discard(workspace)
+        logger.error(f"Failed to create workspace from {source_path}: {e.stderr.decode()}")
+        raise
+    logger.info(f"Created {strategy} workspace {workspace} from {source_path}")
+    return workspace
+
+def _discard(workspace: str):
+    shutil.rmtree(workspace, ignore_errors=True)
+    with _active_lock:
+        _active.discard(workspace)
+
+def _make_writable(func, path, exc_info):
+    os.chmod(os.path.dirname(path), stat.S_IRWXU)
+    os.chmod(path, stat.S_IRWXU)
+    func(path)
+
+def remove_workspace(workspace: str):
+    """Remove a workspace created by create_workspace, unmounting overlays first."""
+    if not os.path.exists(workspace):
+        return
+    if os.path.ismount(workspace):
+        subprocess.run(["umount", workspace], check=False, capture_output=True)
+        workspace = os.path.dirname(workspace)
+    shutil.rmtree(workspace, onerror=_make_writable)
+    with _active_lock:
+        _active.discard(workspace)
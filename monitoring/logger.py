@@ -1,11 +1,122 @@
 #  Copyright Contributors to the Mainframe Software Hub for Linux Project.
 #  SPDX-License-Identifier: Apache-2.0
 
+import atexit
+import contextvars
+import json
 import logging
+import logging.handlers
 import os
-from datetime import datetime
+import queue
+import time
+import uuid
+from contextlib import contextmanager
+from types import MappingProxyType
+
+LOG_DIR = "logs"
+LOG_FILE = "build_system.jsonl"
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+# Fields every record carries, empty outside a build
+CONTEXT_FIELDS = ('run_id', 'build_id', 'repo', 'artifact', 'stage')
+RUN_ID = uuid.uuid4().hex[:12]
+
+_log_context = contextvars.ContextVar("zab_log_context", default=MappingProxyType({'run_id': RUN_ID}))
+
+@contextmanager
+def log_context(**fields):
+    """Add fields (repo, artifact, stage, ...) to every record logged in this context, including threads started with its copy."""
+    token = _log_context.set(MappingProxyType({**_log_context.get(), **fields}))
+    try:
+        yield
+    finally:
+        _log_context.reset(token)
+
+def current_log_context() -> dict:
+    return dict(_log_context.get())
+
+class _ContextFilter(logging.Filter):
+    """Stamps records with the caller's log context before they cross the queue to the writer thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, 'context'):
+            record.context = _log_context.get()
+        return True
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        entry.update(getattr(record, 'context', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class ConsoleFormatter(logging.Formatter):
+    """One readable line per record, prefixed with the repository and artifact it is about."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        context = getattr(record, 'context', {})
+        scope = "/".join(context[field] for field in ('repo', 'artifact') if context.get(field))
+        line = super().formatMessage(record)
+        return line.replace(" - ", f" - [{scope}] ", 1) if scope else line
+
+class BuildLogRouter(logging.Handler):
+    """Copies the records of one build into that build's own file.
+
+    Files are opened and closed by marker records put on the queue, so only
+    the writer thread touches them and every record of a build lands in its
+    file before it is closed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.formatter = JsonFormatter()
+        self.files = {}
+
+    def emit(self, record: logging.LogRecord):
+        command = getattr(record, 'build_log', None)
+        if command is not None:
+            action, build_id, path = command
+            if action == 'open':
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.files[build_id] = open(path, 'a')
+            elif build_id in self.files:
+                self.files.pop(build_id).close()
+            return
+        build_id = getattr(record, 'context', {}).get('build_id')
+        log_file = self.files.get(build_id)
+        if log_file is not None:
+            try:
+                log_file.write(self.format(record) + "\n")
+                log_file.flush()
+            except Exception:
+                self.handleError(record)
+
+    def close(self):
+        for log_file in self.files.values():
+            log_file.close()
+        self.files.clear()
+        super().close()
+
+class _SkipBuildLogCommands(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        return getattr(record, 'build_log', None) is None
 
 class Logger:
+    """Process-wide logger writing JSON lines through a background thread.
+
+    Callers only put records on a queue, stamped with their log context
+    (run_id, build_id, repo, artifact, stage). A listener thread writes them
+    to logs/build_system.jsonl, rotated by size, to the console, and to the
+    per-build files opened with open_build_log().
+    """
     _instance = None
 
     def __new__(cls):
@@ -21,16 +132,68 @@ class Logger:
         # Clear any existing handlers to prevent duplicates
         self.logger.handlers = []
 
-        # Create logs directory if it doesn't exist
-        os.makedirs('logs', exist_ok=True)
+        self.queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(self.queue)
+        queue_handler.addFilter(_ContextFilter())
+        self.logger.addHandler(queue_handler)
+        self.listener = None
+        self.log_dir = LOG_DIR
+        self.configure()
+        atexit.register(self.close)
+
+    def configure(self, log_dir: str = LOG_DIR, max_bytes: int = DEFAULT_MAX_BYTES,
+                  backup_count: int = DEFAULT_BACKUP_COUNT, console: bool = True, level: str = 'INFO'):
+        """(Re)start the writer thread with new destinations. Records queued meanwhile are kept."""
+        if self.listener is not None:
+            self.listener.stop()
+        self.log_dir = log_dir
+        os.makedirs(log_dir, exist_ok=True)
+        self.logger.setLevel(level)
+        skip_commands = _SkipBuildLogCommands()
+        file_handler = logging.handlers.RotatingFileHandler(os.path.join(log_dir, LOG_FILE), maxBytes=max_bytes,
+                                                            backupCount=backup_count)
+        file_handler.setFormatter(JsonFormatter())
+        file_handler.addFilter(skip_commands)
+        handlers = [file_handler, BuildLogRouter()]
+        if console:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(ConsoleFormatter())
+            console_handler.addFilter(skip_commands)
+            handlers.append(console_handler)
+        self.listener = logging.handlers.QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def flush(self):
+        """Wait until every queued record is written."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener.start()
+
+    def close(self):
+        """Write every queued record and stop the writer thread, at exit."""
+        # flush() would start a thread, which interpreter shutdown refuses
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def build_log_path(self, repo_name: str, build_id: str) -> str:
+        return os.path.join(self.log_dir, "builds", f"{repo_name}-{build_id}.jsonl")
+
+    def _command(self, action: str, build_id: str, path: str = None):
+        record = logging.LogRecord('BuildSystem', logging.INFO, __file__, 0, '', None, None)
+        record.build_log = (action, build_id, path)
+        record.context = _log_context.get()
+        self.queue.put_nowait(record)
 
-        # Configure file handler
-        log_file = f'logs/build_system_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-        file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.INFO)
-        formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-        file_handler.setFormatter(formatter)
-        self.logger.addHandler(file_handler)
+    @contextmanager
+    def build_log(self, repo_name: str, build_id: str):
+        """Also write the records of build_id to their own file while the block runs. Yields its path."""
+        path = self.build_log_path(repo_name, build_id)
+        self._command('open', build_id, path)
+        try:
+            yield path
+        finally:
+            self._command('close', build_id)
 
     def info(self, message: str):
         self.logger.info(message)
@@ -0,0 +1,241 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from a cached config lookup to an emulated compile of a large project
+DURATION_BUCKETS = (0.1, 0.5, 1, 5, 15, 60, 300, 900, 1800, 3600, 7200, 14400)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+def _format_labels(names: tuple, values: tuple, extra: dict = None) -> str:
+    pairs = list(zip(names, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class _Metric:
+    """A named metric with one series per combination of label values."""
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = self._new_series()
+            return series
+
+    def _default(self):
+        # Metrics without labels are used directly
+        return self.labels()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, child in series:
+            lines += child.render(self.name, self.labelnames, key)
+        return lines
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self.value
+
+    def render(self, name: str, labelnames: tuple, key: tuple) -> list:
+        return [f"{name}{_format_labels(labelnames, key)} {_format_value(self.get())}"]
+
+class _CounterValue(_Value):
+    def inc(self, amount: float = 1):
+        if amount < 0:
+            raise ValueError("Counters only go up")
+        super().inc(amount)
+
+class _GaugeValue(_Value):
+    def set(self, value: float):
+        with self._lock:
+            self.value = value
+
+    def dec(self, amount: float = 1):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from function() whenever the metric is rendered."""
+        self._function = function
+
+class _HistogramValue:
+    def __init__(self, buckets: tuple):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.sum += value
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    return
+            self.counts[-1] += 1
+
+    @contextmanager
+    def time(self):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started)
+
+    def render(self, name: str, labelnames: tuple, key: tuple) -> list:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_format_labels(labelnames, key, {'le': _format_value(bound)})} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labelnames, key)} {cumulative}")
+        return lines
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_series(self):
+        return _CounterValue()
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_series(self):
+        return _GaugeValue()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1):
+        self._default().dec(amount)
+
+    def set_function(self, function):
+        self._default().set_function(function)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_series(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+class MetricsRegistry:
+    """Metrics of this process, rendered in the Prometheus text format.
+
+    Served on /metrics by the daemon and written as a textfile (for the
+    node_exporter textfile collector) at the end of one-shot runs.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric_class, name: str, help_text: str, labelnames: tuple = (), **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, help_text, labelnames, **kwargs)
+            elif not isinstance(metric, metric_class) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: tuple = ()) -> Counter:
+        return self._register(Counter, name, help_text, labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames: tuple = ()) -> Gauge:
+        return self._register(Gauge, name, help_text, labelnames)
+
+    def histogram(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = DURATION_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labelnames, buckets=buckets)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+    def write_textfile(self, path: str):
+        """Write a snapshot atomically, so a collector never reads half a file."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+# Orchestrator
+STAGE_SECONDS = REGISTRY.histogram("zab_stage_seconds", "Time spent in each build stage", ("stage",))
+REPOSITORY_BUILDS = REGISTRY.counter("zab_repository_builds_total", "Repository builds by outcome", ("status",))
+ARTIFACT_BUILDS = REGISTRY.counter("zab_artifact_builds_total", "Artifact builds by builder and outcome", ("builder", "status"))
+ARTIFACT_SECONDS = REGISTRY.histogram("zab_artifact_seconds", "Time to build and publish an artifact", ("builder",))
+PUBLISHED_BYTES = REGISTRY.counter("zab_published_bytes_total", "Bytes of published release assets", ("builder",))
+INFLIGHT_BUILDS = REGISTRY.gauge("zab_inflight_builds", "Repository builds in progress")
+WORKSPACE_PLACEMENTS = REGISTRY.counter("zab_workspace_placements_total", "Repository builds by where they ran", ("medium",))
+RAMDISK_RESERVED_BYTES = REGISTRY.gauge("zab_ramdisk_reserved_bytes", "Ramdisk space reserved by running builds")
+REGRESSIONS = REGISTRY.counter("zab_regressions_total", "Artifact builds above their baseline, by metric", ("metric",))
+# Builders
+COMMAND_SECONDS = REGISTRY.histogram("zab_command_seconds", "Duration of builder commands", ("command",))
+COMMAND_FAILURES = REGISTRY.counter("zab_command_failures_total", "Builder commands that exited non-zero", ("command",))
+COMMAND_OUTPUT_BYTES = REGISTRY.counter("zab_command_output_bytes_total", "Output written by builder commands", ("command",))
+GC_FREED_BYTES = REGISTRY.counter("zab_gc_freed_bytes_total", "Disk space freed by garbage collection", ("category",))
+# Remotes
+REMOTE_RETRIES = REGISTRY.counter("zab_remote_retries_total", "Retried calls to a remote", ("remote",))
+REMOTE_REJECTED = REGISTRY.counter("zab_remote_rejected_total", "Calls refused by an open circuit breaker", ("remote",))
+REMOTE_CACHE_REQUESTS = REGISTRY.counter("zab_remote_cache_requests_total", "Remote build cache lookups and uploads by result",
+                                         ("operation", "result"))
+REMOTE_CACHE_BYTES = REGISTRY.counter("zab_remote_cache_bytes_total", "Artifact bytes moved to and from the remote build cache",
+                                      ("direction",))
+# Daemon
+QUEUE_DEPTH = REGISTRY.gauge("zab_queue_depth", "Repositories waiting to be built")
+WEBHOOK_EVENTS = REGISTRY.counter("zab_webhook_events_total", "Build requests by source and outcome", ("source", "status"))
@@ -0,0 +1,219 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+from monitoring.logger import Logger
+
+MODES = ("cprofile", "sample", "all")
+PROFILE_DIR = "profile-{run_id}"
+# Work outside any stage: config loading, planning, the logger thread, ...
+OUTSIDE_STAGES = "orchestrator"
+# From 3.12 cProfile hooks sys.monitoring, which is process-wide: one profile
+# at a time, recording every thread. Stages are then told apart by sampling.
+PER_THREAD_CPROFILE = sys.version_info < (3, 12)
+PROCESS_PROFILE = "process"
+DEFAULT_INTERVAL = 0.005
+# Leaf frames of threads that are blocked rather than working. Sampling is by
+# wall clock, so without this a run is mostly threads waiting on containers.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("subprocess.py", "_try_wait"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("handlers.py", "dequeue"),
+    ("thread.py", "_worker"),
+    ("socketserver.py", "serve_forever"),
+    ("process.py", "_drain"),
+}
+
+def _frame_name(code) -> str:
+    # ';' separates frames in the collapsed format
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+class Profiler:
+    """Profiles the orchestrator's own Python work, split by build stage.
+
+    cprofile: every thread runs a cProfile.Profile per stage it is in, and
+    one for its work outside stages; they are merged per stage into
+    <stage>.pstats. sample: a thread samples every thread's stack each
+    interval and counts the stacks per stage into <stage>.collapsed (and
+    all.collapsed, rooted at the stage), the input of flamegraph.pl and
+    speedscope. Samples of blocked threads are dropped.
+
+    On Python 3.12+ a cProfile.Profile covers all threads and only one can
+    run, so cprofile writes a single process.pstats instead, and the
+    sampler runs too to split the work by stage.
+    """
+
+    def __init__(self, mode: str = "all", interval: float = DEFAULT_INTERVAL):
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode {mode}, expected one of {', '.join(MODES)}")
+        self.cprofile = mode in ("cprofile", "all")
+        self.sample = mode in ("sample", "all")
+        # Per stage profiles only where a profile is per thread
+        self.stage_profiles = self.cprofile and PER_THREAD_CPROFILE
+        if self.cprofile and not PER_THREAD_CPROFILE:
+            self.sample = True
+        self._process_profile = None
+        self.interval = interval
+        self.logger = Logger()
+        self._local = threading.local()
+        # Thread ident -> stack of stage names, read by the sampler
+        self._stages = {}
+        self._profiles = defaultdict(list)
+        self._samples = defaultdict(Counter)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._sampler = None
+
+    def start(self):
+        if self.cprofile and not self.stage_profiles:
+            self.logger.warning(f"cProfile profiles all threads at once on Python {sys.version_info.major}.{sys.version_info.minor}: "
+                                f"writing one {PROCESS_PROFILE}.pstats, stages come from sampling")
+            self._process_profile = cProfile.Profile()
+            try:
+                self._process_profile.enable()
+            except ValueError:
+                self.logger.warning("Another profiler is active, not writing cProfile statistics")
+                self._process_profile = None
+        if self.sample:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profile-sampler", daemon=True)
+            self._sampler.start()
+        self._push(OUTSIDE_STAGES)
+
+    @contextmanager
+    def stage(self, name: str):
+        """Attribute the work of this thread to stage name until the block exits."""
+        self._push(name)
+        try:
+            yield
+        finally:
+            self._pop()
+
+    def _profile_stack(self) -> list:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _push(self, name: str):
+        self._stages.setdefault(threading.get_ident(), []).append(name)
+        if not self.stage_profiles:
+            return
+        stack = self._profile_stack()
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].disable()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler owns this thread
+            profile = None
+        stack.append((name, profile))
+
+    def _pop(self):
+        stages = self._stages.get(threading.get_ident())
+        if stages:
+            stages.pop()
+        if not self.stage_profiles:
+            return
+        stack = self._profile_stack()
+        name, profile = stack.pop()
+        if profile is not None:
+            profile.disable()
+            with self._lock:
+                self._profiles[name].append(profile)
+        if stack and stack[-1][1] is not None:
+            stack[-1][1].enable()
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stopping.wait(self.interval):
+            self.take_sample(skip=own)
+
+    def take_sample(self, skip: int = None):
+        """Count the current stack of every thread (but skip) under the stage it is in."""
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                continue
+            names = []
+            while frame is not None:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            stages = self._stages.get(ident)
+            try:
+                stage = stages[-1] if stages else OUTSIDE_STAGES
+            except IndexError:
+                stage = OUTSIDE_STAGES
+            with self._lock:
+                self._samples[stage][";".join(reversed(names))] += 1
+
+    def stop(self, out_dir: str) -> list:
+        """Stop profiling and write the profiles to out_dir. Call from the thread that called start(). Returns the files written."""
+        self._pop()
+        if self._process_profile is not None:
+            self._process_profile.disable()
+            with self._lock:
+                self._profiles[PROCESS_PROFILE].append(self._process_profile)
+        if self._sampler is not None:
+            self._stopping.set()
+            self._sampler.join()
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        with self._lock:
+            profiles = {name: list(entries) for name, entries in self._profiles.items()}
+            samples = {name: Counter(counts) for name, counts in self._samples.items()}
+        for name, entries in sorted(profiles.items()):
+            stats = None
+            for profile in entries:
+                try:
+                    stats = pstats.Stats(profile) if stats is None else stats.add(profile)
+                except TypeError:
+                    # Stats refuses profiles that recorded no calls
+                    continue
+            if stats is not None:
+                path = os.path.join(out_dir, f"{name}.pstats")
+                stats.dump_stats(path)
+                paths.append(path)
+        if samples:
+            for name, counts in sorted(samples.items()):
+                paths.append(self._write_collapsed(os.path.join(out_dir, f"{name}.collapsed"), counts.items()))
+            combined = ((f"{name};{stack}", count) for name, counts in sorted(samples.items()) for stack, count in counts.items())
+            paths.append(self._write_collapsed(os.path.join(out_dir, "all.collapsed"), combined))
+        self.logger.info(f"Wrote {len(paths)} profiles to {out_dir}")
+        return paths
+
+    @staticmethod
+    def _write_collapsed(path: str, stacks) -> str:
+        with open(path, "w") as f:
+            for stack, count in sorted(stacks):
+                f.write(f"{stack} {count}\n")
+        return path
+
+_profiler = None
+
+def start(mode: str = "all", interval: float = DEFAULT_INTERVAL) -> Profiler:
+    """Start profiling this process; stages entered from now on are profiled separately."""
+    global _profiler
+    _profiler = Profiler(mode, interval)
+    _profiler.start()
+    return _profiler
+
+def stop(out_dir: str) -> list:
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler.stop(out_dir) if profiler is not None else []
+
+def stage(name: str):
+    """Profiler.stage() of the running profiler, or nothing when not profiling."""
+    return _profiler.stage(name) if _profiler is not None else nullcontext()
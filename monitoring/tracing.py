@@ -0,0 +1,173 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from monitoring.logger import RUN_ID, current_log_context
+
+TRACE_FILE = "trace-{run_id}.json"
+# Spans kept in memory; a long-running daemon keeps only the newest
+DEFAULT_MAX_SPANS = 200000
+DEFAULT_TOP = 10
+# Log context fields copied into every span, so the viewer shows what a stage belonged to
+SCOPE_FIELDS = ('repo', 'artifact', 'distro')
+
+_current_span = contextvars.ContextVar("zab_span", default=None)
+
+class Span:
+    __slots__ = ('id', 'parent_id', 'name', 'category', 'start', 'end', 'thread_id', 'thread_name', 'args')
+
+    def __init__(self, span_id: int, parent_id: int, name: str, category: str, args: dict):
+        self.id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.category = category
+        self.args = args
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+        self.start = time.perf_counter()
+        self.end = None
+
+    @property
+    def seconds(self) -> float:
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def describe(self) -> str:
+        scope = "/".join(str(self.args[field]) for field in SCOPE_FIELDS if self.args.get(field) not in (None, self.name))
+        return f"{self.category} {self.name}" + (f" [{scope}]" if scope else "")
+
+class Tracer:
+    """Collects timed spans of a run and exports them in the Chrome Trace Event format.
+
+    The current span lives in a context variable, so spans opened in
+    executor threads started with submit_with_context() nest under the span
+    that submitted them.
+    """
+
+    def __init__(self, max_spans: int = DEFAULT_MAX_SPANS):
+        self.enabled = True
+        self.origin = time.perf_counter()
+        self.spans = deque(maxlen=max_spans)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def configure(self, enabled: bool = True, max_spans: int = DEFAULT_MAX_SPANS):
+        with self._lock:
+            self.enabled = enabled
+            self.spans = deque(self.spans, maxlen=max_spans)
+
+    def reset(self):
+        with self._lock:
+            self.spans.clear()
+            self.origin = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str, category: str = "stage", **args):
+        """Time the enclosed block as a child of the current span."""
+        if not self.enabled:
+            yield None
+            return
+        context = current_log_context()
+        scope = {field: context[field] for field in SCOPE_FIELDS if context.get(field)}
+        parent = _current_span.get()
+        span = Span(next(self._ids), parent.id if parent is not None else None, name, category, {**scope, **args})
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.args['error'] = type(e).__name__
+            raise
+        finally:
+            span.end = time.perf_counter()
+            _current_span.reset(token)
+            with self._lock:
+                self.spans.append(span)
+
+    def finished(self) -> list:
+        with self._lock:
+            return list(self.spans)
+
+    def events(self) -> list:
+        """The finished spans as Chrome trace complete ("X") events, plus thread name metadata."""
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in self.finished():
+            threads.setdefault(span.thread_id, span.thread_name)
+            events.append({
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': round((span.start - self.origin) * 1e6, 3),
+                'dur': round((span.end - span.start) * 1e6, 3),
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': {'span_id': span.id, 'parent_id': span.parent_id, **span.args},
+            })
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+                   for tid, name in threads.items()]
+        return events
+
+    def write(self, path: str):
+        """Write the trace for ui.perfetto.dev or chrome://tracing, atomically."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'traceEvents': self.events(), 'displayTimeUnit': 'ms', 'otherData': {'run_id': RUN_ID}}, f, default=str)
+        os.replace(tmp_path, path)
+
+    def critical_path(self) -> list:
+        """The chain of spans that determined how long the run took, as (depth, span) in order.
+
+        From the end of each span, the child that finished last is what the
+        span waited for; before that child started, the child that finished
+        last before then, and so on down the tree.
+        """
+        spans = self.finished()
+        ids = {span.id for span in spans}
+        children = {}
+        for span in spans:
+            # Spans whose parent was dropped or is still open count as roots
+            parent_id = span.parent_id if span.parent_id in ids else None
+            children.setdefault(parent_id, []).append(span)
+        path = []
+
+        def walk(siblings: list, cursor: float, depth: int):
+            chain = []
+            for span in sorted(siblings, key=lambda s: s.end, reverse=True):
+                if cursor is None or span.end <= cursor:
+                    chain.append(span)
+                    cursor = span.start
+            for span in reversed(chain):
+                path.append((depth, span))
+                walk(children.get(span.id, []), span.end, depth + 1)
+
+        walk(children.get(None, []), None, 0)
+        return path
+
+    def slowest(self, top: int = DEFAULT_TOP) -> list:
+        """The top longest spans without child spans, which is where the time was actually spent."""
+        spans = self.finished()
+        parents = {span.parent_id for span in spans}
+        return sorted((span for span in spans if span.id not in parents), key=lambda span: span.seconds, reverse=True)[:top]
+
+    def summary(self, top: int = DEFAULT_TOP) -> str:
+        """Critical path and top slowest spans, one line each."""
+        lines = ["Critical path:"]
+        lines += [f"  {'  ' * depth}{span.seconds:9.1f}s {span.describe()}" for depth, span in self.critical_path()]
+        lines.append(f"Slowest {top} spans:")
+        lines += [f"  {span.seconds:9.1f}s {span.describe()}" for span in self.slowest(top)]
+        return "\n".join(lines)
+
+TRACER = Tracer()
+
+def span(name: str, category: str = "stage", **args):
+    """TRACER.span(), for instrumenting code without holding on to the tracer."""
+    return TRACER.span(name, category, **args)
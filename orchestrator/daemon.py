@@ -0,0 +1,281 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from monitoring.logger import Logger
+from monitoring import metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+
+class WebhookDaemon:
+    """Long-running build service fed by GitHub push webhooks.
+
+    The orchestrator passed in stays warm between builds: script repos,
+    templates and builders are loaded once. Only pushes to the branch a
+    repository is configured to build (its commit) trigger builds; pushes
+    to other branches and branch deletions are ignored, since builds
+    publish releases. Push events for a repository that arrive within
+    coalesce_seconds of each other become one build of the newest commit,
+    and events for a branch that is being built wait for that build to
+    finish. At most max_queue branches can be pending; beyond that, new
+    ones are refused with 503 and a Retry-After header. A push of a new commit to a branch that is being
+    built supersedes that build: its containers are killed so its worker
+    frees up for the newer commit, which reuses its clone.
+    """
+
+    def __init__(self, orchestrator, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, workers: int = 2,
+                 coalesce_seconds: float = 10.0, max_queue: int = 100, secret: str = None, serve_metrics: bool = True):
+        self.orchestrator = orchestrator
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.coalesce_seconds = coalesce_seconds
+        self.max_queue = max_queue
+        self.secret = secret.encode() if secret else None
+        self.serve_metrics = serve_metrics
+        self.logger = Logger()
+        self.repos = {repo['name']: repo for repo in orchestrator._get_repositories()}
+        # Keyed by (repository name, branch)
+        self.pending = OrderedDict()
+        self.running = set()
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.server = None
+        self.threads = []
+        self.scheduler = None
+        self.gc_interval = None
+        metrics.QUEUE_DEPTH.set_function(lambda: len(self.pending))
+
+    def enable_scheduler(self, jitter_seconds: int = 300):
+        from orchestrator.scheduler import Scheduler
+        self.scheduler = Scheduler(self.orchestrator, self.submit, jitter_seconds)
+
+    def enable_gc(self, interval: float):
+        """Collect disk garbage every interval seconds while serving, sparing the clones and workspaces of running builds."""
+        self.gc_interval = interval
+
+    @classmethod
+    def from_config(cls, orchestrator, config: dict):
+        return cls(
+            orchestrator,
+            host=config.get('host', DEFAULT_HOST),
+            port=int(config.get('port', DEFAULT_PORT)),
+            workers=int(config.get('workers', 2)),
+            coalesce_seconds=float(config.get('coalesce_seconds', 10)),
+            max_queue=int(config.get('max_queue', 100)),
+            secret=os.environ.get('WEBHOOK_SECRET'),
+            serve_metrics=config.get('metrics', True),
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        with self.condition:
+            return len(self.pending)
+
+    def submit(self, repo_name: str, ref: str = None, sha: str = None, source: str = "webhook", deleted: bool = False) -> str:
+        """Queue a build of repo_name.
+
+        Returns "queued", "coalesced", "unknown", "disabled", "full",
+        "ignored" for a push to another branch or a deleted branch, or
+        "busy" for a scheduled build of a repository that is still building.
+        """
+        status = self._submit(repo_name, ref, sha, source, deleted)
+        metrics.WEBHOOK_EVENTS.labels(source=source, status=status).inc()
+        return status
+
+    def _submit(self, repo_name: str, ref: str, sha: str, source: str, deleted: bool = False) -> str:
+        repo = self.repos.get(repo_name)
+        if repo is None:
+            return "unknown"
+        if source == "webhook" and not self.orchestrator.repository_webhook_enabled(repo):
+            return "disabled"
+        # Builds publish releases, so only the configured branch may trigger them
+        if deleted or (ref and ref != repo['commit']):
+            return "ignored"
+        branch = ref or repo['commit']
+        key = (repo_name, branch)
+        with self.condition:
+            if source == "schedule" and key in self.running:
+                return "busy"
+            building = key in self.running
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry['sha'] = sha or entry['sha']
+                entry['events'] += 1
+                status = "coalesced"
+            elif len(self.pending) >= self.max_queue:
+                return "full"
+            else:
+                self.pending[key] = {
+                    'ref': branch,
+                    'sha': sha,
+                    'events': 1,
+                    # Scheduled builds have nothing to coalesce with
+                    'due': time.monotonic() + (0 if source == "schedule" else self.coalesce_seconds),
+                    'source': source,
+                }
+                self.condition.notify_all()
+                status = "queued"
+        if building and sha:
+            # Outside the lock: cancelling waits on docker
+            self.orchestrator.supersede(repo_name, branch, sha)
+        return status
+
+    def _next_build(self):
+        """Block until a pending branch is due and not already building."""
+        with self.condition:
+            while not self.stopping:
+                now = time.monotonic()
+                wait = None
+                for key, entry in self.pending.items():
+                    if key in self.running:
+                        continue
+                    if entry['due'] <= now:
+                        del self.pending[key]
+                        self.running.add(key)
+                        return key, entry
+                    wait = entry['due'] - now if wait is None else min(wait, entry['due'] - now)
+                self.condition.wait(timeout=wait)
+            return None, None
+
+    def _worker(self):
+        while True:
+            key, entry = self._next_build()
+            if key is None:
+                return
+            repo_name = key[0]
+            repo = dict(self.repos[repo_name], commit=entry['ref'])
+            self.logger.info(
+                f"Building {repo_name} at {repo['commit']} ({entry['sha'] or 'unknown sha'}) "
+                f"for {entry['events']} coalesced {entry['source']} events"
+            )
+            try:
+                self.orchestrator.build_repository(repo, self.orchestrator.global_schedule, self.orchestrator.global_webhook,
+                                                   sha=entry['sha'])
+            except Exception as e:
+                self.logger.error(f"Build of {repo_name} failed: {e}")
+            finally:
+                with self.condition:
+                    self.running.discard(key)
+                    self.condition.notify_all()
+
+    def verify_signature(self, body: bytes, signature: str) -> bool:
+        if self.secret is None:
+            return True
+        expected = "sha256=" + hmac.new(self.secret, body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature or "")
+
+    def start(self):
+        self.server = ThreadingHTTPServer((self.host, self.port), _handler_for(self))
+        self.port = self.server.server_address[1]
+        self.threads = [threading.Thread(target=self.server.serve_forever, name="webhook-http", daemon=True)]
+        self.threads += [threading.Thread(target=self._worker, name=f"build-worker-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self.threads:
+            thread.start()
+        if self.scheduler is not None:
+            self.scheduler.start(list(self.repos.values()))
+        if self.gc_interval is not None:
+            self.orchestrator.disk_collector.start_background(self.gc_interval, self.orchestrator.protected_paths)
+        self.logger.info(f"Webhook daemon listening on {self.host}:{self.port} with {self.workers} build workers")
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.stop()
+        if self.gc_interval is not None:
+            self.orchestrator.disk_collector.stop()
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join(timeout=5)
+
+    def serve_forever(self):
+        self.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            self.logger.info("Webhook daemon stopping")
+        finally:
+            self.stop()
+
+def _branch_from_ref(ref: str) -> str:
+    for prefix in ("refs/heads/", "refs/tags/"):
+        if ref and ref.startswith(prefix):
+            return ref[len(prefix):]
+    return ref
+
+def _handler_for(daemon: WebhookDaemon):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: dict, headers: dict = None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                running = sorted({repo_name for repo_name, _ in daemon.running})
+                self._reply(200, {"status": "ok", "queue_depth": daemon.queue_depth, "running": running})
+            elif self.path == "/metrics" and daemon.serve_metrics:
+                body = metrics.REGISTRY.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", metrics.CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/webhook":
+                self._reply(404, {"error": "not found"})
+                return
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not daemon.verify_signature(body, self.headers.get("X-Hub-Signature-256")):
+                self._reply(401, {"error": "invalid signature"})
+                return
+            event = self.headers.get("X-GitHub-Event", "push")
+            if event == "ping":
+                self._reply(200, {"status": "pong"})
+                return
+            if event != "push":
+                self._reply(200, {"status": "ignored", "event": event})
+                return
+            try:
+                payload = json.loads(body or b"{}")
+                repo_name = payload["repository"]["name"]
+            except (ValueError, KeyError, TypeError):
+                self._reply(400, {"error": "expected a push event with repository.name"})
+                return
+            status = daemon.submit(repo_name, _branch_from_ref(payload.get("ref")), payload.get("after"),
+                                   deleted=bool(payload.get("deleted")))
+            if status == "unknown":
+                self._reply(404, {"status": status, "repository": repo_name})
+            elif status == "full":
+                self._reply(503, {"status": status, "queue_depth": daemon.queue_depth},
+                            {"Retry-After": str(int(daemon.coalesce_seconds) or 1)})
+            elif status in ("disabled", "ignored"):
+                self._reply(200, {"status": status, "repository": repo_name})
+            else:
+                self._reply(202, {"status": status, "repository": repo_name, "queue_depth": daemon.queue_depth})
+
+        def log_message(self, format, *args):
+            daemon.logger.info(f"Webhook {self.address_string()} {format % args}")
+
+    return WebhookHandler
@@ -2,25 +2,84 @@
 #  SPDX-License-Identifier: Apache-2.0
 
 import yaml
-import importlib
 import os
 import shutil
 import subprocess
-import requests
 import sys
-from lib.github_api import GitHubRepo
+import tempfile
+import argparse
+from contextlib import ExitStack, contextmanager
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+from lib.build_context import BuildCancelled, BuildHandle, build_scope, check_cancelled, current_build, submit_with_context
+from lib import disk_gc, resilience
+from lib.github_api import GitHubRepo, widest_checkout
+from lib.process import error_output, track_resources
+from lib.ramdisk import RamDisk
+from lib.resilience import CircuitOpenError
+from lib.script_cache import ScriptRepoCache, DEFAULT_SCRIPT_CACHE_DIR, DEFAULT_SCRIPT_REPO
 from lib.versioning import get_version
-from monitoring.logger import Logger
+from lib.artifact_store import ArtifactStore, DEFAULT_STORE_DIR, DEFAULT_MAX_SIZE
+from lib.build_history import BuildHistory, HISTORY_FILE, artifact_label, build_key
+from lib.delta import create_release_deltas
+from lib.regressions import RegressionDetector
+from lib.sizes import format_size, parse_size
+from lib.templates import (DEFAULT_TEMPLATE, REPO_TEMPLATE_FILE, RepoConfigError, TemplateResolver, load_yaml, loads_yaml,
+                           resolve_webhook, thaw, validate_config)
+from lib.workspace import active_workspaces, create_workspace, remove_workspace
+from monitoring.logger import Logger, LOG_DIR, DEFAULT_BACKUP_COUNT, DEFAULT_MAX_BYTES, RUN_ID, log_context
+from monitoring import metrics, profiling
+from monitoring.tracing import DEFAULT_TOP, TRACE_FILE, TRACER, span
 from builders.plugins.plugin_interface import ArtifactBuilder
+from builders.registry import BuilderRegistry
+
+METRICS_TEXTFILE = "metrics.prom"
+# Exit code of a run whose only problem is a regression, with regressions.mode warn
+REGRESSION_EXIT_CODE = 3
+# Characters of a failure's output kept in the build history
+ERROR_TAIL_CHARS = 4096
+
+class ResolvedRepoConfig:
+    """Merged build config of a repository, and the metadata clone of its branch it was read from."""
+
+    def __init__(self, config, repo_obj: GitHubRepo):
+        self.config = config
+        self.repo_obj = repo_obj
+        # None if the branch could not be fetched, fetch_error says why
+        self.metadata_path = None
+        self.fetch_error = None
 
 class BuildOrchestrator:
     def __init__(self, config_path: str, selected_repos: list = None):
         self.logger = Logger()
         self.config = self._load_config(config_path)
+        self._configure_logging()
+        TRACER.configure(enabled=(self.config.get('tracing') or {}).get('enabled', True))
+        resilience.configure(self.config.get('resilience') or {})
+        self.script_cache = self._open_script_cache()
+        self.script_repo_shas = {}
         self.script_repo_paths = self._clone_scripts()
         self.builders = self._load_builders()
+        self.artifact_store = self._open_artifact_store()
+        self.history = self._open_history()
+        self.remote_cache = self._open_remote_cache()
+        self.ramdisk = self._open_ramdisk()
+        self.disk_collector = self._open_disk_gc()
+        self.regression_detector = RegressionDetector.from_config(self.history, self.config.get('regressions'))
+        # Regressions found by this run, for the end-of-run report
+        self.regressions = []
+        self.templates = TemplateResolver()
+        self.workspace_strategy = self.config.get('workspace_strategy', 'reflink')
+        self.global_schedule = self.config.get('default_schedule', '0 * * * *')
+        self.global_webhook = self.config.get('default_webhook', True)
         self.processed_repos = set()
         self.selected_repos = set(selected_repos) if selected_repos else None
+        # In-flight builds by (repo, branch), and clones of superseded builds kept for the next one
+        self.inflight = {}
+        self.parked_clones = {}
+        self.inflight_lock = threading.Lock()
 
     def _load_config(self, config_path: str) -> dict:
         try:
@@ -33,48 +92,125 @@ class BuildOrchestrator:
             self.logger.error(f"Failed to parse config file {config_path}: {e}")
             raise
 
-    def _clone_scripts(self) -> dict:
-        script_repos = self.config.get('script_repositories', [])
-        script_repo_paths = {}
-        for repo in script_repos:
-            name = repo.get('name')
-            url = repo.get('url')
-            if not name or not url:
+    def _open_script_cache(self) -> ScriptRepoCache:
+        cache_config = self.config.get('script_cache') or {}
+        return ScriptRepoCache(cache_config.get('path', DEFAULT_SCRIPT_CACHE_DIR),
+                               check_interval=float(cache_config.get('check_interval', 60)),
+                               keep=int(cache_config.get('keep', 3)))
+
+    def _script_repos(self) -> list:
+        script_repos = []
+        for repo in self.config.get('script_repositories', []):
+            if not repo.get('name') or not repo.get('url'):
                 self.logger.error(f"Invalid script repository configuration: {repo}")
                 continue
-            script_repo_path = f"/tmp/{name}"
-            if not os.path.exists(script_repo_path):
-                cmd = ["git", "clone", "--depth", "1", url, script_repo_path]
-                try:
-                    subprocess.run(cmd, check=True, capture_output=True)
-                    self.logger.info(f"Cloned script repo {url} to {script_repo_path}")
-                    script_repo_paths[name] = script_repo_path
-                except subprocess.CalledProcessError as e:
-                    self.logger.error(f"Failed to clone script repo {url}: {e.stderr.decode()}")
-                    raise
-            else:
-                self.logger.info(f"Script repo {name} already cloned at {script_repo_path}")
-                script_repo_paths[name] = script_repo_path
+            script_repos.append(repo)
+        return script_repos
+
+    def _configure_logging(self):
+        logging_config = self.config.get('logging') or {}
+        if not logging_config:
+            return
+        self.logger.configure(
+            log_dir=logging_config.get('dir', LOG_DIR),
+            max_bytes=parse_size(logging_config.get('max_size', DEFAULT_MAX_BYTES)),
+            backup_count=int(logging_config.get('backup_count', DEFAULT_BACKUP_COUNT)),
+            console=logging_config.get('console', True),
+            level=str(logging_config.get('level', 'INFO')).upper(),
+        )
+
+    def _clone_scripts(self) -> dict:
+        script_repo_paths = {}
+        for repo in self._script_repos():
+            name = repo['name']
+            try:
+                path, sha = self.script_cache.sync(name, repo['url'], repo.get('ref', 'HEAD'))
+            except subprocess.CalledProcessError as e:
+                self.logger.error(f"Failed to fetch script repo {repo['url']}: {e.stderr.decode() if e.stderr else e}")
+                raise
+            self.logger.info(f"Script repo {name} at {sha[:12]} in {path}")
+            script_repo_paths[name] = path
+            self.script_repo_shas[name] = sha
         return script_repo_paths
 
-    def _load_builders(self) -> dict:
-        builders = {
-            'script': 'builders.script.loz_script_builder.ScriptBuilder',
-            'binary_go': 'builders.binary.go_binary_builder.GoBinaryBuilder'
-        }
-        loaded_builders = {}
-        for key, module_path in builders.items():
-            module_name, class_name = module_path.rsplit('.', 1)
+    def refresh_scripts(self) -> dict:
+        """Bring the script repositories up to date if they are stale. Returns name -> (snapshot path, sha).
+
+        A script repository that cannot be updated keeps its last snapshot.
+        Snapshots that running builds started with are not pruned.
+        """
+        pinned = self.pinned_snapshots()
+        for repo in self._script_repos():
+            name = repo['name']
             try:
-                module = importlib.import_module(module_name)
-                builder = getattr(module, class_name)()
-                # Pass script_repo_paths to ScriptBuilder
-                if key == 'script':
-                    builder.set_script_repo_paths(self.script_repo_paths)
-                loaded_builders[key] = getattr(module, class_name)()
-            except ImportError as e:
-                self.logger.error(f"Failed to load builder {key}: {e}")
-        return loaded_builders
+                path, sha = self.script_cache.sync(name, repo['url'], repo.get('ref', 'HEAD'), pinned=pinned)
+            except (subprocess.CalledProcessError, CircuitOpenError, OSError, ValueError) as e:
+                self.logger.error(f"Failed to update script repo {name}: {e}")
+                continue
+            # Updated in place, builders hold on to this dict
+            self.script_repo_paths[name] = path
+            self.script_repo_shas[name] = sha
+        return {name: (path, self.script_repo_shas.get(name)) for name, path in self.script_repo_paths.items()}
+
+    def planned_scripts(self, shas: dict) -> dict:
+        """name -> (snapshot path, sha) of the script repositories at shas, as a plan recorded them. Nothing is checked for updates."""
+        urls = {repo['name']: repo['url'] for repo in self._script_repos()}
+        missing = sorted(set(shas) - set(urls))
+        if missing:
+            raise ValueError(f"Planned script repositories {', '.join(missing)} are not configured")
+        return {name: (self.script_cache.snapshot(name, urls[name], sha), sha) for name, sha in shas.items()}
+
+    def _script_sha(self, artifact: dict, script_repos: dict) -> str:
+        """Sha of the script repository the artifact builds with, or None if it has no build script."""
+        build_script = artifact.get('build_script')
+        if build_script is None:
+            return None
+        return script_repos.get(build_script.get('repo_name', DEFAULT_SCRIPT_REPO), (None, None))[1]
+
+    def _open_artifact_store(self) -> ArtifactStore:
+        store_config = self.config.get('artifact_store') or {}
+        return ArtifactStore(store_config.get('path', DEFAULT_STORE_DIR))
+
+    def _open_ramdisk(self) -> RamDisk:
+        ramdisk_config = self.config.get('ramdisk') or {}
+        ramdisk = RamDisk.from_config(ramdisk_config)
+        if ramdisk_config.get('enabled', False):
+            ramdisk.open()
+        return ramdisk
+
+    def _open_disk_gc(self) -> disk_gc.DiskCollector:
+        gc_config = self.config.get('gc') or {}
+        store_config = self.config.get('artifact_store') or {}
+        quotas = {'artifact_store': store_config.get('max_size', DEFAULT_MAX_SIZE), **(gc_config.get('quotas') or {})}
+        disk_gc.configure_images(gc_config.get('state_dir', disk_gc.DEFAULT_STATE_DIR))
+        return disk_gc.DiskCollector(
+            quotas,
+            min_age=float(gc_config.get('min_age', disk_gc.DEFAULT_MIN_AGE)),
+            temp_dirs=(tempfile.gettempdir(), self.ramdisk.path) if self.ramdisk.available else None,
+            script_cache=self.script_cache,
+            artifact_store=self.artifact_store,
+            log_dir=self.logger.log_dir,
+        )
+
+    def _open_history(self) -> BuildHistory:
+        history_config = self.config.get('build_history') or {}
+        return BuildHistory(history_config.get('path', os.path.join(self.artifact_store.root, HISTORY_FILE)))
+
+    def _open_remote_cache(self):
+        cache_config = self.config.get('remote_cache') or {}
+        if not cache_config.get('url'):
+            return None
+        # Only a remote cache needs urllib's HTTP stack
+        from lib.remote_cache import RemoteCache
+        return RemoteCache.from_config(cache_config)
+
+    def _load_builders(self) -> BuilderRegistry:
+        # Builders are imported when an artifact first needs one, so a single-repo run only pays for its own
+        return BuilderRegistry(self.config.get('builders'), configure=self._configure_builder)
+
+    def _configure_builder(self, builder: ArtifactBuilder):
+        if hasattr(builder, 'set_script_repo_paths'):
+            builder.set_script_repo_paths(self.script_repo_paths)
 
     def _get_repositories(self) -> list:
         org = self.config.get('organization')
@@ -84,10 +220,20 @@ class BuildOrchestrator:
             if not token:
                 self.logger.error("GITHUB_TOKEN not set for organization scanning")
                 raise ValueError("GITHUB_TOKEN required")
-            headers = {'Authorization': f'token {token}'}
-            response = requests.get(f'https://api.github.com/orgs/{org}/repos', headers=headers)
-            response.raise_for_status()
-            repos = [{'name': repo['name'], 'url': repo['clone_url'], 'template': 'templates/loz-script-project.yaml'} for repo in response.json()]
+            # Only scanning needs requests
+            from lib.org_scanner import OrgScanner, API_URL, DEFAULT_CACHE_DIR
+            scan_config = self.config.get('org_scan') or {}
+            scanner = OrgScanner(
+                token,
+                api_url=scan_config.get('api_url', API_URL),
+                cache_dir=scan_config.get('cache_dir', DEFAULT_CACHE_DIR),
+                max_workers=int(scan_config.get('workers', 8)),
+            )
+            repos = [
+                {'name': repo['name'], 'url': repo['clone_url'], 'commit': repo.get('default_branch', 'main'),
+                 'template': DEFAULT_TEMPLATE}
+                for repo in scanner.scan(org)
+            ]
         else:
             repos = self.config.get('repositories', [])
 
@@ -110,100 +256,782 @@ class BuildOrchestrator:
         self.logger.info(f"Found {len(unique_repos)} unique repositories: {[repo['name'] for repo in unique_repos]}")
         return unique_repos
 
-    def _load_template(self, template_path: str, repo_name: str, global_schedule: str, global_webhook: bool) -> dict:
+    def _load_template(self, template_path: str, repo_name: str, global_schedule: str, global_webhook: bool):
+        return self.templates.load(template_path, repo_name, global_schedule, global_webhook)
+
+    def repository_webhook_enabled(self, repo: dict) -> bool:
+        """Whether push webhooks may trigger builds of repo, per its entry or its template."""
+        if 'webhook' in repo:
+            return resolve_webhook(repo['webhook'], self.global_webhook)
+        template_path = repo.get('template', DEFAULT_TEMPLATE)
+        return self._load_template(template_path, repo['name'], self.global_schedule, self.global_webhook)['webhook']
+
+    def repository_schedule(self, repo: dict) -> str:
+        """Cron expression for scheduled builds of repo: its entry's, else that of its merged config.
+
+        The repository's .build-template.yaml is read from a metadata clone of
+        its branch. If that cannot be fetched, the template of its entry decides.
+        """
+        if repo.get('schedule'):
+            return repo['schedule']
+        with self.resolve_repo_config(repo) as resolved:
+            if resolved.fetch_error is not None:
+                self.logger.warning(f"Cannot read {REPO_TEMPLATE_FILE} of {repo['name']}, scheduling it per its template: "
+                                    f"{resolved.fetch_error}")
+            return resolved.config['schedule']
+
+    @contextmanager
+    def resolve_repo_config(self, repo: dict):
+        """Yield the ResolvedRepoConfig of repo: the template of its entry with the repository's .build-template.yaml applied.
+
+        .build-template.yaml is read from a metadata clone of the branch,
+        which is removed when the block exits. Errors in the template raise
+        as they are, errors in .build-template.yaml as RepoConfigError. If
+        the branch cannot be fetched, the config is the template's.
+        """
+        repo_name = repo['name']
+        config = self._load_template(repo.get('template', DEFAULT_TEMPLATE), repo_name, self.global_schedule, self.global_webhook)
+        resolved = ResolvedRepoConfig(config, GitHubRepo(repo['url']))
         try:
-            with open(f"config/{template_path}", 'r') as f:
-                template = yaml.safe_load(f)
-        except FileNotFoundError:
-            self.logger.error(f"Template file config/{template_path} not found")
-            raise
-        for artifact in template.get('artifacts', []):
-            if 'image_name' in artifact:
-                artifact['image_name'] = artifact['image_name'].replace('{{repo_name}}', repo_name)
-        template['schedule'] = template.get('schedule', global_schedule).replace('{{global_schedule}}', global_schedule)
-        template['webhook'] = template.get('webhook', global_webhook)
-        return template
-
-    def _merge_config(self, template_config: dict, repo_path: str) -> dict:
-        template_file = f"{repo_path}/.build-template.yaml"
+            repo_config_text = None
+            try:
+                resolved.metadata_path = resolved.repo_obj.clone_metadata(repo.get('commit', 'main'))
+                repo_config_text = resolved.repo_obj.read_file(resolved.metadata_path, REPO_TEMPLATE_FILE)
+            except (subprocess.CalledProcessError, CircuitOpenError) as e:
+                resolved.fetch_error = e
+            if repo_config_text is not None:
+                try:
+                    resolved.config = self._apply_repo_config(config, loads_yaml(repo_config_text), repo_name)
+                except KeyError as e:
+                    raise RepoConfigError(f"{REPO_TEMPLATE_FILE}: missing {e}") from e
+                except (OSError, yaml.YAMLError) as e:
+                    raise RepoConfigError(f"{REPO_TEMPLATE_FILE}: {e}") from e
+            yield resolved
+        finally:
+            if resolved.metadata_path:
+                shutil.rmtree(resolved.metadata_path, ignore_errors=True)
+
+    def _apply_repo_config(self, template_config, repo_config, repo_name: str):
+        """Template named by a repository's .build-template.yaml, with its overrides and schedule applied."""
+        template = self._load_template(repo_config['template'], repo_name,
+                                       template_config.get('schedule', '0 * * * *'),
+                                       template_config.get('webhook', True))
+        config = self.templates.apply_overrides(template, (repo_config.get('overrides') or {}).get('artifacts', ()))
+        if repo_config.get('schedule'):
+            config = MappingProxyType(dict(config, schedule=repo_config['schedule']))
+        return config
+
+    def _merge_config(self, template_config, repo_path: str, repo_name: str = None):
+        template_file = f"{repo_path}/{REPO_TEMPLATE_FILE}"
         if os.path.exists(template_file):
             try:
-                with open(template_file, 'r') as f:
-                    repo_config = yaml.safe_load(f)
-                template = self._load_template(repo_config['template'], os.path.basename(repo_path),
-                                            template_config.get('schedule', '0 * * * *'),
-                                            template_config.get('webhook', True))
-                for artifact in repo_config.get('overrides', {}).get('artifacts', []):
-                    for t_artifact in template['artifacts']:
-                        if t_artifact['type'] == artifact['type']:
-                            t_artifact.update(artifact)
-                return template
-            except (FileNotFoundError, yaml.YAMLError) as e:
+                # Read once per clone, so not worth caching
+                repo_config = load_yaml(template_file)
+                return self._apply_repo_config(template_config, repo_config, repo_name or os.path.basename(repo_path))
+            except (FileNotFoundError, KeyError, yaml.YAMLError) as e:
                 self.logger.error(f"Failed to load or parse {template_file}: {e}")
                 raise
         return template_config
 
-    def build_artifacts(self):
-        repos = self._get_repositories()
-        global_schedule = self.config.get('default_schedule', '0 * * * *')
-        global_webhook = self.config.get('default_webhook', True)
+    def _publish_deltas(self, builder: ArtifactBuilder, published_assets: list, repo_name: str, artifact: dict):
+        version = str(artifact.get('version', '1.0'))
+        try:
+            delta_assets = create_release_deltas(self.artifact_store, repo_name, version, published_assets, artifact['delta'])
+            if delta_assets:
+                builder.upload_release_assets(version, delta_assets, os.path.dirname(published_assets[0]))
+                self.logger.info(f"Published {len(delta_assets)} delta assets for {repo_name} {version}")
+        except (subprocess.CalledProcessError, OSError) as e:
+            # Deltas are an optimisation on top of the full artifact, never a reason to fail it
+            self.logger.warning(f"Failed to publish deltas for {repo_name} {version}: {e}")
+
+    def _store_artifacts(self, published_assets: list, repo_name: str, artifact: dict, commit: str):
+        version = str(artifact.get('version', '1.0'))
+        try:
+            for path in published_assets:
+                if not path.endswith('.sha256'):
+                    self.artifact_store.put(path, repo_name, version, self._artifact_distro(path), commit)
+        except OSError as e:
+            # The release is already out, losing the local copy only costs future deltas
+            self.logger.warning(f"Failed to store artifacts of {repo_name} {version}: {e}")
+
+    def _artifact_distro(self, artifact_path: str) -> str:
+        distro_file = os.path.join(os.path.dirname(artifact_path), '.distro_zab.txt')
+        if os.path.exists(distro_file):
+            with open(distro_file, 'r') as f:
+                return f.readline().strip() or 'default'
+        return 'default'
+
+    def _distro_artifact(self, artifact: dict, distro) -> tuple:
+        """Return (distro name, artifact config) for one entry of an artifact's distros matrix.
+
+        Entries are either a docker image ("rhel:9.4") or a mapping with name and docker_image.
+        """
+        if isinstance(distro, dict):
+            docker_image = distro['docker_image']
+            name = distro.get('name', docker_image.replace(':', '-').replace('/', '-'))
+        else:
+            docker_image = distro
+            name = distro.replace(':', '-').replace('/', '-')
+        distro_artifact = thaw({k: v for k, v in artifact.items() if k != 'distros'})
+        if 'build_script' in distro_artifact:
+            distro_artifact['build_script']['docker_image'] = docker_image
+        else:
+            distro_artifact['docker_image'] = docker_image
+        return name, distro_artifact
+
+    def _ensure_image(self, artifact: dict):
+        """Pull the artifact's build image unless it is already local, retrying against its registry.
+
+        Images a builder defaults to are left to `docker run`.
+        """
+        image = (artifact.get('build_script') or {}).get('docker_image') or artifact.get('docker_image')
+        if not image:
+            return
+        if subprocess.run(["docker", "image", "inspect", image], capture_output=True).returncode == 0:
+            return
+        self.logger.info(f"Pulling {image}")
+        resilience.call(image, subprocess.run, ["docker", "pull", image], check=True, capture_output=True)
+        disk_gc.record_image_use(image)
+
+    def _build_variant(self, builder: ArtifactBuilder, repo_path: str, repo_name: str, artifact: dict, distro) -> tuple:
+        name, distro_artifact = self._distro_artifact(artifact, distro)
+        with log_context(distro=name), span(name, "variant"):
+            self._ensure_image(distro_artifact)
+            workspace = create_workspace(repo_path, label=name, strategy=self.workspace_strategy, parent_dir=self._workspace_dir())
+            self.logger.info(f"Building {name} variant of {repo_name} in {workspace}")
+            try:
+                artifact_path = builder.build(workspace, repo_name, distro_artifact)
+            except Exception:
+                # Only successful variants hand their workspace back, for publishing
+                remove_workspace(workspace)
+                raise
+        distro_file = os.path.join(os.path.dirname(artifact_path), '.distro_zab.txt')
+        if not os.path.exists(distro_file):
+            # The script did not report its distro, fall back to the matrix entry name
+            with open(distro_file, 'w') as f:
+                f.write(f"{name}\n")
+        return workspace, artifact_path
+
+    def _build_matrix(self, builder: ArtifactBuilder, repo_path: str, repo_name: str, artifact: dict) -> tuple:
+        """Build every entry of artifact['distros'] concurrently, each in its own workspace.
+
+        Returns (workspaces, artifact paths of the successful variants).
+        """
+        distros = artifact['distros']
+        max_parallel = artifact.get('max_parallel') or len(distros)
+        workspaces = []
+        artifact_paths = []
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = {submit_with_context(executor, self._build_variant, builder, repo_path, repo_name, artifact, d): d for d in distros}
+            for future, distro in futures.items():
+                try:
+                    workspace, artifact_path = future.result()
+                    workspaces.append(workspace)
+                    artifact_paths.append(artifact_path)
+                except Exception as e:
+                    self.logger.error(f"Failed to build {distro} variant of {repo_name}: {e}")
+        if not artifact_paths:
+            for workspace in workspaces:
+                remove_workspace(workspace)
+            raise RuntimeError(f"All {len(distros)} distro variants of {repo_name} failed")
+        return workspaces, artifact_paths
+
+    @property
+    def remote_cache_upload(self) -> bool:
+        return (self.config.get('remote_cache') or {}).get('upload', True)
+
+    @property
+    def gc_enabled(self) -> bool:
+        return (self.config.get('gc') or {}).get('enabled', True)
+
+    def pinned_snapshots(self) -> set:
+        """Script repository snapshots that builds of this process started with, and use to the end."""
+        with self.inflight_lock:
+            return {path for handle in self.inflight.values() for path, _ in handle.script_repos.values() if path}
+
+    def protected_paths(self) -> list:
+        """Clones, workspaces and script snapshots in use by builds of this process, which garbage collection must spare."""
+        with self.inflight_lock:
+            paths = [handle.repo_path for handle in self.inflight.values()] + list(self.parked_clones.values())
+        return paths + list(active_workspaces()) + sorted(self.pinned_snapshots())
+
+    def collect_garbage(self, categories: tuple = disk_gc.CATEGORIES) -> dict:
+        """Evict the least recently used entries of categories that are over their gc quota. Returns bytes freed per category."""
+        return self.disk_collector.collect(categories, protected=self.protected_paths())
+
+    @contextmanager
+    def _stage(self, stage: str):
+        """Tag the log records of a build step with its name, trace it and log how long it took."""
+        started = time.monotonic()
+        with log_context(stage=stage), span(stage), profiling.stage(stage):
+            try:
+                yield
+            finally:
+                elapsed = time.monotonic() - started
+                metrics.STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+                self.logger.info(f"Stage {stage} finished in {elapsed:.1f}s")
+
+    def _builder_key(self, artifact: dict) -> str:
+        artifact_type = artifact['type']
+        return 'script' if 'build_script' in artifact else (f"binary_{artifact['language']}" if artifact_type == 'binary' else artifact_type)
+
+    def _clone_layout(self, artifact: dict) -> tuple:
+        """(strategy, paths) of the checkout an artifact needs.
+
+        The strategy is the artifact's clone.strategy, else clone_strategies
+        of the global config for its builder, else full. Other than full,
+        clone.paths and the paths the builder reads are checked out.
+        """
+        builder_key = self._builder_key(artifact)
+        clone = artifact.get('clone') or {}
+        strategy = clone.get('strategy') or (self.config.get('clone_strategies') or {}).get(builder_key, 'full')
+        paths = list(clone.get('paths') or ())
+        if strategy != 'full' and builder_key in self.builders and hasattr(self.builders[builder_key], 'clone_paths'):
+            paths += self.builders[builder_key].clone_paths(artifact)
+        return strategy, paths
+
+    def checkout_layout(self, config) -> tuple:
+        """(strategy, paths) of the clone that every artifact of config can build from."""
+        layouts = [self._clone_layout(artifact) for artifact in config.get('artifacts', ())]
+        # Any clone has the repository's own build config, which is read before the artifacts are known
+        return widest_checkout(layouts + [('metadata', [REPO_TEMPLATE_FILE])])
+
+    def workspace_estimate(self, repo_name: str, config) -> int:
+        """Bytes a build of config is expected to need for its clone and workspaces, None unless every artifact has built before."""
+        sizes = []
+        for artifact in config.get('artifacts', ()):
+            size = self.history.workspace_size(repo_name, artifact_label(artifact, self._builder_key(artifact)))
+            if size is None:
+                return None
+            sizes.append(size)
+        # Several artifacts build in copies of the clone, which takes room of its own
+        return sum(sizes) + (max(sizes) if len(sizes) > 1 else 0) if sizes else None
+
+    @staticmethod
+    def _workspace_dir() -> str:
+        handle = current_build()
+        return handle.workspace_dir if handle is not None else None
+
+    @staticmethod
+    def _workspace_bytes(paths: list) -> int:
+        try:
+            return sum(disk_gc.tree_usage(path)[0] for path in paths)
+        except OSError:
+            return None
+
+    def _record_build(self, repo_name: str, artifact: dict, builder_key: str, status: str, started: float,
+                      published_assets: list = (), error: Exception = None, peak_memory: int = None,
+                      workspace_bytes: int = None) -> dict:
+        """Add a finished build to the history that plans take cache hits, estimates and regression baselines from. Returns its record."""
+        handle = current_build()
+        sha = handle.sha if handle is not None else None
+        script_sha = self._script_sha(artifact, handle.script_repos) if handle is not None else None
+        seconds = time.monotonic() - started
+        published_bytes = sum(os.path.getsize(path) for path in published_assets if os.path.exists(path))
+        metrics.ARTIFACT_BUILDS.labels(builder=builder_key, status=status).inc()
+        metrics.ARTIFACT_SECONDS.labels(builder=builder_key).observe(seconds)
+        metrics.PUBLISHED_BYTES.labels(builder=builder_key).inc(published_bytes)
+        label = artifact_label(artifact, builder_key)
+        regressions = []
+        if status == 'success':
+            # Before recording, so the build is compared with the ones before it only
+            regressions = self.regression_detector.check(
+                repo_name, label, {'seconds': seconds, 'bytes': published_bytes, 'peak_memory': peak_memory})
+            for regression in regressions:
+                self.logger.warning(f"Regression: {regression.describe()}")
+                metrics.REGRESSIONS.labels(metric=regression.metric).inc()
+            self.regressions.extend(regressions)
+        record = dict(
+            key=build_key(repo_name, sha, artifact, script_sha) if sha else None,
+            repo=repo_name,
+            artifact=label,
+            builder=builder_key,
+            sha=sha,
+            script_sha=script_sha,
+            status=status,
+            seconds=round(seconds, 3),
+            bytes=published_bytes,
+            peak_memory=peak_memory,
+            workspace_bytes=workspace_bytes,
+            regressions=[regression.metric for regression in regressions],
+            # The end of a failed command's output, which is usually where it says why
+            error=error_output(error)[-ERROR_TAIL_CHARS:] if error is not None else None,
+            log=getattr(error, 'log_path', None),
+        )
+        try:
+            self.history.record(**record)
+        except OSError as e:
+            self.logger.warning(f"Failed to record build of {repo_name} in history: {e}")
+        return record
+
+    def _restore_from_cache(self, repo_name: str, artifact: dict, builder_key: str, commit: str) -> bool:
+        """Take an artifact from the remote cache instead of building it. Returns True on a hit.
+
+        A hit is a build with the same key that another host already built
+        and published, so only the local artifact store and history are
+        filled in, which answer for the key from then on.
+        """
+        handle = current_build()
+        if self.remote_cache is None or handle is None or handle.sha is None:
+            return False
+        key = build_key(repo_name, handle.sha, artifact, self._script_sha(artifact, handle.script_repos))
+        version = str(artifact.get('version', '1.0'))
+        with self._stage('cache'):
+            try:
+                entry = self.remote_cache.get(key)
+                if entry is None:
+                    return False
+                self.remote_cache.fetch(entry, self.artifact_store, repo_name, version, commit)
+            except Exception as e:
+                # The cache only ever saves a build, it never fails one, whatever its server does
+                self.logger.warning(f"Remote cache lookup of {builder_key} for {repo_name} failed, building it: {e}")
+                return False
+        metrics.ARTIFACT_BUILDS.labels(builder=builder_key, status='cached').inc()
+        record = {name: value for name, value in entry.items() if name not in ('version', 'files')}
+        try:
+            self.history.record(**dict(record, cached='remote'))
+        except OSError as e:
+            self.logger.warning(f"Failed to record build of {repo_name} in history: {e}")
+        self.logger.info(f"Took {builder_key} for {repo_name} from the remote cache, built in {entry.get('seconds', 0):.0f}s "
+                         f"by another host")
+        return True
+
+    def _upload_to_cache(self, record: dict, published_assets: list):
+        """Share a successful build through the remote cache."""
+        files = [{'path': path, 'digest': self.artifact_store.digest(path), 'distro': self._artifact_distro(path)}
+                 for path in published_assets if not path.endswith('.sha256') and os.path.exists(path)]
+        if not files:
+            return
+        # Local paths and timestamps mean nothing on other hosts
+        metadata = {name: value for name, value in record.items() if name not in ('error', 'log', 'timestamp')}
+        try:
+            self.remote_cache.put(record['key'], metadata, files)
+        except Exception as e:
+            # The build is published and recorded already, a misbehaving cache must not turn it into a failure
+            self.logger.warning(f"Failed to upload {record['artifact']} of {record['repo']} to the remote cache: {e}")
+
+    def _build_artifact(self, repo_path: str, repo_name: str, artifact: dict, commit: str) -> bool:
+        """Build and publish one artifact from repo_path. Returns True on success."""
+        builder_key = self._builder_key(artifact)
+        started = time.monotonic()
+        builder = self.builders.get(builder_key)
+        if not builder:
+            self.logger.error(f"No builder for {builder_key} in repository {repo_name}")
+            return False
+        variant_workspaces = []
+        label = artifact_label(artifact, builder_key)
+        with log_context(artifact=label), span(label, "artifact", builder=builder_key), track_resources() as usage:
+            try:
+                if self._restore_from_cache(repo_name, artifact, builder_key, commit):
+                    return True
+                self.logger.info(f"Building artifact type {builder_key} for {repo_name}")
+                if artifact.get('distros'):
+                    if not builder.supports_distro_matrix:
+                        raise ValueError(f"Builder {builder_key} does not support a distros matrix")
+                    with self._stage('build'):
+                        variant_workspaces, artifact_paths = self._build_matrix(builder, repo_path, repo_name, artifact)
+                    check_cancelled()
+                    self.logger.info(f"Publishing {len(artifact_paths)} variants of {builder_key} for {repo_name}")
+                    with self._stage('publish'):
+                        published_assets = builder.publish_variants(artifact_paths, repo_name, artifact)
+                else:
+                    with self._stage('pull'):
+                        self._ensure_image(artifact)
+                    with self._stage('build'):
+                        artifact_path = builder.build(repo_path, repo_name, artifact)
+                    check_cancelled()
+                    self.logger.info(f"Publishing artifact type {builder_key} for {repo_name}")
+                    with self._stage('publish'):
+                        published_assets = builder.publish(artifact_path, repo_name, artifact) or [artifact_path]
+                if artifact.get('delta'):
+                    with self._stage('deltas'):
+                        self._publish_deltas(builder, published_assets, repo_name, artifact)
+                with self._stage('store'):
+                    self._store_artifacts(published_assets, repo_name, artifact, commit)
+                self.logger.info(f"Successfully built and published {builder_key} for {repo_name}")
+                record = self._record_build(repo_name, artifact, builder_key, 'success', started, published_assets,
+                                            peak_memory=usage.peak_memory,
+                                            workspace_bytes=self._workspace_bytes([repo_path] + variant_workspaces))
+                if self.remote_cache is not None and record['key'] and self.remote_cache_upload:
+                    with self._stage('cache'):
+                        self._upload_to_cache(record, published_assets)
+                return True
+            except Exception as e:
+                handle = current_build()
+                if isinstance(e, CircuitOpenError):
+                    self.logger.warning(f"Skipping {builder_key} for project {repo_name}: {e}")
+                elif handle is not None and handle.cancelled:
+                    # Killed containers surface as build errors, report them as what they are
+                    self.logger.warning(f"Abandoned {builder_key} for project {repo_name}: {handle.reason}")
+                else:
+                    self.logger.error(f"Failed to build/publish {builder_key} for project {repo_name}: {e}")
+                    self._record_build(repo_name, artifact, builder_key, 'failed', started, error=e,
+                                       peak_memory=usage.peak_memory,
+                                       workspace_bytes=self._workspace_bytes([repo_path] + variant_workspaces))
+                return False
+            finally:
+                for workspace in variant_workspaces:
+                    remove_workspace(workspace)
+
+    def _build_in_workspace(self, snapshot_path: str, label: str, repo_name: str, artifact: dict, commit: str) -> bool:
+        try:
+            with span(label, "workspace", repo=repo_name, strategy=self.workspace_strategy):
+                workspace = create_workspace(snapshot_path, label=label, strategy=self.workspace_strategy,
+                                             parent_dir=self._workspace_dir())
+        except Exception as e:
+            self.logger.error(f"Failed to create workspace for {label} of {repo_name}: {e}")
+            return False
+        try:
+            return self._build_artifact(workspace, repo_name, artifact, commit)
+        finally:
+            remove_workspace(workspace)
+
+    def _build_repository_artifacts(self, repo_path: str, repo_name: str, artifacts: list, commit: str) -> int:
+        """Build all artifacts of a repository and return the number of failures.
+
+        With several artifacts, repo_path is a shared source snapshot that no
+        job writes to: each artifact builds concurrently in its own workspace.
+        """
+        if len(artifacts) <= 1:
+            return sum(not self._build_artifact(repo_path, repo_name, artifact, commit) for artifact in artifacts)
+        max_parallel = min(len(artifacts), self.config.get('max_parallel_artifacts') or len(artifacts))
+        self.logger.info(f"Building {len(artifacts)} artifacts of {repo_name}, {max_parallel} at a time")
+        with ThreadPoolExecutor(max_workers=max_parallel) as executor:
+            futures = [
+                submit_with_context(executor, self._build_in_workspace, repo_path, f"{self._builder_key(artifact)}-{i}", repo_name, artifact, commit)
+                for i, artifact in enumerate(artifacts)
+            ]
+            return sum(not future.result() for future in futures)
+
+    def supersede(self, repo_name: str, branch: str, sha: str) -> bool:
+        """Cancel the in-flight build of repo_name's branch if it is building a commit other than sha."""
+        with self.inflight_lock:
+            handle = self.inflight.get((repo_name, branch))
+        if handle is None or not sha or handle.sha == sha or handle.cancelled:
+            return False
+        handle.cancel(f"superseded by {sha[:12]}")
+        return True
+
+    def _checkout(self, repo_obj: GitHubRepo, repo_name: str, commit: str, layout: tuple, parent_dir: str = None) -> str:
+        """Clone as much of the repository as layout needs into parent_dir, or update the clone a superseded build left behind."""
+        strategy, paths = layout
+        with self.inflight_lock:
+            parked_path = self.parked_clones.pop(repo_name, None)
+        if parked_path:
+            try:
+                return repo_obj.widen(repo_obj.update(parked_path, commit), strategy, paths)
+            except (subprocess.CalledProcessError, OSError) as e:
+                self.logger.warning(f"Cannot reuse clone of {repo_name}, cloning afresh: {e}")
+                shutil.rmtree(parked_path, ignore_errors=True)
+        return repo_obj.clone(commit, strategy=strategy, paths=paths, parent_dir=parent_dir)
+
+    def _release_clone(self, repo_name: str, repo_path: str, handle: BuildHandle):
+        # A clone on the ramdisk must go with the build's reservation
+        if handle.cancelled and handle.workspace_dir is None:
+            with self.inflight_lock:
+                stale_path = self.parked_clones.get(repo_name)
+                self.parked_clones[repo_name] = repo_path
+            if stale_path and stale_path != repo_path:
+                shutil.rmtree(stale_path, ignore_errors=True)
+            self.logger.info(f"Keeping clone of superseded {repo_name} build for the next one")
+            return
+        self.logger.info(f"Cleaning up temporary files")
+        shutil.rmtree(repo_path, ignore_errors=True)
+
+    def _head(self, repo_obj: GitHubRepo, repo_path: str) -> str:
+        try:
+            return repo_obj.head(repo_path)
+        except (subprocess.CalledProcessError, OSError):
+            return None
+
+    def build_repository(self, repo: dict, global_schedule: str, global_webhook: bool, sha: str = None,
+                         config=None, script_shas: dict = None) -> int:
+        """Clone, build and publish one repository. Returns the number of failed artifacts.
+
+        While it runs, the build can be cancelled through supersede() with the
+        sha of a newer commit of the same branch. A planned build passes its
+        resolved config and script repository shas, and is pinned to sha if
+        the branch has moved on.
+        """
+        repo_name = repo['name']
+        repo_url = repo['url']
+        repo_commit = repo['commit']
+        template_path = repo.get('template', DEFAULT_TEMPLATE)
+        self.logger.info(f"Processing repository {repo_name}")
+
+        handle = BuildHandle(repo_name, repo_commit, sha)
+        key = (repo_name, repo_commit)
+        with self.inflight_lock:
+            self.inflight[key] = handle
+        repo_obj = GitHubRepo(repo_url)
+        metrics.INFLIGHT_BUILDS.inc()
+        status = 'failed'
+        try:
+            with build_scope(handle), log_context(repo=repo_name, build_id=handle.id), \
+                    self.logger.build_log(repo_name, handle.id), span(repo_name, "repository", build_id=handle.id), \
+                    ExitStack() as placement:
+                with self._stage('checkout'):
+                    handle.script_repos = self.refresh_scripts() if script_shas is None else self.planned_scripts(script_shas)
+                    # Planned from the resolved config; otherwise from the template, widened below if the repository's own config needs more
+                    expected = config if config is not None else self._load_template(template_path, repo_name, global_schedule, global_webhook)
+                    layout = self.checkout_layout(expected)
+                    # Held until the clone is released, after the last artifact
+                    handle.workspace_dir = placement.enter_context(self.ramdisk.reserve(self.workspace_estimate(repo_name, expected)))
+                    repo_path = self._checkout(repo_obj, repo_name, repo_commit, layout, handle.workspace_dir)
+                    handle.repo_path = repo_path
+                try:
+                    check_cancelled()
+                    head = self._head(repo_obj, repo_path)
+                    with self._stage('config'):
+                        if config is None:
+                            template_config = self._load_template(template_path, repo_name, global_schedule, global_webhook)
+                            config = self._merge_config(template_config, repo_path, repo_name)
+                        elif sha and head and head != sha:
+                            self.logger.info(f"{repo_name} {repo_commit} moved on to {head[:12]}, building planned {sha[:12]}")
+                            repo_obj.update(repo_path, sha)
+                            head = sha
+                        # Builds are recorded against the commit actually built: a webhook's sha is
+                        # stale if the branch moved on before the clone, and supersede() compares this
+                        handle.sha = head or handle.sha
+                        validate_config(config, f"{repo_name} build config")
+                        needed = self.checkout_layout(config)
+                        if needed != layout:
+                            repo_obj.widen(repo_path, *needed)
+                    failures = self._build_repository_artifacts(repo_path, repo_name, config.get('artifacts', []), repo_commit)
+                    status = 'failed' if failures else 'success'
+                    return failures
+                finally:
+                    # Only once every artifact has finished, they may all build from this clone
+                    self._release_clone(repo_name, repo_path, handle)
+        except BuildCancelled as e:
+            self.logger.warning(f"Build of {repo_name} cancelled: {e}")
+            status = 'cancelled'
+            return 0
+        finally:
+            metrics.INFLIGHT_BUILDS.dec()
+            metrics.REPOSITORY_BUILDS.labels(status='cancelled' if handle.cancelled else status).inc()
+            with self.inflight_lock:
+                if self.inflight.get(key) is handle:
+                    del self.inflight[key]
+
+    def run_preflight(self, repos: list = None):
+        """Check every repository's configuration concurrently, without building. Returns a PreflightReport."""
+        from orchestrator.preflight import Preflight
+        preflight_config = self.config.get('preflight') or {}
+        preflight = Preflight(self, max_workers=int(preflight_config.get('workers', 16)),
+                              check_images=preflight_config.get('check_images', False))
+        return preflight.run(self._get_repositories() if repos is None else repos)
+
+    def plan(self, repos: list = None) -> dict:
+        """Resolve every repository's commit, config and artifacts without building. Returns the plan."""
+        from orchestrator.planner import Planner
+        planner = Planner(self, max_workers=int((self.config.get('plan') or {}).get('workers', 16)))
+        return planner.plan(self._get_repositories() if repos is None else repos)
+
+    def execute_plan(self, plan: dict) -> list:
+        """Build a plan made by plan(), skipping its cached artifacts. Returns the names of failed repositories.
+
+        Nothing is resolved again: each repository is built at its planned
+        sha with its planned config and the script repository snapshots the
+        plan was made with.
+        """
+        with span("execute_plan", "run"):
+            return self._build_planned(plan)
+
+    def _build_planned(self, plan: dict) -> list:
+        from orchestrator.planner import planned_config
+        failed_repos = []
+        if self.gc_enabled:
+            with span("gc"):
+                self.collect_garbage()
+        for entry in plan['repositories']:
+            repo_name = entry['name']
+            if 'error' in entry:
+                self.logger.error(f"Skipping {repo_name}, it could not be planned: {entry['error']}")
+                failed_repos.append(repo_name)
+                continue
+            config = planned_config(entry)
+            if not config['artifacts']:
+                self.logger.info(f"Skipping {repo_name}, all {len(entry['artifacts'])} artifacts are already built at {entry['sha'][:12]}")
+                continue
+            repo = {'name': repo_name, 'url': entry['url'], 'commit': entry['commit']}
+            try:
+                self.build_repository(repo, self.global_schedule, self.global_webhook, sha=entry['sha'], config=config,
+                                      script_shas=plan.get('script_repos'))
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping repository {repo_name}: {e}")
+                failed_repos.append(repo_name)
+            except Exception as e:
+                self.logger.error(f"Failed to process repository {repo_name}: {e}")
+                failed_repos.append(repo_name)
+        # Only the store grew during the run, and it is bounded by artifact_store.max_size
+        with span("gc"):
+            self.collect_garbage(('artifact_store',))
+        self.logger.info("Plan execution completed")
+        return failed_repos
+
+    def write_metrics(self):
+        """Write this run's metrics as a Prometheus textfile (metrics.textfile, default <log dir>/metrics.prom)."""
+        path = (self.config.get('metrics') or {}).get('textfile') or os.path.join(self.logger.log_dir, METRICS_TEXTFILE)
+        try:
+            metrics.REGISTRY.write_textfile(path)
+            self.logger.info(f"Wrote metrics to {path}")
+        except OSError as e:
+            self.logger.warning(f"Failed to write metrics to {path}: {e}")
+
+    def write_trace(self):
+        """Write this run's spans as Chrome trace JSON and log the critical path and slowest spans.
+
+        tracing.path defaults to <log dir>/trace-<run id>.json, tracing.top to 10.
+        """
+        tracing_config = self.config.get('tracing') or {}
+        if not TRACER.enabled:
+            return
+        path = tracing_config.get('path') or os.path.join(self.logger.log_dir, TRACE_FILE.format(run_id=RUN_ID))
+        for line in TRACER.summary(int(tracing_config.get('top', DEFAULT_TOP))).splitlines():
+            self.logger.info(f"Trace: {line}")
+        try:
+            TRACER.write(path)
+            self.logger.info(f"Wrote trace to {path}, open it in ui.perfetto.dev")
+        except OSError as e:
+            self.logger.warning(f"Failed to write trace to {path}: {e}")
+
+    def build_artifacts(self) -> list:
+        """Build every configured repository. Returns the names of repositories that could not be processed."""
+        with span("build_artifacts", "run"):
+            return self._build_all(self._get_repositories())
+
+    def _build_all(self, repos: list) -> list:
+        failed_repos = []
+        # Make room before building rather than failing a build half way for want of disk
+        if self.gc_enabled:
+            with span("gc"):
+                self.collect_garbage()
+        if (self.config.get('preflight') or {}).get('enabled', True):
+            with span("preflight"):
+                report = self.run_preflight(repos)
+            for line in report.format().splitlines():
+                self.logger.warning(f"Preflight: {line}")
+            # Misconfigured repositories are reported together up front instead of one by one after cloning
+            failed_repos = sorted(report.failed_repos)
+            repos = [repo for repo in repos if repo['name'] not in report.failed_repos]
 
         self.logger.info(f"Starting build process for {len(repos)} repositories")
-        print(f"Starting build process for {len(repos)} repositories")
         for repo in repos:
             repo_name = repo['name']
             if repo_name in self.processed_repos:
                 self.logger.warning(f"Skipping already processed repository {repo_name}")
                 continue
             self.processed_repos.add(repo_name)
-            repo_url = repo['url']
-            repo_commit = repo['commit']
-            template_path = repo.get('template', 'templates/loz-script-project.yaml')
-            self.logger.info(f"Processing repository {repo_name}")
-
-            repo_obj = GitHubRepo(repo_url)
-            repo_path = repo_obj.clone(repo_commit)
-
-            template_config = self._load_template(template_path, repo_name, global_schedule, global_webhook)
-            config = self._merge_config(template_config, repo_path)
-
-            for artifact in config.get('artifacts', []):
-                artifact_type = artifact['type']
-                builder_key = 'script' if 'build_script' in artifact else (f"binary_{artifact['language']}" if artifact_type == 'binary' else artifact_type)
-                builder = self.builders.get(builder_key)
-                build_script = artifact.get('build_script', {})
-                if builder_key == 'script':
-                    builder.set_script_repo_paths(self.script_repo_paths)
-                if not builder:
-                    self.logger.error(f"No builder for {builder_key} in repository {repo_name}")
-                    continue
-                try:
-                    self.logger.info(f"Building artifact type {builder_key} for {repo_name}")
-                    print(f"Building artifact type {builder_key} for project {repo_name}")
-                    artifact_path = builder.build(repo_path, repo_name, artifact)
-                    self.logger.info(f"Publishing artifact type {builder_key} for {repo_name}")
-                    print(f"Publishing artifact type {builder_key} for project {repo_name}")
-                    builder.publish(artifact_path, repo_name, artifact)
-                    self.logger.info(f"Successfully built and published {builder_key} for {repo_name}")
-                    print(f"Successfully built and published {builder_key} for project {repo_name}")
-                    self.logger.info(f"Cleaning up temporary files")
-                    shutil.rmtree(repo_path)
-                except Exception as e:
-                    self.logger.error(f"Failed to build/publish {builder_key} for project {repo_name}: {e}")
+            # One unreachable remote or broken repository must not stop the others
+            try:
+                self.build_repository(repo, self.global_schedule, self.global_webhook)
+            except CircuitOpenError as e:
+                self.logger.warning(f"Skipping repository {repo_name}: {e}")
+                failed_repos.append(repo_name)
+            except Exception as e:
+                self.logger.error(f"Failed to process repository {repo_name}: {e}")
+                failed_repos.append(repo_name)
+        # Only the store grew during the run, and it is bounded by artifact_store.max_size
+        with span("gc"):
+            self.collect_garbage(('artifact_store',))
         self.logger.info("Build process completed")
+        return failed_repos
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python3 orchestrator/orchestrator.py <config_path> [repo_name1 repo_name2 ...]")
-        sys.exit(1)
-    
-    config_path = sys.argv[1]
-    selected_repos = sys.argv[2:] if len(sys.argv) > 2 else None
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description="Build and publish s390x artifacts for the configured repositories.")
+    parser.add_argument("config_path", help="Path to global_config.yaml")
+    parser.add_argument("repos", nargs="*", help="Only build these repositories")
+    parser.add_argument("--daemon", action="store_true", help="Serve push webhooks and build on demand instead of a one-shot run")
+    parser.add_argument("--schedule", action="store_true", help="Run the cron scheduler in daemon mode (implies --daemon)")
+    parser.add_argument("--preflight", action="store_true", help="Only check every repository's configuration and report all problems")
+    parser.add_argument("--plan", nargs="?", const="plan.json", metavar="FILE",
+                        help="Only write the build plan, with cache hits and estimates, to FILE (default plan.json)")
+    parser.add_argument("--execute-plan", metavar="FILE", help="Build the plan in FILE without resolving anything again")
+    parser.add_argument("--shard", metavar="I/N", help="With --execute-plan, build only the I-th of N balanced parts of the plan")
+    parser.add_argument("--host", help="Daemon listen address (overrides daemon.host)")
+    parser.add_argument("--port", type=int, help="Daemon listen port (overrides daemon.port)")
+    parser.add_argument("--regressions", choices=("report", "warn"),
+                        help=f"With warn, exit with {REGRESSION_EXIT_CODE} when a build regressed "
+                             "(overrides regressions.mode, default report)")
+    parser.add_argument("--profile", nargs="?", const="all", choices=profiling.MODES,
+                        help="Profile the orchestrator per stage with cProfile, a stack sampler or both (default), "
+                             "writing pstats and collapsed stacks to the log directory")
+    args = parser.parse_args(argv)
+
+    if not args.profile:
+        return _run(args)
+    profiling.start(args.profile)
+    try:
+        return _run(args)
+    finally:
+        profile_dir = os.path.join(Logger().log_dir, profiling.PROFILE_DIR.format(run_id=RUN_ID))
+        print(f"Wrote {len(profiling.stop(profile_dir))} profiles to {profile_dir}")
+
+def _run(args) -> int:
+    selected_repos = args.repos or None
     try:
+        orchestrator = BuildOrchestrator(args.config_path, selected_repos)
+        scheduler_config = orchestrator.config.get('scheduler') or {}
+        if args.daemon or args.schedule:
+            from orchestrator.daemon import WebhookDaemon
+            daemon_config = dict(orchestrator.config.get('daemon') or {})
+            if args.host:
+                daemon_config['host'] = args.host
+            if args.port is not None:
+                daemon_config['port'] = args.port
+            daemon = WebhookDaemon.from_config(orchestrator, daemon_config)
+            if args.schedule or scheduler_config.get('enabled', False):
+                daemon.enable_scheduler(int(scheduler_config.get('jitter_seconds', 300)))
+            if orchestrator.gc_enabled:
+                daemon.enable_gc(float((orchestrator.config.get('gc') or {}).get('interval', disk_gc.DEFAULT_INTERVAL)))
+            daemon.serve_forever()
+            return 0
+        if args.preflight:
+            report = orchestrator.run_preflight()
+            print(report.format() or "Preflight found no problems")
+            return 1 if report.errors else 0
+        if args.plan:
+            from orchestrator.planner import write_plan
+            plan = orchestrator.plan()
+            write_plan(plan, args.plan)
+            totals = plan['totals']
+            print(f"Wrote plan for {totals['artifacts']} artifacts in {totals['repositories']} repositories to {args.plan}: "
+                  f"{totals['cached']} cached, about {totals['seconds']:.0f}s and {format_size(totals['bytes'])} to build"
+                  + (f", {totals['unestimated']} without history" if totals['unestimated'] else ""))
+            return 1 if totals['errors'] else 0
+        if args.execute_plan:
+            from orchestrator.planner import parse_shard, read_plan, shard_plan
+            plan = read_plan(args.execute_plan)
+            if args.shard:
+                plan = shard_plan(plan, *parse_shard(args.shard))
+            if selected_repos:
+                plan['repositories'] = [entry for entry in plan['repositories'] if entry['name'] in selected_repos]
+            return _finish_run(orchestrator, orchestrator.execute_plan(plan), args)
         print("Initiating build for project ", selected_repos)
-        orchestrator = BuildOrchestrator(config_path, selected_repos)
-        orchestrator.build_artifacts()
+        failed_repos = orchestrator.build_artifacts()
         print("Build completed for project ", selected_repos)
+        return _finish_run(orchestrator, failed_repos, args)
     except Exception as e:
         print(f"Error running orchestrator: {e}")
-        sys.exit(1)
+        return 1
+
+def _finish_run(orchestrator: BuildOrchestrator, failed_repos: list, args) -> int:
+    """Write the run's metrics and trace, report failures and regressions, and return the exit code."""
+    orchestrator.write_metrics()
+    orchestrator.write_trace()
+    for regression in orchestrator.regressions:
+        print(f"Regression: {regression.describe()}")
+    if failed_repos:
+        print(f"Failed to process repositories: {', '.join(failed_repos)}")
+        return 1
+    mode = args.regressions or (orchestrator.config.get('regressions') or {}).get('mode', 'report')
+    if orchestrator.regressions and mode == 'warn':
+        return REGRESSION_EXIT_CODE
+    return 0
+
+if __name__ == "__main__":
+    # Run as a script, sys.path[0] is this directory and its orchestrator.py
+    # would shadow the orchestrator package
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.exit(main())
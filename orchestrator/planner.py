@@ -0,0 +1,155 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from lib.build_history import artifact_label, build_key
+from lib.templates import freeze, thaw, validate_config
+from monitoring.logger import Logger
+
+PLAN_VERSION = 1
+# Cost assumed for an artifact without build history when balancing shards
+DEFAULT_ESTIMATE_SECONDS = 600
+
+class Planner:
+    """Resolves what a build run would do, without building anything.
+
+    For each repository, concurrently: the branch is resolved to a commit sha
+    through a blob-less metadata clone, the template and .build-template.yaml
+    are merged and validated, and every artifact gets its builder, images,
+    build key and, from the build history, whether that exact build already
+    succeeded and how long and large it usually is.
+    """
+
+    def __init__(self, orchestrator, max_workers: int = 16):
+        self.orchestrator = orchestrator
+        self.max_workers = max_workers
+        self.logger = Logger()
+        self.script_repos = {}
+
+    def plan(self, repos: list) -> dict:
+        # Script changes are build changes too, so keys include the script repository sha
+        self.script_repos = self.orchestrator.refresh_scripts()
+        entries = []
+        if repos:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(repos))) as executor:
+                entries = list(executor.map(self._plan_repository, repos))
+        plan = {
+            'version': PLAN_VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'repositories': entries,
+            # Pinned when the plan is built, so its build keys hold
+            'script_repos': {name: sha for name, (_, sha) in self.script_repos.items() if sha},
+            'totals': plan_totals(entries),
+        }
+        totals = plan['totals']
+        self.logger.info(f"Planned {totals['artifacts']} artifacts in {totals['repositories']} repositories: "
+                         f"{totals['cached']} cached, about {totals['seconds']:.0f}s to build")
+        return plan
+
+    def _plan_repository(self, repo: dict) -> dict:
+        orchestrator = self.orchestrator
+        repo_name = repo['name']
+        commit = repo.get('commit', 'main')
+        entry = {'name': repo_name, 'url': repo['url'], 'commit': commit, 'sha': None, 'config': None, 'artifacts': []}
+        try:
+            with orchestrator.resolve_repo_config(repo) as resolved:
+                # A plan pins the sha, so a branch it cannot resolve is an error
+                if resolved.fetch_error is not None:
+                    raise resolved.fetch_error
+                entry['sha'] = resolved.repo_obj.head(resolved.metadata_path)
+                config = resolved.config
+            validate_config(config, f"{repo_name} build config")
+        except Exception as e:
+            self.logger.error(f"Cannot plan {repo_name}: {e}")
+            entry['error'] = str(e)
+            return entry
+        entry['config'] = thaw(config)
+        entry['artifacts'] = [self._plan_artifact(repo_name, entry['sha'], artifact) for artifact in config['artifacts']]
+        return entry
+
+    def _plan_artifact(self, repo_name: str, sha: str, artifact) -> dict:
+        orchestrator = self.orchestrator
+        builder_key = orchestrator._builder_key(artifact)
+        label = artifact_label(artifact, builder_key)
+        images = [(artifact.get('build_script') or {}).get('docker_image') or artifact.get('docker_image')]
+        for distro in artifact.get('distros') or ():
+            images.append(distro.get('docker_image') if hasattr(distro, 'get') else distro)
+        script_sha = orchestrator._script_sha(artifact, self.script_repos)
+        key = build_key(repo_name, sha, artifact, script_sha)
+        return {
+            'label': label,
+            'builder': builder_key,
+            'available': builder_key in orchestrator.builders,
+            'images': [image for image in images if image],
+            'script_sha': script_sha,
+            'key': key,
+            'cached': orchestrator.history.succeeded(key) is not None,
+            'estimate': orchestrator.history.estimate(repo_name, label),
+        }
+
+def plan_totals(entries: list) -> dict:
+    artifacts = [a for entry in entries for a in entry['artifacts']]
+    to_build = [a for a in artifacts if not a['cached']]
+    return {
+        'repositories': len(entries),
+        'errors': sum('error' in entry for entry in entries),
+        'artifacts': len(artifacts),
+        'cached': len(artifacts) - len(to_build),
+        'unestimated': sum(a['estimate'] is None for a in to_build),
+        'seconds': sum(a['estimate']['seconds'] for a in to_build if a['estimate']),
+        'bytes': sum(a['estimate']['bytes'] for a in to_build if a['estimate']),
+    }
+
+def repository_cost(entry: dict) -> float:
+    """Estimated seconds to build a planned repository's uncached artifacts."""
+    return sum((a['estimate'] or {}).get('seconds', DEFAULT_ESTIMATE_SECONDS)
+               for a in entry['artifacts'] if not a['cached'])
+
+def shard_plan(plan: dict, index: int, count: int) -> dict:
+    """The part of plan that shard index (0-based) of count builds.
+
+    Repositories are dealt out longest first to the least loaded shard, so
+    every shard computes the same split from the same plan file.
+    """
+    if not 0 <= index < count:
+        raise ValueError(f"Shard {index} is not in 0..{count - 1}")
+    loads = [0.0] * count
+    assigned = [[] for _ in range(count)]
+    for entry in sorted(plan['repositories'], key=lambda e: (-repository_cost(e), e['name'])):
+        shard = loads.index(min(loads))
+        loads[shard] += repository_cost(entry)
+        assigned[shard].append(entry['name'])
+    names = set(assigned[index])
+    entries = [entry for entry in plan['repositories'] if entry['name'] in names]
+    return dict(plan, repositories=entries, totals=plan_totals(entries), shard=[index, count])
+
+def parse_shard(value: str) -> tuple:
+    """(index, count) from a 1-based "i/n" shard argument."""
+    try:
+        number, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard {value!r}, expected i/n")
+    if not 1 <= number <= count:
+        raise ValueError(f"Invalid shard {value!r}, expected 1 <= i <= n")
+    return number - 1, count
+
+def write_plan(plan: dict, path: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(plan, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def read_plan(path: str) -> dict:
+    with open(path, 'r') as f:
+        plan = json.load(f)
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f"Unsupported plan version {plan.get('version')} in {path}")
+    return plan
+
+def planned_config(entry: dict):
+    """Frozen build config of a planned repository, limited to the artifacts that still need building."""
+    artifacts = [artifact for artifact, planned in zip(entry['config']['artifacts'], entry['artifacts']) if not planned['cached']]
+    return freeze(dict(entry['config'], artifacts=artifacts))
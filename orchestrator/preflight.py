@@ -0,0 +1,173 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+import yaml
+from lib import resilience
+from lib.github_api import CLONE_STRATEGIES, GitHubRepo
+from lib.resilience import CircuitOpenError
+from lib.script_cache import DEFAULT_SCRIPT_REPO
+from lib.templates import DEFAULT_TEMPLATE, RepoConfigError, TemplateError, validate_config
+from monitoring.logger import Logger
+
+# [registry[:port]/]path[:tag][@digest], as accepted by docker
+_COMPONENT = r"[a-z0-9]+(?:(?:[._]|__|-+)[a-z0-9]+)*"
+IMAGE_REFERENCE = re.compile(
+    rf"^(?:[a-zA-Z0-9](?:[a-zA-Z0-9.-]*[a-zA-Z0-9])?(?::\d+)?/)?{_COMPONENT}(?:/{_COMPONENT})*"
+    r"(?::[\w][\w.-]{0,127})?(?:@sha256:[a-f0-9]{64})?$"
+)
+
+class PreflightReport:
+    """Problems found before building, grouped per repository.
+
+    Errors mean the repository cannot build as configured. Warnings are
+    checks that could not run, e.g. because GitHub was unreachable.
+    """
+
+    def __init__(self):
+        self.errors = []
+        self.warnings = []
+        self.lock = threading.Lock()
+
+    def error(self, repo_name: str, message: str, artifact: str = None):
+        with self.lock:
+            self.errors.append((repo_name, artifact, message))
+
+    def warning(self, repo_name: str, message: str, artifact: str = None):
+        with self.lock:
+            self.warnings.append((repo_name, artifact, message))
+
+    @property
+    def failed_repos(self) -> set:
+        return {repo_name for repo_name, _, _ in self.errors}
+
+    def format(self) -> str:
+        lines = []
+        for label, problems in (("ERROR", self.errors), ("WARNING", self.warnings)):
+            for repo_name, artifact, message in sorted(problems, key=lambda p: (p[0], p[1] or "")):
+                lines.append(f"{label} {repo_name}{'/' + artifact if artifact else ''}: {message}")
+        return "\n".join(lines)
+
+class Preflight:
+    """Validates every repository's build configuration without cloning or building it.
+
+    For each repository, concurrently: the template resolves, the
+    .build-template.yaml (read from a blob-less metadata clone) merges and
+    passes the config schema, each artifact has a builder, script paths
+    exist in the repository tree, script repositories are configured and
+    docker image references are well-formed. With check_images, images are
+    also looked up in their registries.
+    """
+
+    def __init__(self, orchestrator, max_workers: int = 16, check_images: bool = False):
+        self.orchestrator = orchestrator
+        self.max_workers = max_workers
+        self.check_images = check_images
+        self.logger = Logger()
+        self.image_results = {}
+        self.image_lock = threading.Lock()
+
+    def run(self, repos: list) -> PreflightReport:
+        report = PreflightReport()
+        if repos:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(repos))) as executor:
+                list(executor.map(lambda repo: self._check_repository(repo, report), repos))
+        self.logger.info(f"Preflight checked {len(repos)} repositories: "
+                         f"{len(report.errors)} errors in {len(report.failed_repos)} repositories, {len(report.warnings)} warnings")
+        return report
+
+    def _check_repository(self, repo: dict, report: PreflightReport):
+        repo_name = repo['name']
+        with ExitStack() as stack:
+            try:
+                resolved = stack.enter_context(self.orchestrator.resolve_repo_config(repo))
+            except RepoConfigError as e:
+                report.error(repo_name, str(e))
+                return
+            except (OSError, yaml.YAMLError) as e:
+                report.error(repo_name, f"template {repo.get('template', DEFAULT_TEMPLATE)}: {e}")
+                return
+            if resolved.fetch_error is not None:
+                report.warning(repo_name, f"could not fetch {repo.get('commit', 'main')} to check it: {_describe(resolved.fetch_error)}")
+            self._check_config(repo_name, resolved.config, resolved.repo_obj, resolved.metadata_path, report)
+
+    def _check_config(self, repo_name: str, config, repo_obj: GitHubRepo, metadata_path: str, report: PreflightReport):
+        try:
+            validate_config(config, "config")
+        except TemplateError as e:
+            report.error(repo_name, str(e))
+            return
+        for i, artifact in enumerate(config['artifacts']):
+            label = artifact.get('name') or f"{artifact['type']}[{i}]"
+            self._check_artifact(repo_name, label, artifact, repo_obj, metadata_path, report)
+
+    def _check_artifact(self, repo_name: str, label: str, artifact, repo_obj: GitHubRepo, metadata_path: str,
+                        report: PreflightReport):
+        orchestrator = self.orchestrator
+        try:
+            builder_key = orchestrator._builder_key(artifact)
+        except KeyError as e:
+            report.error(repo_name, f"missing {e}", label)
+            return
+        builder = orchestrator.builders.get(builder_key)
+        if builder is None:
+            report.error(repo_name, f"no builder for {builder_key} (have {', '.join(sorted(orchestrator.builders)) or 'none'})", label)
+        elif artifact.get('distros') and not builder.supports_distro_matrix:
+            report.error(repo_name, f"builder {builder_key} does not support a distros matrix", label)
+        build_script = artifact.get('build_script')
+        if build_script is not None:
+            script_repo = build_script.get('repo_name', DEFAULT_SCRIPT_REPO)
+            if script_repo not in orchestrator.script_repo_paths:
+                report.error(repo_name, f"script repository {script_repo} is not configured", label)
+            if metadata_path and not repo_obj.has_path(metadata_path, build_script['path']):
+                report.error(repo_name, f"build_script.path {build_script['path']} does not exist", label)
+        clone = artifact.get('clone') or {}
+        if clone.get('strategy') and clone['strategy'] not in CLONE_STRATEGIES:
+            report.error(repo_name, f"unknown clone.strategy {clone['strategy']}, expected one of {', '.join(CLONE_STRATEGIES)}", label)
+        for path in clone.get('paths') or ():
+            if metadata_path and not repo_obj.has_path(metadata_path, path.strip('/')):
+                report.error(repo_name, f"clone.paths {path} does not exist", label)
+        images = [(build_script or {}).get('docker_image') or artifact.get('docker_image')]
+        for distro in artifact.get('distros') or ():
+            images.append(distro.get('docker_image') if hasattr(distro, 'get') else distro)
+        for image in filter(None, images):
+            message = self._check_image(image)
+            if message:
+                report.error(repo_name, message, label)
+
+    def _check_image(self, image: str) -> str:
+        """Problem with a docker image reference, or None. Registry lookups are made once per image."""
+        if not IMAGE_REFERENCE.match(image):
+            return f"invalid docker image reference {image!r}"
+        if not self.check_images:
+            return None
+        with self.image_lock:
+            if image in self.image_results:
+                return self.image_results[image]
+        problem = None
+        try:
+            # A missing image is not transient, so it is not retried
+            resilience.call(image, subprocess.run, ["docker", "manifest", "inspect", image],
+                            check=True, capture_output=True, text=True, retry=False)
+        except subprocess.CalledProcessError as e:
+            if re.search(r"no such manifest|manifest unknown|not found", e.stderr or "", re.IGNORECASE):
+                problem = f"docker image {image} does not exist"
+            else:
+                self.logger.warning(f"Could not look up {image}: {_describe(e)}")
+        except (CircuitOpenError, OSError) as e:
+            self.logger.warning(f"Could not look up {image}: {e}")
+        with self.image_lock:
+            self.image_results[image] = problem
+        return problem
+
+def _describe(error: Exception) -> str:
+    """Last line of a failed command's stderr, which is where git and docker say what went wrong."""
+    stderr = getattr(error, 'stderr', None)
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode(errors='replace')
+    lines = (stderr or "").strip().splitlines()
+    return lines[-1] if lines else str(error)
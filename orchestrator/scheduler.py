@@ -0,0 +1,181 @@
+#  Copyright Contributors to the Mainframe Software Hub for Linux Project.
+#  SPDX-License-Identifier: Apache-2.0
+
+import threading
+import zlib
+from datetime import datetime, timedelta, timezone
+from monitoring.logger import Logger
+
+MACROS = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@nightly": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+MONTH_NAMES = {name: i for i, name in enumerate(
+    ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"], start=1)}
+DAY_NAMES = {name: i for i, name in enumerate(["SUN", "MON", "TUE", "WED", "THU", "FRI", "SAT"])}
+
+class CronExpression:
+    """Standard 5-field cron expression (minute hour day-of-month month day-of-week), in UTC.
+
+    Supports *, lists, ranges, steps, month/day names and the @hourly style
+    macros. As in cron, when both day fields are restricted a time matches
+    if either of them does.
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        fields = MACROS.get(expression.strip().lower(), expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Invalid cron expression {expression!r}: expected 5 fields")
+        self.minutes = self._parse_field(fields[0], 0, 59)
+        self.hours = self._parse_field(fields[1], 0, 23)
+        self.days = self._parse_field(fields[2], 1, 31)
+        self.months = self._parse_field(fields[3], 1, 12, MONTH_NAMES)
+        # 7 is an alias for Sunday
+        self.weekdays = {d % 7 for d in self._parse_field(fields[4], 0, 7, DAY_NAMES)}
+        self.days_restricted = not fields[2].startswith("*")
+        self.weekdays_restricted = not fields[4].startswith("*")
+
+    def _parse_field(self, field: str, low: int, high: int, names: dict = None) -> set:
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+                if step < 1:
+                    raise ValueError(f"Invalid step in cron expression {self.expression!r}")
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (self._parse_value(p, names) for p in part.split("-", 1))
+            else:
+                start = self._parse_value(part, names)
+                end = high if step > 1 else start
+            if not low <= start <= end <= high:
+                raise ValueError(f"Value out of range {low}-{high} in cron expression {self.expression!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _parse_value(self, text: str, names: dict = None) -> int:
+        if names and text.upper() in names:
+            return names[text.upper()]
+        try:
+            return int(text)
+        except ValueError:
+            raise ValueError(f"Invalid value {text!r} in cron expression {self.expression!r}") from None
+
+    def _day_matches(self, moment: datetime) -> bool:
+        day_ok = moment.day in self.days
+        weekday_ok = (moment.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def matches(self, moment: datetime) -> bool:
+        return (moment.minute in self.minutes and moment.hour in self.hours
+                and moment.month in self.months and self._day_matches(moment))
+
+    def next_after(self, moment: datetime) -> datetime:
+        """First whole minute strictly after moment that matches."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+            elif candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        raise ValueError(f"Cron expression {self.expression!r} never matches")
+
+def jitter_offset(repo_name: str, max_jitter_seconds: int) -> timedelta:
+    """Stable per-repository delay in [0, max_jitter_seconds], so repos sharing a schedule spread out."""
+    if max_jitter_seconds <= 0:
+        return timedelta(0)
+    return timedelta(seconds=zlib.crc32(repo_name.encode()) % (int(max_jitter_seconds) + 1))
+
+class Scheduler:
+    """Triggers builds per repository from the cron schedule of its merged config.
+
+    submit(repo_name, source="schedule") queues a build and is expected to
+    return "busy" when the previous build of that repository is still
+    running, in which case the tick is skipped.
+    """
+
+    def __init__(self, orchestrator, submit, jitter_seconds: int = 300, clock=None):
+        self.orchestrator = orchestrator
+        self.submit = submit
+        self.jitter_seconds = jitter_seconds
+        self.clock = clock or (lambda: datetime.now(timezone.utc))
+        self.logger = Logger()
+        self.entries = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def load(self, repos: list):
+        now = self.clock()
+        self.entries = {}
+        for repo in repos:
+            try:
+                cron = CronExpression(self.orchestrator.repository_schedule(repo))
+            except Exception as e:
+                # A broken .build-template.yaml or cron expression unschedules that repository only
+                self.logger.error(f"Not scheduling {repo['name']}: {e}")
+                continue
+            jitter = jitter_offset(repo['name'], repo.get('schedule_jitter', self.jitter_seconds))
+            slot = cron.next_after(now - jitter)
+            self.entries[repo['name']] = {'cron': cron, 'jitter': jitter, 'slot': slot}
+            self.logger.info(f"Scheduled {repo['name']} with '{cron.expression}' (+{int(jitter.total_seconds())}s), next at {slot + jitter}")
+
+    def next_run(self, repo_name: str) -> datetime:
+        entry = self.entries[repo_name]
+        return entry['slot'] + entry['jitter']
+
+    def tick(self) -> list:
+        """Trigger every repository whose next run is due. Returns the names submitted."""
+        now = self.clock()
+        triggered = []
+        for repo_name, entry in self.entries.items():
+            if entry['slot'] + entry['jitter'] > now:
+                continue
+            # Missed slots (e.g. after a long pause) collapse into this one trigger
+            entry['slot'] = entry['cron'].next_after(now - entry['jitter'])
+            status = self.submit(repo_name, source="schedule")
+            if status == "busy":
+                self.logger.warning(f"Skipping scheduled build of {repo_name}: previous build still running")
+            elif status in ("queued", "coalesced"):
+                triggered.append(repo_name)
+            else:
+                self.logger.warning(f"Scheduled build of {repo_name} not queued: {status}")
+        return triggered
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            self.tick()
+            if not self.entries:
+                self.stop_event.wait(60)
+                continue
+            wait = min(self.next_run(name) for name in self.entries) - self.clock()
+            self.stop_event.wait(min(max(wait.total_seconds(), 1), 60))
+
+    def start(self, repos: list):
+        self.load(repos)
+        self.thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
@@ -2,6 +2,9 @@ import pytest
 import os
 import tempfile
 import shutil
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 
 @pytest.fixture
@@ -37,3 +40,138 @@ def sample_artifact():
         "version": "1.0.0",
         "type": "binary"
     }
+
+
+@pytest.fixture(autouse=True)
+def fresh_resilience(mocker):
+    """Give every test its own circuit breakers and retries without delays."""
+    from lib import resilience
+    instance = resilience.Resilience(sleep=lambda seconds: None)
+    mocker.patch.object(resilience, "_resilience", instance)
+    return instance
+
+
+@pytest.fixture(autouse=True)
+def isolated_disk_gc(mocker, tmp_path):
+    """Keep garbage collection in tests off the host: no quotas unless configured and a private image ledger."""
+    from lib import disk_gc
+    mocker.patch.dict(disk_gc.DEFAULT_QUOTAS, {category: None for category in disk_gc.DEFAULT_QUOTAS})
+    mocker.patch.object(disk_gc, "_ledger", disk_gc.ImageLedger(str(tmp_path / "gc" / disk_gc.IMAGES_FILE)))
+    mocker.patch.object(disk_gc, "configure_images")
+
+
+def _tree_state(root: str) -> dict:
+    """mtime of every file under root, but for git's and Python's caches."""
+    state = {}
+    for path, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if d not in (".git", "__pycache__", ".pytest_cache")]
+        for name in files:
+            file_path = os.path.join(path, name)
+            state[os.path.relpath(file_path, root)] = os.stat(file_path).st_mtime_ns
+    return state
+
+
+_repository_state = {}
+
+
+def pytest_configure(config):
+    """Create the logger without its default ./logs destinations, before test modules create it on import."""
+    from monitoring.logger import Logger
+    _repository_state.update(_tree_state(ROOT))
+    # Records queue up until a fixture gives it a directory
+    with mock.patch.object(Logger, "configure"):
+        Logger()
+
+
+@pytest.fixture(scope="session")
+def session_log_dir(tmp_path_factory):
+    """Log directory between tests. The run must leave the repository as it found it."""
+    from monitoring.logger import Logger
+    logger = Logger()
+    log_dir = str(tmp_path_factory.mktemp("logs"))
+    logger.configure(log_dir=log_dir, console=False)
+    yield log_dir
+    logger.flush()
+    after = _tree_state(ROOT)
+    changed = sorted(path for path in after if _repository_state.get(path) != after[path])
+    assert not changed, f"Tests wrote into the repository: {', '.join(changed)}"
+
+
+@pytest.fixture(autouse=True)
+def isolated_logs(session_log_dir, tmp_path):
+    """Write the log file, metrics, traces and build and command logs of a test under its tmp_path, without console output."""
+    from monitoring.logger import Logger
+    logger = Logger()
+    logger.configure(log_dir=str(tmp_path / "logs"), console=False)
+    yield
+    logger.configure(log_dir=session_log_dir, console=False)
+
+
+class CacheServer:
+    """In-memory stand-in for a remote build cache: stores PUT bodies by path and serves them back."""
+
+    def __init__(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        import threading
+        server = self
+        self.blobs = {}
+        self.requests = []
+        # Status codes to answer the next requests with, instead of serving them
+        self.failures = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def _answer(self, method):
+                server.requests.append((method, self.path))
+                if server.failures:
+                    self.send_error(server.failures.pop(0))
+                    return None
+                return self.path.split("/", 2)[-1]
+
+            def do_GET(self):
+                path = self._answer("GET")
+                if path is None:
+                    return
+                if path not in server.blobs:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(server.blobs[path])))
+                self.end_headers()
+                self.wfile.write(server.blobs[path])
+
+            def do_HEAD(self):
+                path = self._answer("HEAD")
+                if path is None:
+                    return
+                self.send_response(200 if path in server.blobs else 404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_PUT(self):
+                path = self._answer("PUT")
+                if path is None:
+                    return
+                server.blobs[path] = self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(201)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/zab"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def cache_server():
+    """A remote build cache served over HTTP on localhost."""
+    server = CacheServer()
+    yield server
+    server.close()
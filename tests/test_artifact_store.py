@@ -0,0 +1,123 @@
+import pytest
+import os
+import time
+from lib.artifact_store import ArtifactStore, file_digest
+from lib.sizes import parse_size, format_size
+
+
+def _write(directory, name, data):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+class TestArtifactStore:
+    """Test the content-addressed artifact store."""
+
+    def test_put_creates_object_and_view(self, temp_repo_dir):
+        """Test a stored file is reachable through its named view."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        path = _write(os.path.join(temp_repo_dir, "ws"), "app-1.0-linux-s390x.tar.gz", b"tarball")
+
+        digest = store.put(path, "app", "1.0", "ubuntu-22.04", commit="main")
+
+        assert digest == file_digest(path)
+        entry = store.lookup("app", "1.0", "ubuntu-22.04")[0]
+        assert entry["commit"] == "main"
+        assert entry["path"] == os.path.join(store.root, "views", "app", "1.0", "ubuntu-22.04", "app-1.0-linux-s390x.tar.gz")
+        with open(entry["path"], "rb") as f:
+            assert f.read() == b"tarball"
+
+    def test_identical_content_is_deduplicated(self, temp_repo_dir):
+        """Test byte-identical outputs of two distros share one object."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        a = _write(os.path.join(temp_repo_dir, "a"), "app.tar.gz", b"same bytes")
+        b = _write(os.path.join(temp_repo_dir, "b"), "app.tar.gz", b"same bytes")
+
+        store.put(a, "app", "1.0", "ubuntu-22.04")
+        store.put(b, "app", "1.0", "rhel-9.4")
+
+        assert store.total_size() == len(b"same bytes")
+        views = [e["path"] for e in store.lookup("app", "1.0")]
+        assert os.stat(views[0]).st_ino == os.stat(views[1]).st_ino
+
+    def test_object_can_be_linked_under_another_name(self, temp_repo_dir):
+        """Test an object the store holds is found by digest and viewed under the name given."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        path = _write(os.path.join(temp_repo_dir, "ws"), "app.tar.gz", b"tarball")
+        digest = store.put(path, "app", "1.0")
+        assert store.object_path("0" * 64) is None
+
+        store.put(store.object_path(digest), "app", "1.1", filename="app.tar.gz")
+
+        assert [entry["filename"] for entry in store.lookup("app", "1.1")] == ["app.tar.gz"]
+
+    def test_object_is_independent_of_the_stored_file(self, temp_repo_dir):
+        """Test storing leaves the caller's file alone, and changing it later does not reach the object."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        path = _write(os.path.join(temp_repo_dir, "ws"), "app.tar.gz", b"tarball")
+        mode = os.stat(path).st_mode
+
+        store.put(path, "app", "1.0")
+        with open(path, "wb") as f:
+            f.write(b"rebuilt")
+
+        assert os.stat(path).st_mode == mode
+        with open(store.lookup("app")[0]["path"], "rb") as f:
+            assert f.read() == b"tarball"
+
+    def test_entries_survive_workspace_removal(self, temp_repo_dir):
+        """Test stored artifacts outlive the clone they were built in."""
+        import shutil
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        workspace = os.path.join(temp_repo_dir, "ws")
+        store.put(_write(workspace, "app.tar.gz", b"payload"), "app", "1.0")
+
+        shutil.rmtree(workspace)
+
+        with open(store.lookup("app")[0]["path"], "rb") as f:
+            assert f.read() == b"payload"
+
+    def test_previous_skips_identical_content(self, temp_repo_dir):
+        """Test previous() returns the newest different counterpart."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        store.put(_write(os.path.join(temp_repo_dir, "v1"), "app-1.0.tar.gz", b"one"), "app", "1.0")
+        new = _write(os.path.join(temp_repo_dir, "v2"), "app-1.1.tar.gz", b"two")
+        store.put(new, "app", "1.1")
+
+        version, path = store.previous("app", "1.1", new)
+
+        assert version == "1.0"
+        assert path.endswith(os.path.join("app", "1.0", "default", "app-1.0.tar.gz"))
+
+    def test_gc_evicts_least_recently_used(self, temp_repo_dir):
+        """Test garbage collection drops the oldest objects and their views."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        old = store.put(_write(os.path.join(temp_repo_dir, "v1"), "app-1.0.tar.gz", b"x" * 100), "app", "1.0")
+        time.sleep(0.01)
+        store.put(_write(os.path.join(temp_repo_dir, "v2"), "app-1.1.tar.gz", b"y" * 100), "app", "1.1")
+
+        freed = store.gc(150)
+
+        assert freed == 100
+        assert [e["version"] for e in store.lookup("app")] == ["1.1"]
+        assert not os.path.exists(os.path.join(store.root, "objects", old[:2], old))
+        assert not os.path.exists(os.path.join(store.root, "views", "app", "1.0"))
+        assert store.gc(150) == 0
+
+
+class TestSizes:
+    """Test size parsing used by quotas."""
+
+    @pytest.mark.parametrize("value,expected", [(512, 512), ("800M", 800 * 1024 ** 2), ("20G", 20 * 1024 ** 3), ("1.5K", 1536)])
+    def test_parse_size(self, value, expected):
+        assert parse_size(value) == expected
+
+    def test_parse_size_invalid(self):
+        with pytest.raises(ValueError, match="Invalid size"):
+            parse_size("lots")
+
+    def test_format_size(self):
+        assert format_size(1536) == "1.5K"
@@ -0,0 +1,44 @@
+import pytest
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from lib.build_context import BuildCancelled, BuildHandle, build_scope, current_build, docker_label_args, submit_with_context
+
+
+class TestBuildContext:
+    """Test build handles, container labels and cancellation."""
+
+    def test_no_labels_outside_a_build(self):
+        assert current_build() is None
+        assert docker_label_args() == []
+
+    def test_labels_follow_into_worker_threads(self):
+        """Test the build handle reaches executor threads started inside the scope."""
+        handle = BuildHandle("kind", "main", "a1")
+        with build_scope(handle):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                args = submit_with_context(executor, docker_label_args).result()
+        assert args == ["--label", f"zab.build={handle.id}"]
+        assert current_build() is None
+
+    def test_cancel_kills_labelled_containers(self, mocker):
+        """Test cancel() kills the build's containers and stops new ones from starting."""
+        mock_run = mocker.patch("lib.build_context.subprocess.run",
+                                return_value=subprocess.CompletedProcess([], 0, stdout="c1\nc2\n"))
+        handle = BuildHandle("kind", "main", "a1")
+
+        handle.cancel("superseded by b2")
+
+        assert mock_run.call_args_list[0][0][0] == ["docker", "ps", "-q", "--filter", f"label=zab.build={handle.id}"]
+        assert mock_run.call_args_list[1][0][0] == ["docker", "kill", "c1", "c2"]
+        with build_scope(handle):
+            with pytest.raises(BuildCancelled, match="superseded by b2"):
+                docker_label_args()
+
+    def test_cancel_survives_docker_errors(self, mocker):
+        """Test a failing docker kill still marks the build cancelled."""
+        mocker.patch("lib.build_context.subprocess.run", side_effect=subprocess.CalledProcessError(1, "docker"))
+        handle = BuildHandle("kind", "main")
+
+        handle.cancel("superseded")
+
+        assert handle.cancelled
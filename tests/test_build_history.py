@@ -0,0 +1,54 @@
+import pytest
+import os
+from lib.build_history import BuildHistory, build_key
+from lib.templates import freeze
+
+
+@pytest.fixture
+def history(temp_repo_dir):
+    return BuildHistory(os.path.join(temp_repo_dir, "history", "history.jsonl"))
+
+
+class TestBuildHistory:
+    """Test the build history that plans take cache hits and estimates from."""
+
+    def test_estimate_is_median_of_recent_successes(self, history):
+        for seconds in (10, 30, 20, 500):
+            history.record(key=None, repo="app", artifact="cli", status="success", seconds=seconds, bytes=seconds * 100)
+        history.record(key=None, repo="app", artifact="cli", status="failed", seconds=1, bytes=0)
+        history.record(key=None, repo="other", artifact="cli", status="success", seconds=1000, bytes=1)
+
+        assert history.estimate("app", "cli") == {"seconds": 25.0, "bytes": 2500, "samples": 4}
+        assert history.estimate("app", "docs") is None
+
+    def test_workspace_size_is_largest_of_recent_successes(self, history):
+        for size in (100, 300, 200):
+            history.record(key=None, repo="app", artifact="cli", status="success", seconds=1, bytes=1, workspace_bytes=size)
+        history.record(key=None, repo="app", artifact="cli", status="failed", seconds=1, bytes=0, workspace_bytes=900)
+        history.record(key=None, repo="app", artifact="docs", status="success", seconds=1, bytes=1)
+
+        assert history.workspace_size("app", "cli") == 300
+        assert history.workspace_size("app", "docs") is None
+
+    def test_history_survives_reopening(self, history):
+        """Test records are read back by another process, skipping a torn last line."""
+        history.record(key="k1", repo="app", artifact="cli", status="success", seconds=5, bytes=10)
+        with open(history.path, "a") as f:
+            f.write('{"key": "k2", "repo"')
+
+        reopened = BuildHistory(history.path)
+
+        assert reopened.succeeded("k1")["seconds"] == 5
+        assert reopened.succeeded("k2") is None
+
+    def test_only_successes_are_cache_hits(self, history):
+        history.record(key="k1", repo="app", artifact="cli", status="failed", seconds=5, bytes=0)
+
+        assert history.succeeded("k1") is None
+
+    def test_build_key_depends_on_commit_and_spec(self):
+        artifact = {"type": "binary", "language": "go", "version": "1.0"}
+
+        assert build_key("app", "a1", freeze(artifact)) == build_key("app", "a1", dict(reversed(artifact.items())))
+        assert build_key("app", "a1", artifact) != build_key("app", "b2", artifact)
+        assert build_key("app", "a1", artifact) != build_key("app", "a1", dict(artifact, version="1.1"))
@@ -0,0 +1,70 @@
+import pytest
+import os
+import io
+import shutil
+import tarfile
+from lib.compression import STATS_FILE, recompress_tarballs, recompressed_path
+from monitoring.logger import Logger
+
+
+def _make_tarball(directory, name="app-1.0.0-linux-s390x.tar.gz"):
+    path = os.path.join(directory, name)
+    payload = b"s390x binary contents\n" * 4096
+    with tarfile.open(path, "w:gz") as tar:
+        info = tarfile.TarInfo("app/bin/app")
+        info.size = len(payload)
+        tar.addfile(info, io.BytesIO(payload))
+    return path
+
+
+class TestRecompressedPath:
+    """Test naming of recompressed tarballs."""
+
+    def test_zstd_extension(self):
+        assert recompressed_path("/x/app-1.0-linux-s390x.tar.gz", "zstd") == "/x/app-1.0-linux-s390x.tar.zst"
+
+    def test_xz_extension(self):
+        assert recompressed_path("/x/app-1.0-linux-s390x.tar.gz", "xz") == "/x/app-1.0-linux-s390x.tar.xz"
+
+
+class TestRecompressTarballs:
+    """Test parallel recompression of release tarballs."""
+
+    @pytest.mark.skipif(shutil.which("zstd") is None or shutil.which("xz") is None, reason="zstd/xz not installed")
+    def test_recompress_to_all_codecs(self, temp_repo_dir, mocker):
+        """Test each codec produces a valid tarball with stats recorded."""
+        log_dir = os.path.join(temp_repo_dir, "logs")
+        mocker.patch.object(Logger(), "log_dir", log_dir)
+        tarball = _make_tarball(temp_repo_dir)
+
+        results = recompress_tarballs([tarball], ["zstd", "xz"], levels={"zstd": 3, "xz": 1})
+
+        assert [r["codec"] for r in results] == ["zstd", "xz"]
+        for result in results:
+            assert os.path.exists(result["output"])
+            assert not os.path.exists(f"{result['output']}.partial")
+            assert result["source_bytes"] == os.path.getsize(tarball)
+            assert result["output_bytes"] == os.path.getsize(result["output"])
+            assert result["seconds"] >= 0
+        with tarfile.open(results[1]["output"], "r:xz") as tar:
+            assert tar.getnames() == ["app/bin/app"]
+        with open(os.path.join(log_dir, STATS_FILE)) as f:
+            assert len(f.readlines()) == 2
+        # The original tarball is left in place for compatibility
+        assert os.path.exists(tarball)
+
+    def test_unknown_codec(self, temp_repo_dir):
+        """Test unknown codecs are rejected before any work starts."""
+        with pytest.raises(ValueError, match="Unsupported compression codecs"):
+            recompress_tarballs([_make_tarball(temp_repo_dir)], ["brotli"])
+
+    def test_failed_compressor_leaves_no_partial(self, temp_repo_dir, mocker):
+        """Test a corrupt input fails cleanly without leftovers."""
+        import subprocess
+        path = os.path.join(temp_repo_dir, "broken.tar.gz")
+        with open(path, "wb") as f:
+            f.write(b"not gzip")
+
+        with pytest.raises(subprocess.CalledProcessError):
+            recompress_tarballs([path], ["xz"], levels={"xz": 1})
+        assert not os.path.exists(recompressed_path(path, "xz") + ".partial")
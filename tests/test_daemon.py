@@ -0,0 +1,228 @@
+import pytest
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from lib.disk_gc import DiskCollector
+from orchestrator.daemon import WebhookDaemon
+
+
+class StubOrchestrator:
+    """Orchestrator stand-in that records builds instead of running them."""
+    global_schedule = "0 * * * *"
+    global_webhook = True
+
+    def __init__(self, repos, build_seconds=0.0, webhook_disabled=()):
+        self.repos = repos
+        self.build_seconds = build_seconds
+        self.webhook_disabled = set(webhook_disabled)
+        self.builds = []
+        self.superseded = []
+        self.built = threading.Event()
+
+    def _get_repositories(self):
+        return self.repos
+
+    def repository_webhook_enabled(self, repo):
+        return repo["name"] not in self.webhook_disabled
+
+    def supersede(self, repo_name, branch, sha):
+        self.superseded.append((repo_name, branch, sha))
+        return True
+
+    def build_repository(self, repo, global_schedule, global_webhook, sha=None):
+        time.sleep(self.build_seconds)
+        self.builds.append(dict(repo, sha=sha))
+        self.built.set()
+        return 0
+
+
+def _post(daemon, payload, event="push"):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{daemon.port}/webhook",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json", "X-GitHub-Event": event},
+    )
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def _push(repo, sha, ref="refs/heads/main"):
+    return {"ref": ref, "after": sha, "repository": {"name": repo}}
+
+
+@pytest.fixture
+def start_daemon():
+    daemons = []
+
+    def start(orchestrator, **kwargs):
+        daemon = WebhookDaemon(orchestrator, port=0, **kwargs)
+        daemon.start()
+        daemons.append(daemon)
+        return daemon
+    yield start
+    for daemon in daemons:
+        daemon.stop()
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class TestWebhookDaemon:
+    """Test the webhook daemon over HTTP on localhost."""
+
+    def test_burst_is_coalesced_into_one_build(self, start_daemon):
+        """Test several pushes within the window build the newest commit once."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        daemon = start_daemon(orchestrator, coalesce_seconds=0.3)
+
+        statuses = [_post(daemon, _push("kind", sha))[1]["status"] for sha in ("a1", "b2", "c3")]
+
+        assert statuses == ["queued", "coalesced", "coalesced"]
+        assert _wait_for(lambda: len(orchestrator.builds) == 1)
+        time.sleep(0.4)
+        assert len(orchestrator.builds) == 1
+        assert orchestrator.builds[0]["commit"] == "main"
+
+    def test_push_during_build_waits_for_it(self, start_daemon):
+        """Test an event for a building branch starts a second build afterwards."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}], build_seconds=0.3)
+        daemon = start_daemon(orchestrator, coalesce_seconds=0.0, workers=2)
+
+        _post(daemon, _push("kind", "a1"))
+        assert _wait_for(lambda: ("kind", "main") in daemon.running)
+        _post(daemon, {"repository": {"name": "kind"}})
+
+        assert _wait_for(lambda: len(orchestrator.builds) == 2)
+        assert [build["commit"] for build in orchestrator.builds] == ["main", "main"]
+        assert orchestrator.builds[0]["sha"] == "a1"
+
+    def test_push_to_other_branch_is_ignored(self, start_daemon):
+        """Test only the configured branch builds, so feature branches never publish releases."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        daemon = start_daemon(orchestrator, coalesce_seconds=0.3)
+
+        status, body = _post(daemon, _push("kind", "b2", ref="refs/heads/feature"))
+        assert (status, body["status"]) == (200, "ignored")
+        assert _post(daemon, _push("kind", "a1"))[1]["status"] == "queued"
+
+        assert _wait_for(lambda: len(orchestrator.builds) == 1)
+        time.sleep(0.4)
+        assert [(build["commit"], build["sha"]) for build in orchestrator.builds] == [("main", "a1")]
+
+    def test_branch_deletion_is_ignored(self, start_daemon):
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        daemon = start_daemon(orchestrator, coalesce_seconds=0)
+
+        status, body = _post(daemon, dict(_push("kind", "0" * 40), deleted=True))
+
+        assert (status, body["status"]) == (200, "ignored")
+        assert daemon.queue_depth == 0
+        time.sleep(0.1)
+        assert orchestrator.builds == []
+
+    def test_push_to_building_branch_supersedes_build(self, start_daemon):
+        """Test a newer commit of the branch being built cancels the stale build."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}], build_seconds=0.3)
+        daemon = start_daemon(orchestrator, coalesce_seconds=0.0)
+
+        _post(daemon, _push("kind", "a1"))
+        assert _wait_for(lambda: ("kind", "main") in daemon.running)
+        _post(daemon, _push("kind", "b2"))
+
+        assert orchestrator.superseded == [("kind", "main", "b2")]
+        assert _wait_for(lambda: len(orchestrator.builds) == 2)
+        assert orchestrator.builds[1]["sha"] == "b2"
+
+    def test_backpressure_when_queue_full(self, start_daemon):
+        """Test new repositories are refused with 503 once the queue is full."""
+        repos = [{"name": n, "url": "u", "commit": "main"} for n in ("kind", "opa")]
+        daemon = start_daemon(StubOrchestrator(repos), coalesce_seconds=10, max_queue=1)
+
+        assert _post(daemon, _push("kind", "a1"))[0] == 202
+        status, body = _post(daemon, _push("opa", "b2"))
+
+        assert status == 503
+        assert body["queue_depth"] == 1
+        # Events for an already queued repository still coalesce
+        assert _post(daemon, _push("kind", "c3"))[0] == 202
+
+    def test_unknown_and_disabled_repositories(self, start_daemon):
+        """Test unconfigured repos and repos without webhooks are not built."""
+        orchestrator = StubOrchestrator([{"name": "envoy", "url": "u", "commit": "main"}], webhook_disabled=["envoy"])
+        daemon = start_daemon(orchestrator, coalesce_seconds=0)
+
+        assert _post(daemon, _push("missing", "a1"))[0] == 404
+        assert _post(daemon, _push("envoy", "a1"))[1]["status"] == "disabled"
+        assert _post(daemon, {}, event="ping")[1]["status"] == "pong"
+        assert daemon.queue_depth == 0
+
+    def test_signature_is_verified(self, start_daemon):
+        """Test a configured secret rejects unsigned payloads."""
+        daemon = start_daemon(StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}]), secret="s3cret")
+
+        assert _post(daemon, _push("kind", "a1"))[0] == 401
+
+    def test_scheduled_build_of_running_repo_is_busy(self, start_daemon):
+        """Test the scheduler is told to skip a repository that is still building."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}], build_seconds=0.3)
+        daemon = start_daemon(orchestrator, coalesce_seconds=10)
+
+        assert daemon.submit("kind", source="schedule") == "queued"
+        assert _wait_for(lambda: ("kind", "main") in daemon.running)
+
+        assert daemon.submit("kind", source="schedule") == "busy"
+        assert daemon.queue_depth == 0
+
+    def test_metrics_endpoint(self, start_daemon):
+        """Test /metrics serves the Prometheus text format with the queue depth and webhook outcomes."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        daemon = start_daemon(orchestrator, coalesce_seconds=60)
+        _post(daemon, _push("kind", "a1"))
+        _post(daemon, _push("unknown-repo", "a1"))
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{daemon.port}/metrics") as response:
+            content_type = response.headers["Content-Type"]
+            lines = response.read().decode().splitlines()
+
+        assert content_type.startswith("text/plain; version=0.0.4")
+        assert "zab_queue_depth 1" in lines
+        assert any(line.startswith('zab_webhook_events_total{source="webhook",status="unknown"}') for line in lines)
+        assert "# TYPE zab_stage_seconds histogram" in lines
+
+    def test_metrics_endpoint_can_be_disabled(self, start_daemon):
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        daemon = start_daemon(orchestrator, serve_metrics=False)
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(f"http://127.0.0.1:{daemon.port}/metrics")
+        assert error.value.code == 404
+
+    def test_background_gc_spares_running_builds(self, mocker):
+        """Test the daemon collects disk garbage every interval, protecting what running builds use at the time."""
+        orchestrator = StubOrchestrator([{"name": "kind", "url": "u", "commit": "main"}])
+        orchestrator.disk_collector = DiskCollector()
+        orchestrator.protected_paths = lambda: ["/tmp/zab-clone-running"]
+        collect = mocker.patch.object(orchestrator.disk_collector, "collect", return_value={})
+        daemon = WebhookDaemon(orchestrator, port=0)
+        daemon.enable_gc(0.01)
+        daemon.start()
+        try:
+            assert _wait_for(lambda: collect.call_count >= 2)
+        finally:
+            daemon.stop()
+
+        collect.assert_called_with(protected=["/tmp/zab-clone-running"])
+        calls = collect.call_count
+        time.sleep(0.05)
+        assert collect.call_count == calls
@@ -0,0 +1,49 @@
+import pytest
+import os
+import shutil
+import subprocess
+from lib.artifact_store import ArtifactStore
+from lib.delta import APPLY_TOOL_NAME, create_release_deltas
+
+pytestmark = pytest.mark.skipif(shutil.which("zstd") is None, reason="zstd not installed")
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+class TestCreateReleaseDeltas:
+    """Test delta creation and application."""
+
+    def test_delta_roundtrip(self, temp_repo_dir, mocker):
+        """Test the apply tool rebuilds the new artifact from the delta."""
+        payload = os.urandom(200000)
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        old = _write(os.path.join(temp_repo_dir, "old", "app-1.0-linux-s390x.tar.gz"), payload)
+        store.put(old, "app", "1.0")
+        new = _write(os.path.join(temp_repo_dir, "new", "app-1.1-linux-s390x.tar.gz"), payload + b"patch release")
+
+        uploads = create_release_deltas(store, "app", "1.1", [new, f"{new}.sha256"], True)
+
+        delta = f"{new}.from-1.0.zstpatch"
+        assert uploads == [delta, f"{delta}.sha256", os.path.join(temp_repo_dir, "new", APPLY_TOOL_NAME)]
+        assert os.path.getsize(delta) < len(payload) // 10
+
+        out_dir = os.path.join(temp_repo_dir, "out")
+        os.makedirs(out_dir)
+        subprocess.run(["sh", uploads[-1], store.lookup("app", "1.0")[0]["path"], delta],
+                       cwd=out_dir, check=True, capture_output=True)
+        with open(os.path.join(out_dir, os.path.basename(new)), "rb") as f:
+            assert f.read() == payload + b"patch release"
+
+    def test_patterns_filter_assets(self, temp_repo_dir):
+        """Test only assets matching the configured patterns get deltas."""
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+        old = _write(os.path.join(temp_repo_dir, "old", "app-1.0-linux-s390x.rpm"), b"old rpm")
+        store.put(old, "app", "1.0")
+        new = _write(os.path.join(temp_repo_dir, "new", "app-1.1-linux-s390x.rpm"), b"new rpm")
+
+        assert create_release_deltas(store, "app", "1.1", [new], {"patterns": ["*.tar.gz"]}) == []
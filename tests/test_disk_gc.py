@@ -0,0 +1,148 @@
+import pytest
+import os
+import subprocess
+from lib import disk_gc
+from lib.disk_gc import DiskCollector, ImageLedger, record_image_use, tree_usage
+
+NOW = 1_000_000.0
+HOUR = 3600
+# The shipped defaults, before the isolated_disk_gc fixture clears them for each test
+SHIPPED_QUOTAS = dict(disk_gc.DEFAULT_QUOTAS)
+
+
+def _tree(root, name, last_used, size=4096):
+    """A directory holding one file, last modified at last_used."""
+    path = os.path.join(root, name)
+    os.makedirs(path)
+    with open(os.path.join(path, "data"), "wb") as f:
+        f.write(b"x" * size)
+    os.utime(os.path.join(path, "data"), (last_used, last_used))
+    os.utime(path, (last_used, last_used))
+    return path
+
+
+def _collector(temp_dir, quotas, **kwargs):
+    return DiskCollector(quotas, min_age=HOUR, temp_dirs=[temp_dir] if temp_dir else None, clock=lambda: NOW, **kwargs)
+
+
+class FakeScriptCache:
+    def __init__(self, snapshots):
+        self.snapshots = snapshots
+        self.removed = []
+
+    def stale_snapshots(self):
+        return [("scripts", path) for path in self.snapshots]
+
+    def remove_snapshot(self, name, path):
+        self.removed.append(path)
+
+
+class TestDiskCollector:
+    """Test quota enforcement by least recent use."""
+
+    def test_least_recently_used_workspaces_are_evicted_first(self, temp_repo_dir):
+        oldest = _tree(temp_repo_dir, "zab-clone-a", NOW - 3 * HOUR)
+        older = _tree(temp_repo_dir, "zab-ws-b", NOW - 2 * HOUR)
+        newer = _tree(temp_repo_dir, "zab-meta-c", NOW - 1.5 * HOUR)
+        size = tree_usage(oldest)[0]
+        quota = tree_usage(older)[0] + tree_usage(newer)[0]
+
+        freed = _collector(temp_repo_dir, {"workspaces": quota}).collect(("workspaces",))
+
+        assert freed == {"workspaces": size}
+        assert not os.path.exists(oldest)
+        assert os.path.isdir(older) and os.path.isdir(newer)
+
+    def test_recent_protected_and_foreign_paths_are_kept(self, temp_repo_dir):
+        """Test nothing used within min_age, in use by a build, or not ours is evicted, even over quota."""
+        stale = _tree(temp_repo_dir, "zab-clone-a", NOW - 3 * HOUR)
+        protected = _tree(temp_repo_dir, "zab-ws-b", NOW - 3 * HOUR)
+        recent = _tree(temp_repo_dir, "zab-ws-c", NOW - 60)
+        foreign = _tree(temp_repo_dir, "other", NOW - 3 * HOUR)
+
+        _collector(temp_repo_dir, {"workspaces": 0}).collect(("workspaces",), protected=[protected])
+
+        assert not os.path.exists(stale)
+        assert all(os.path.isdir(path) for path in (protected, recent, foreign))
+
+    def test_stale_mirror_snapshots_are_removed_through_the_cache(self, temp_repo_dir):
+        old = _tree(temp_repo_dir, "old", NOW - 3 * HOUR)
+        cache = FakeScriptCache([old])
+
+        _collector(temp_repo_dir, {"mirrors": 0}, script_cache=cache).collect(("mirrors",))
+
+        assert cache.removed == [old]
+
+    def test_build_logs_are_evicted(self, temp_repo_dir):
+        builds = os.path.join(temp_repo_dir, "logs", "builds")
+        os.makedirs(builds)
+        old = _tree(builds, "app-1", NOW - 3 * HOUR)
+
+        _collector(temp_repo_dir, {"logs": 0}, log_dir=os.path.join(temp_repo_dir, "logs")).collect(("logs",))
+
+        assert not os.path.exists(old)
+
+    def test_only_ledger_images_are_removed_by_last_use(self, mocker):
+        """Test images are evicted in order of recorded use, and images docker no longer has are forgotten."""
+        record_image_use("old:1")
+        disk_gc._ledger.touch("old:1", now=NOW - 3 * HOUR)
+        disk_gc._ledger.touch("newer:1", "gone:1", now=NOW - 2 * HOUR)
+        sizes = {"old:1": "100", "newer:1": "100"}
+
+        def run(cmd, **kwargs):
+            if cmd[:3] == ["docker", "image", "inspect"]:
+                image = cmd[-1]
+                return subprocess.CompletedProcess(cmd, 0 if image in sizes else 1, stdout=sizes.get(image, ""))
+            return subprocess.CompletedProcess(cmd, 0)
+        docker = mocker.patch("lib.disk_gc.subprocess.run", side_effect=run)
+
+        freed = _collector(None, {"images": 150}).collect(("images",))
+
+        assert freed == {"images": 100}
+        assert ["docker", "image", "rm", "old:1"] in [call.args[0] for call in docker.call_args_list]
+        assert set(disk_gc._ledger.images()) == {"newer:1"}
+
+    def test_build_cache_is_pruned_by_docker(self, mocker):
+        docker = mocker.patch("lib.disk_gc.subprocess.run", return_value=subprocess.CompletedProcess(
+            [], 0, stdout="Deleted build cache objects:\nabc123\n\nTotal reclaimed space: 1.5GB\n"))
+
+        freed = _collector(None, {"build_cache": "20G"}).collect(("build_cache",))
+
+        assert freed == {"build_cache": int(1.5 * 1024 ** 3)}
+        docker.assert_called_once_with(["docker", "builder", "prune", "--force", "--keep-storage", str(20 * 1024 ** 3)],
+                                       check=True, capture_output=True, text=True)
+
+    def test_build_cache_is_left_alone_by_default(self, mocker):
+        mocker.patch.dict(disk_gc.DEFAULT_QUOTAS, SHIPPED_QUOTAS)
+        docker = mocker.patch("lib.disk_gc.subprocess.run")
+
+        freed = _collector(None, {}).collect(("build_cache",))
+
+        assert freed == {}
+        docker.assert_not_called()
+
+    def test_failing_category_does_not_stop_the_others(self, temp_repo_dir, mocker):
+        mocker.patch("lib.disk_gc.subprocess.run", side_effect=FileNotFoundError("docker"))
+        stale = _tree(temp_repo_dir, "zab-clone-a", NOW - 3 * HOUR)
+
+        freed = _collector(temp_repo_dir, {"build_cache": "1G", "workspaces": 0}).collect()
+
+        assert "build_cache" not in freed
+        assert freed["workspaces"] > 0
+        assert not os.path.exists(stale)
+
+    def test_unknown_category(self):
+        with pytest.raises(ValueError, match="Unknown gc categories"):
+            DiskCollector({"caches": "1G"})
+
+
+class TestImageLedger:
+
+    def test_ledger_is_shared_through_its_file(self, temp_repo_dir):
+        path = os.path.join(temp_repo_dir, "state", "images.json")
+        ImageLedger(path).touch("app:1", "")
+        other = ImageLedger(path)
+
+        assert list(other.images()) == ["app:1"]
+        other.forget("app:1")
+        assert ImageLedger(path).images() == {}
@@ -0,0 +1,112 @@
+import pytest
+import os
+import shutil
+import subprocess
+from lib.github_api import GitHubRepo, sparse_patterns, widest_checkout
+
+
+def _files(path):
+    return sorted(os.path.relpath(os.path.join(root, name), path)
+                  for root, dirs, names in os.walk(path) if ".git" not in root.split(os.sep) for name in names)
+
+
+@pytest.fixture
+def origin(temp_repo_dir):
+    """A repository with a build config, a script and a large source tree, serving partial clones."""
+    path = os.path.join(temp_repo_dir, "origin")
+    files = {".build-template.yaml": "template: t", "README.md": "readme", "scripts/build.sh": "echo build",
+             "src/main.go": "package main", "docs/guide.md": "guide"}
+    for name, content in files.items():
+        os.makedirs(os.path.dirname(os.path.join(path, name)), exist_ok=True)
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+    subprocess.run(["git", "init", "-q", "-b", "main", path], check=True)
+    subprocess.run(["git", "-C", path, "config", "uploadpack.allowFilter", "true"], check=True)
+    subprocess.run(["git", "-C", path, "add", "."], check=True)
+    subprocess.run(["git", "-C", path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], check=True)
+    return f"file://{path}"
+
+
+class TestCloneStrategies:
+    """Test clones that check out only what a build needs."""
+
+    def test_sparse_clone_checks_out_only_its_paths(self, origin):
+        repo = GitHubRepo(origin)
+        path = repo.clone("main", strategy="sparse", paths=[".build-template.yaml", "scripts/build.sh"])
+        try:
+            assert _files(path) == [".build-template.yaml", "scripts/build.sh"]
+            assert repo.sparse_paths(path) == ["/.build-template.yaml", "/scripts/build.sh"]
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_widen_adds_paths_and_never_narrows(self, origin):
+        repo = GitHubRepo(origin)
+        path = repo.clone("main", strategy="metadata", paths=[".build-template.yaml"])
+        try:
+            repo.widen(path, "sparse", ["src/"])
+            assert _files(path) == [".build-template.yaml", "src/main.go"]
+            repo.widen(path, "metadata", [".build-template.yaml"])
+            assert _files(path) == [".build-template.yaml", "src/main.go"]
+
+            repo.widen(path, "full")
+            assert repo.sparse_paths(path) is None
+            assert _files(path) == [".build-template.yaml", "README.md", "docs/guide.md", "scripts/build.sh", "src/main.go"]
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_full_clone_has_no_sparse_paths(self, origin):
+        repo = GitHubRepo(origin)
+        path = repo.clone("main")
+        try:
+            assert repo.sparse_paths(path) is None
+            assert repo.widen(path, "sparse", ["src"]) == path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def test_unknown_strategy(self, origin):
+        with pytest.raises(ValueError, match="Unknown clone strategy"):
+            GitHubRepo(origin).clone("main", strategy="shallow")
+
+    @pytest.mark.parametrize("strategy", ["full", "sparse"])
+    def test_missing_branch_leaves_nothing_behind(self, origin, temp_repo_dir, strategy):
+        parent = os.path.join(temp_repo_dir, "clones")
+        os.makedirs(parent)
+
+        with pytest.raises(subprocess.CalledProcessError):
+            GitHubRepo(origin).clone("nope", strategy=strategy, parent_dir=parent)
+        assert os.listdir(parent) == []
+
+    def test_failed_sparse_checkout_leaves_nothing_behind(self, origin, temp_repo_dir, mocker):
+        parent = os.path.join(temp_repo_dir, "clones")
+        os.makedirs(parent)
+        mocker.patch.object(GitHubRepo, "_set_sparse", side_effect=subprocess.CalledProcessError(128, "git"))
+
+        with pytest.raises(subprocess.CalledProcessError):
+            GitHubRepo(origin).clone("main", strategy="sparse", paths=["src/"], parent_dir=parent)
+        assert os.listdir(parent) == []
+
+    def test_open_breaker_leaves_nothing_behind(self, origin, temp_repo_dir, fresh_resilience, mocker):
+        from lib.resilience import CircuitOpenError
+        parent = os.path.join(temp_repo_dir, "clones")
+        os.makedirs(parent)
+        mocker.patch.object(fresh_resilience.breaker("github.com"), "before_call",
+                            side_effect=CircuitOpenError("github.com", 300))
+
+        with pytest.raises(CircuitOpenError):
+            GitHubRepo("https://github.com/org/app").clone("main", parent_dir=parent)
+        assert os.listdir(parent) == []
+
+
+class TestWidestCheckout:
+
+    def test_widest_strategy_and_union_of_paths(self):
+        assert widest_checkout([("metadata", ["a"]), ("sparse", ["b", "a"])]) == ("sparse", ("a", "b"))
+        assert widest_checkout([("sparse", ["b"]), ("full", [])]) == ("full", ())
+        assert widest_checkout([]) == ("metadata", ())
+
+    def test_unknown_strategy(self):
+        with pytest.raises(ValueError, match="Unknown clone strategy"):
+            widest_checkout([("blobless", [])])
+
+    def test_patterns_are_anchored(self):
+        assert sparse_patterns(["src/", "/docs", "", "src"]) == ["/docs", "/src"]
@@ -73,6 +73,21 @@ class TestGoBinaryBuilder:
         with pytest.raises(subprocess.CalledProcessError):
             builder.build(temp_repo_dir, "error-app", artifact)
 
+    def test_build_error_reports_container_output(self, temp_repo_dir, mocker):
+        """Test a failed build raises with the end of the container output instead of crashing on it."""
+        import subprocess
+        from lib.process import CommandFailed
+
+        def docker_run(cmd, stdout=None, **kwargs):
+            os.write(stdout, b"main.go:3: undefined: fmt.Printn\n")
+            raise subprocess.CalledProcessError(1, cmd)
+        mocker.patch('subprocess.run', side_effect=docker_run)
+
+        builder = GoBinaryBuilder()
+
+        with pytest.raises(CommandFailed, match="undefined: fmt.Printn"):
+            builder.build(temp_repo_dir, "error-app", {"version": "1.0.0"})
+
     def test_build_creates_output_directory(self, temp_repo_dir, mocker):
         """Test that build creates the build directory if it doesn't exist."""
         mock_run = mocker.patch('subprocess.run')
@@ -178,3 +193,18 @@ class TestGoBinaryBuilder:
         # Verify cwd parameter
         gh_call = mock_run.call_args
         assert gh_call[1]['cwd'] == os.path.dirname(artifact_path)
+
+    @patch('lib.checksum.generate_checksum')
+    def test_publish_returns_assets(self, mock_checksum, temp_repo_dir, mocker):
+        """Test publish returns the uploaded files."""
+        artifact_path = os.path.join(temp_repo_dir, "go-app_1.0.0_s390x")
+        with open(artifact_path, "w") as f:
+            f.write("fake binary")
+
+        mock_checksum.return_value = "abc123"
+        mocker.patch('subprocess.run')
+
+        builder = GoBinaryBuilder()
+        assets = builder.publish(artifact_path, "go-app", {"version": "1.0.0"})
+
+        assert assets == [artifact_path, f"{artifact_path}.sha256"]
@@ -0,0 +1,93 @@
+import pytest
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from lib.build_context import submit_with_context
+from monitoring.logger import LOG_FILE, RUN_ID, Logger, log_context
+
+
+@pytest.fixture
+def logger(temp_repo_dir):
+    """The process-wide logger writing to a temporary directory."""
+    logger = Logger()
+    # The autouse isolated_logs fixture restores the logger afterwards
+    logger.configure(log_dir=temp_repo_dir, console=False)
+    yield logger
+
+
+def _records(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+class TestLogger:
+    """Test queue-based JSON logging with per-build context."""
+
+    def test_records_carry_their_context(self, logger, temp_repo_dir):
+        """Test context set in a build reaches records logged from its worker threads."""
+        with log_context(repo="app", build_id="b1"), log_context(artifact="cli", stage="build"):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                submit_with_context(executor, logger.info, "from a worker").result()
+        logger.info("outside")
+        logger.flush()
+
+        worker, outside = _records(os.path.join(temp_repo_dir, LOG_FILE))
+        assert worker["message"] == "from a worker"
+        assert worker["level"] == "INFO"
+        assert (worker["run_id"], worker["repo"], worker["artifact"], worker["stage"]) == (RUN_ID, "app", "cli", "build")
+        assert "repo" not in outside
+
+    def test_build_log_holds_only_its_build(self, logger, temp_repo_dir):
+        def build(build_id):
+            with log_context(repo="app", build_id=build_id), logger.build_log("app", build_id) as path:
+                for i in range(50):
+                    logger.info(f"{build_id} line {i}")
+                return path
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            paths = list(executor.map(build, ["b1", "b2"]))
+        logger.flush()
+
+        for build_id, path in zip(["b1", "b2"], paths):
+            assert [r["message"] for r in _records(path)] == [f"{build_id} line {i}" for i in range(50)]
+        assert len(_records(os.path.join(temp_repo_dir, LOG_FILE))) == 100
+
+    def test_files_are_written_off_the_calling_thread(self, logger, mocker):
+        writers = set()
+        emit = logging.handlers.RotatingFileHandler.emit
+        mocker.patch.object(logging.handlers.RotatingFileHandler, "emit",
+                            lambda handler, record: writers.add(threading.current_thread()) or emit(handler, record))
+
+        logger.info("hello")
+        logger.flush()
+
+        assert writers and threading.current_thread() not in writers
+
+    def test_log_rotates_by_size(self, logger, temp_repo_dir):
+        logger.configure(log_dir=temp_repo_dir, max_bytes=2000, backup_count=2, console=False)
+        for i in range(100):
+            logger.info(f"message {i}")
+        logger.flush()
+
+        assert sorted(f for f in os.listdir(temp_repo_dir) if f.startswith(LOG_FILE)) == [LOG_FILE, f"{LOG_FILE}.1", f"{LOG_FILE}.2"]
+        assert os.path.getsize(os.path.join(temp_repo_dir, LOG_FILE)) <= 2000
+
+    def test_records_are_written_at_exit(self, temp_repo_dir):
+        """Test a process exits cleanly with its last records written, without starting threads at shutdown."""
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        # As Python 3.12 does at shutdown, refuse new threads once the logger's exit hook is due
+        script = "\n".join([
+            "import atexit, threading",
+            "from monitoring.logger import Logger",
+            "Logger().info('last words')",
+            "def refuse(thread): raise RuntimeError(\"can't create new thread at interpreter shutdown\")",
+            "atexit.register(setattr, threading.Thread, 'start', refuse)",
+        ])
+        result = subprocess.run([sys.executable, "-c", script], cwd=temp_repo_dir, env=dict(os.environ, PYTHONPATH=root),
+                                capture_output=True, text=True)
+
+        assert result.returncode == 0 and "Error" not in result.stderr
+        assert [r["message"] for r in _records(os.path.join(temp_repo_dir, "logs", LOG_FILE))] == ["last words"]
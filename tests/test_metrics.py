@@ -0,0 +1,92 @@
+import pytest
+import subprocess
+import sys
+from lib.process import run_logged
+from monitoring.metrics import MetricsRegistry, COMMAND_FAILURES, COMMAND_SECONDS
+
+
+class TestMetricsRegistry:
+    """Test rendering metrics in the Prometheus text format."""
+
+    def test_counter_with_labels(self):
+        registry = MetricsRegistry()
+        builds = registry.counter("builds_total", "Builds by outcome", ("status",))
+
+        builds.labels(status="success").inc()
+        builds.labels(status="success").inc()
+        builds.labels(status="failed").inc()
+
+        lines = registry.render().splitlines()
+        assert lines[:2] == ["# HELP builds_total Builds by outcome", "# TYPE builds_total counter"]
+        assert 'builds_total{status="failed"} 1' in lines
+        assert 'builds_total{status="success"} 2' in lines
+
+    def test_counter_rejects_wrong_labels_and_decrements(self):
+        registry = MetricsRegistry()
+        builds = registry.counter("builds_total", "Builds", ("status",))
+
+        with pytest.raises(ValueError):
+            builds.labels(outcome="success")
+        with pytest.raises(ValueError):
+            builds.labels(status="success").inc(-1)
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        seconds = registry.histogram("stage_seconds", "Stage time", ("stage",), buckets=(1, 10))
+
+        for value in (0.5, 2, 3, 30):
+            seconds.labels(stage="build").observe(value)
+
+        lines = registry.render().splitlines()
+        assert 'stage_seconds_bucket{stage="build",le="1"} 1' in lines
+        assert 'stage_seconds_bucket{stage="build",le="10"} 3' in lines
+        assert 'stage_seconds_bucket{stage="build",le="+Inf"} 4' in lines
+        assert 'stage_seconds_sum{stage="build"} 35.5' in lines
+        assert 'stage_seconds_count{stage="build"} 4' in lines
+
+    def test_gauge_function_is_read_on_render(self):
+        registry = MetricsRegistry()
+        depth = registry.gauge("queue_depth", "Pending builds")
+        pending = ["a", "b"]
+        depth.set_function(lambda: len(pending))
+
+        pending.append("c")
+
+        assert "queue_depth 3" in registry.render().splitlines()
+
+    def test_label_values_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("events_total", "Events", ("source",)).labels(source='a"b\\c').inc()
+
+        assert 'events_total{source="a\\"b\\\\c"} 1' in registry.render()
+
+    def test_registering_twice_returns_the_same_metric(self):
+        registry = MetricsRegistry()
+
+        assert registry.counter("builds_total", "Builds") is registry.counter("builds_total", "Builds")
+        with pytest.raises(ValueError):
+            registry.gauge("builds_total", "Builds")
+
+    def test_write_textfile(self, temp_repo_dir):
+        registry = MetricsRegistry()
+        registry.counter("builds_total", "Builds").inc(5)
+        path = f"{temp_repo_dir}/textfile/zab.prom"
+
+        registry.write_textfile(path)
+
+        with open(path) as f:
+            assert "builds_total 5" in f.read().splitlines()
+
+
+class TestCommandMetrics:
+    """Test builder commands are counted and timed."""
+
+    def test_failed_command_is_counted(self):
+        failures = COMMAND_FAILURES.labels(command="metrics-test").get()
+        timed = sum(COMMAND_SECONDS.labels(command="metrics-test").counts)
+
+        with pytest.raises(subprocess.CalledProcessError):
+            run_logged([sys.executable, "-c", "import sys; sys.exit(1)"], "metrics-test", check=True)
+
+        assert COMMAND_FAILURES.labels(command="metrics-test").get() == failures + 1
+        assert sum(COMMAND_SECONDS.labels(command="metrics-test").counts) == timed + 1
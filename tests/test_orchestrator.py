@@ -0,0 +1,760 @@
+import pytest
+import json
+import os
+import subprocess
+import threading
+import time
+import yaml
+from orchestrator.orchestrator import BuildOrchestrator
+
+
+class RecordingBuilder:
+    """Stand-in builder that records the workspace each artifact was built in."""
+    supports_distro_matrix = False
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.workspaces = []
+        self.active = 0
+        self.max_active = 0
+
+    def build(self, repo_path, repo_name, artifact):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            self.workspaces.append(repo_path)
+        time.sleep(self.delay)
+        output_path = os.path.join(repo_path, f"{repo_name}-{artifact['name']}.tar.gz")
+        with open(output_path, "w") as f:
+            f.write(artifact["name"])
+        with self.lock:
+            self.active -= 1
+        return output_path
+
+    def publish(self, artifact_path, repo_name, artifact):
+        assert os.path.exists(artifact_path)
+        return [artifact_path]
+
+
+@pytest.fixture
+def orchestrator_factory(temp_repo_dir, mocker):
+    """Build a BuildOrchestrator on a temporary config without cloning script repos."""
+    def factory(config=None, builders=None):
+        config = dict(config or {})
+        config.setdefault("artifact_store", {"path": os.path.join(temp_repo_dir, "store")})
+        config_path = os.path.join(temp_repo_dir, "global_config.yaml")
+        with open(config_path, "w") as f:
+            yaml.safe_dump(config, f)
+        mocker.patch.object(BuildOrchestrator, "_clone_scripts", return_value={})
+        mocker.patch.object(BuildOrchestrator, "_load_builders", return_value=builders or {})
+        return BuildOrchestrator(config_path)
+    return factory
+
+
+@pytest.fixture
+def fake_clone(temp_repo_dir, mocker):
+    """Make GitHubRepo.clone return a fresh local directory."""
+    clones = []
+
+    def clone(self, commit="main", strategy="full", paths=(), parent_dir=None):
+        path = os.path.join(parent_dir or temp_repo_dir, f"clone-{len(clones)}")
+        os.makedirs(path)
+        with open(os.path.join(path, "main.go"), "w") as f:
+            f.write("package main")
+        clones.append(path)
+        return path
+
+    mocker.patch("orchestrator.orchestrator.GitHubRepo.clone", clone)
+    return clones
+
+
+class TestBuildRepository:
+    """Test per-repository artifact builds."""
+
+    def test_artifacts_build_concurrently_in_isolated_workspaces(self, orchestrator_factory, fake_clone, mocker):
+        """Test several artifacts build at once, never in the shared clone."""
+        builder = RecordingBuilder(delay=0.2)
+        orchestrator = orchestrator_factory({"workspace_strategy": "reflink"}, {"binary_go": builder})
+        artifacts = [{"type": "binary", "language": "go", "name": n} for n in ("cli", "server", "agent")]
+        mocker.patch.object(orchestrator, "_load_template", return_value={"artifacts": artifacts})
+
+        failures = orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+
+        assert failures == 0
+        assert builder.max_active == 3
+        assert len(set(builder.workspaces)) == 3
+        assert fake_clone[0] not in builder.workspaces
+        # The clone and every workspace are gone once all artifacts have finished
+        assert not os.path.exists(fake_clone[0])
+        assert not any(os.path.exists(w) for w in builder.workspaces)
+        assert len(orchestrator.artifact_store.lookup("app")) == 3
+
+    def test_single_artifact_builds_in_clone(self, orchestrator_factory, fake_clone, mocker):
+        """Test a lone artifact skips the workspace copy."""
+        builder = RecordingBuilder()
+        orchestrator = orchestrator_factory(builders={"binary_go": builder})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+
+        orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+
+        assert builder.workspaces == [fake_clone[0]]
+
+    def test_failed_artifact_does_not_stop_others(self, orchestrator_factory, fake_clone, mocker):
+        """Test a failing artifact is counted while the others still publish."""
+        builder = RecordingBuilder()
+        orchestrator = orchestrator_factory(builders={"binary_go": builder})
+        artifacts = [{"type": "binary", "language": "go", "name": "cli"}, {"type": "binary", "language": "rust", "name": "x"}]
+        mocker.patch.object(orchestrator, "_load_template", return_value={"artifacts": artifacts})
+
+        failures = orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+
+        assert failures == 1
+        assert len(builder.workspaces) == 1
+
+
+class MatrixBuilder(RecordingBuilder):
+    """Stand-in matrix builder whose variants on a "broken" image fail."""
+    supports_distro_matrix = True
+
+    def build(self, repo_path, repo_name, artifact):
+        if artifact["docker_image"].startswith("broken"):
+            with self.lock:
+                self.workspaces.append(repo_path)
+            raise RuntimeError("build failed")
+        return super().build(repo_path, repo_name, artifact)
+
+
+class TestDistroMatrix:
+    """Test building the variants of a distros matrix in their own workspaces."""
+
+    def _matrix(self, orchestrator_factory, temp_repo_dir, mocker, distros):
+        orchestrator = orchestrator_factory()
+        mocker.patch.object(orchestrator, "_ensure_image")
+        clone = os.path.join(temp_repo_dir, "clone")
+        os.makedirs(clone)
+        artifact = {"type": "binary", "language": "go", "name": "cli", "distros": distros}
+        return orchestrator, clone, artifact
+
+    def test_failed_variants_leave_no_workspace_behind(self, orchestrator_factory, temp_repo_dir, mocker):
+        from lib.workspace import active_workspaces, remove_workspace
+        builder = MatrixBuilder()
+        orchestrator, clone, artifact = self._matrix(orchestrator_factory, temp_repo_dir, mocker,
+                                                     ["ubuntu:22.04", "broken:1", "broken:2"])
+
+        workspaces, artifact_paths = orchestrator._build_matrix(builder, clone, "app", artifact)
+
+        try:
+            assert len(workspaces) == 1 and len(artifact_paths) == 1
+            failed = [w for w in builder.workspaces if w not in workspaces]
+            assert len(failed) == 2
+            assert not any(os.path.exists(w) for w in failed)
+            assert active_workspaces().isdisjoint(failed)
+        finally:
+            for workspace in workspaces:
+                remove_workspace(workspace)
+
+    def test_all_variants_failing_raises(self, orchestrator_factory, temp_repo_dir, mocker):
+        from lib.workspace import active_workspaces
+        builder = MatrixBuilder()
+        orchestrator, clone, artifact = self._matrix(orchestrator_factory, temp_repo_dir, mocker, ["broken:1", "broken:2"])
+
+        with pytest.raises(RuntimeError, match="All 2 distro variants"):
+            orchestrator._build_matrix(builder, clone, "app", artifact)
+        assert not any(os.path.exists(w) for w in builder.workspaces)
+        assert active_workspaces().isdisjoint(builder.workspaces)
+
+
+class TestMetrics:
+    """Test build outcomes and stage timings are exported as metrics."""
+
+    def test_build_updates_metrics_and_textfile(self, orchestrator_factory, fake_clone, temp_repo_dir, mocker):
+        from monitoring import metrics
+        builder = RecordingBuilder()
+        textfile = os.path.join(temp_repo_dir, "metrics", "zab.prom")
+        orchestrator = orchestrator_factory({"metrics": {"textfile": textfile}}, {"binary_go": builder})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        succeeded = metrics.ARTIFACT_BUILDS.labels(builder="binary_go", status="success").get()
+        builds = metrics.REPOSITORY_BUILDS.labels(status="success").get()
+        stages = sum(metrics.STAGE_SECONDS.labels(stage="build").counts)
+
+        orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+        orchestrator.write_metrics()
+
+        assert metrics.ARTIFACT_BUILDS.labels(builder="binary_go", status="success").get() == succeeded + 1
+        assert metrics.REPOSITORY_BUILDS.labels(status="success").get() == builds + 1
+        assert sum(metrics.STAGE_SECONDS.labels(stage="build").counts) == stages + 1
+        assert metrics.INFLIGHT_BUILDS.labels().get() == 0
+        with open(textfile) as f:
+            assert 'zab_artifact_builds_total{builder="binary_go",status="success"}' in f.read()
+
+
+class TestTracing:
+    """Test build stages are traced and exported at the end of a run."""
+
+    def test_build_is_traced_and_written(self, orchestrator_factory, fake_clone, temp_repo_dir, mocker):
+        from monitoring.tracing import Tracer
+        tracer = Tracer()
+        mocker.patch("monitoring.tracing.TRACER", tracer)
+        mocker.patch("orchestrator.orchestrator.TRACER", tracer)
+        trace_path = os.path.join(temp_repo_dir, "trace.json")
+        orchestrator = orchestrator_factory({"tracing": {"path": trace_path}, "preflight": {"enabled": False},
+                                             "repositories": [{"name": "app", "url": "u", "commit": "main"}]},
+                                            {"binary_go": RecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+
+        orchestrator.build_artifacts()
+        orchestrator.write_trace()
+
+        path = [span.describe() for _, span in tracer.critical_path()]
+        # Garbage collection before and after the repository runs on the same path
+        assert path[:4] == ["run build_artifacts", "stage gc", "repository app", "stage checkout [app]"]
+        assert "stage build [app/cli]" in path
+        with open(trace_path) as f:
+            names = {event["name"] for event in json.load(f)["traceEvents"]}
+        assert {"build_artifacts", "app", "checkout", "config", "cli", "build", "publish", "store"} <= names
+
+
+class TestRegressions:
+    """Test builds are compared with their history and regressions reported."""
+
+    def test_regression_is_reported_and_fails_warn_mode(self, orchestrator_factory, fake_clone, mocker):
+        import argparse
+        from orchestrator.orchestrator import REGRESSION_EXIT_CODE, _finish_run
+        mocker.patch.dict("lib.regressions.MIN_DELTA", {"seconds": 3600, "bytes": 0, "peak_memory": 0})
+        orchestrator = orchestrator_factory(builders={"binary_go": RecordingBuilder()})
+        for _ in range(5):
+            orchestrator.history.record(repo="app", artifact="cli", status="success", seconds=1, bytes=1)
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+
+        orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+
+        (regression,) = orchestrator.regressions
+        assert (regression.artifact, regression.metric, regression.value) == ("cli", "bytes", 3)
+        assert orchestrator.history.records("app", "cli")[-1]["regressions"] == ["bytes"]
+        assert _finish_run(orchestrator, [], argparse.Namespace(regressions="report")) == 0
+        assert _finish_run(orchestrator, [], argparse.Namespace(regressions="warn")) == REGRESSION_EXIT_CODE
+        assert _finish_run(orchestrator, ["other"], argparse.Namespace(regressions="warn")) == 1
+
+
+class TestRepositorySchedule:
+    """Test resolution of per-repository cron schedules."""
+
+    def test_repository_entry_overrides_template(self, orchestrator_factory, mocker):
+        orchestrator = orchestrator_factory({"default_schedule": "0 * * * *"})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"schedule": "0 * * * *"})
+
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.clone_metadata", return_value=None)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.read_file", return_value=None)
+
+        assert orchestrator.repository_schedule({"name": "envoy", "schedule": "@nightly"}) == "@nightly"
+        assert orchestrator.repository_schedule({"name": "opa", "url": "u"}) == "0 * * * *"
+
+    def test_repository_build_template_schedule_is_used(self, orchestrator_factory, mocker, temp_repo_dir):
+        """Test the schedule: of a repository's own .build-template.yaml wins over its template's."""
+        orchestrator = orchestrator_factory({"default_schedule": "0 * * * *"})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"schedule": "0 * * * *", "artifacts": []})
+        metadata_path = os.path.join(temp_repo_dir, "meta")
+        os.makedirs(metadata_path)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.clone_metadata", return_value=metadata_path)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.read_file",
+                     return_value="template: templates/loz-script-project.yaml\nschedule: \"@nightly\"\n")
+
+        assert orchestrator.repository_schedule({"name": "opa", "url": "u"}) == "@nightly"
+        # The metadata clone is removed once read
+        assert not os.path.exists(metadata_path)
+
+    def test_unreachable_repository_is_scheduled_per_its_template(self, orchestrator_factory, mocker):
+        orchestrator = orchestrator_factory({"default_schedule": "0 * * * *"})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"schedule": "30 * * * *"})
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.clone_metadata",
+                     side_effect=subprocess.CalledProcessError(128, "git"))
+
+        assert orchestrator.repository_schedule({"name": "opa", "url": "u"}) == "30 * * * *"
+
+
+class TestSupersede:
+    """Test cancelling an in-flight build in favour of a newer commit."""
+
+    def test_superseded_build_is_not_published_and_leaves_its_clone(self, orchestrator_factory, fake_clone, mocker):
+        """Test a cancelled build skips publishing and the next build reuses its clone."""
+        from lib.build_context import current_build
+        started = threading.Event()
+
+        class BlockingBuilder(RecordingBuilder):
+            def build(self, repo_path, repo_name, artifact):
+                started.set()
+                handle = current_build()
+                handle._cancelled.wait(5)
+                # The killed container makes docker run fail
+                raise subprocess.CalledProcessError(137, "docker")
+
+        builder = BlockingBuilder()
+        publish = mocker.spy(builder, "publish")
+        mocker.patch("lib.build_context.subprocess.run", return_value=subprocess.CompletedProcess([], 0, stdout=""))
+        orchestrator = orchestrator_factory(builders={"binary_go": builder})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        repo = {"name": "app", "url": "u", "commit": "main"}
+
+        thread = threading.Thread(target=orchestrator.build_repository, args=(repo, "0 * * * *", True), kwargs={"sha": "a1"})
+        thread.start()
+        assert started.wait(5)
+        assert not orchestrator.supersede("app", "main", "a1")
+        assert orchestrator.supersede("app", "main", "b2")
+        thread.join(5)
+
+        publish.assert_not_called()
+        assert orchestrator.inflight == {}
+        assert orchestrator.parked_clones == {"app": fake_clone[0]}
+        assert os.path.exists(fake_clone[0])
+
+        update = mocker.patch("orchestrator.orchestrator.GitHubRepo.update", side_effect=lambda path, commit: path)
+        orchestrator.builders["binary_go"] = RecordingBuilder()
+        orchestrator.build_repository(repo, "0 * * * *", True, sha="b2")
+
+        update.assert_called_once_with(fake_clone[0], "main")
+        assert len(fake_clone) == 1
+        assert not os.path.exists(fake_clone[0])
+
+
+class TestDiskGc:
+    """Test disk garbage collection around runs."""
+
+    def test_run_collects_before_and_only_the_store_after(self, orchestrator_factory, fake_clone, mocker):
+        from lib.disk_gc import CATEGORIES
+        orchestrator = orchestrator_factory({"preflight": {"enabled": False},
+                                             "repositories": [{"name": "app", "url": "u", "commit": "main"}]},
+                                            {"binary_go": RecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        collect = mocker.spy(orchestrator.disk_collector, "collect")
+
+        orchestrator.build_artifacts()
+
+        assert [call.args[0] for call in collect.call_args_list] == [CATEGORIES, ("artifact_store",)]
+
+    def test_pre_run_collection_can_be_disabled(self, orchestrator_factory, mocker):
+        orchestrator = orchestrator_factory({"preflight": {"enabled": False}, "gc": {"enabled": False}})
+        collect = mocker.spy(orchestrator.disk_collector, "collect")
+
+        orchestrator.build_artifacts()
+
+        assert [call.args[0] for call in collect.call_args_list] == [("artifact_store",)]
+
+    def test_clone_workspaces_and_scripts_of_running_build_are_protected(self, orchestrator_factory, fake_clone,
+                                                                         temp_repo_dir, mocker):
+        protected = []
+
+        class ProbingBuilder(RecordingBuilder):
+            def build(self, repo_path, repo_name, artifact):
+                protected.extend([repo_path, orchestrator.protected_paths()])
+                return super().build(repo_path, repo_name, artifact)
+
+        orchestrator = orchestrator_factory(builders={"binary_go": ProbingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        # The snapshot the build started with, which a newer sync has since replaced as current
+        snapshot = os.path.join(temp_repo_dir, "scripts", "snapshots", "abc123")
+        mocker.patch.object(orchestrator, "refresh_scripts", return_value={"scripts": (snapshot, "abc123")})
+
+        orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True)
+
+        workspace, paths = protected
+        assert fake_clone[0] in paths
+        assert workspace in paths
+        assert snapshot in paths
+        assert orchestrator.protected_paths() == []
+
+
+class TestCloneLayout:
+    """Test repositories are cloned only as far as their artifacts' builders need."""
+
+    def test_layout_covers_every_artifact(self, orchestrator_factory):
+        from builders.script.loz_script_builder import ScriptBuilder
+        orchestrator = orchestrator_factory({"clone_strategies": {"script": "metadata"}},
+                                            {"script": ScriptBuilder(), "binary_go": RecordingBuilder()})
+        artifacts = [{"type": "script", "build_script": {"path": "scripts/build.sh"}},
+                     {"type": "binary", "language": "go", "clone": {"strategy": "sparse", "paths": ["src"]}}]
+
+        assert orchestrator.checkout_layout({"artifacts": artifacts[:1]}) == (
+            "metadata", (".build-template.yaml", "scripts/build.sh"))
+        assert orchestrator.checkout_layout({"artifacts": artifacts}) == (
+            "sparse", (".build-template.yaml", "scripts/build.sh", "src"))
+        assert orchestrator.checkout_layout({"artifacts": artifacts + [{"type": "binary", "language": "go"}]}) == ("full", ())
+
+    def test_clone_is_widened_for_the_repository_config(self, orchestrator_factory, fake_clone, mocker):
+        """Test the template picks the clone, and a .build-template.yaml needing more widens it."""
+        from orchestrator.orchestrator import GitHubRepo
+        clone = mocker.spy(GitHubRepo, "clone")
+        widen = mocker.patch.object(GitHubRepo, "widen", side_effect=lambda path, strategy, paths=(): path)
+        orchestrator = orchestrator_factory(builders={"binary_go": RecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template", return_value={
+            "artifacts": [{"type": "binary", "language": "go", "name": "cli", "clone": {"strategy": "metadata"}}]})
+        mocker.patch.object(orchestrator, "_merge_config", return_value={
+            "artifacts": [{"type": "binary", "language": "go", "name": "cli", "clone": {"strategy": "sparse", "paths": ["cmd"]}}]})
+
+        assert orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True) == 0
+
+        assert clone.call_args.kwargs == {"strategy": "metadata", "paths": (".build-template.yaml",), "parent_dir": None}
+        widen.assert_called_once_with(fake_clone[0], "sparse", (".build-template.yaml", "cmd"))
+
+
+class TestRamdisk:
+    """Test repositories whose workspaces fit the ramdisk budget are built on it."""
+
+    def test_build_moves_to_ramdisk_once_its_size_is_known(self, orchestrator_factory, fake_clone, temp_repo_dir, mocker):
+        mocker.patch("lib.ramdisk.filesystem_type", return_value="tmpfs")
+        mocker.patch("lib.ramdisk.RamDisk.free", return_value=1024 ** 3)
+        ram = os.path.join(temp_repo_dir, "ram")
+        orchestrator = orchestrator_factory({"ramdisk": {"enabled": True, "path": ram, "budget": "100M"}},
+                                            {"binary_go": RecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        repo = {"name": "app", "url": "u", "commit": "main"}
+
+        # Without history the size is unknown
+        orchestrator.build_repository(repo, "0 * * * *", True)
+        assert not fake_clone[0].startswith(ram)
+        assert orchestrator.history.workspace_size("app", "cli") > 0
+
+        orchestrator.build_repository(repo, "0 * * * *", True)
+        assert fake_clone[1].startswith(ram)
+        assert not os.path.exists(fake_clone[1])
+        assert orchestrator.ramdisk.reserved == 0
+        # The artifact outlives the ramdisk clone in the store
+        assert len(orchestrator.artifact_store.lookup("app")) == 1
+        assert ram in orchestrator.disk_collector.temp_dirs
+
+    def test_estimate_needs_every_artifact(self, orchestrator_factory):
+        orchestrator = orchestrator_factory()
+        for artifact, size in (("cli", 100), ("docs", 300)):
+            orchestrator.history.record(key=None, repo="app", artifact=artifact, status="success", seconds=1, bytes=1,
+                                        workspace_bytes=size)
+        artifacts = [{"type": "binary", "language": "go", "name": "cli"}, {"type": "binary", "language": "go", "name": "docs"}]
+
+        # Both workspaces and the clone they are copied from
+        assert orchestrator.workspace_estimate("app", {"artifacts": artifacts}) == 700
+        assert orchestrator.workspace_estimate("app", {"artifacts": artifacts[:1]}) == 100
+        assert orchestrator.workspace_estimate("app", {"artifacts": artifacts + [{"type": "script", "build_script": {"path": "b"}}]}) is None
+
+
+class TestRemoteCache:
+    """Test builds are shared between orchestrators through the remote cache."""
+
+    ARTIFACTS = [{"type": "binary", "language": "go", "name": "cli", "version": "1.0"}]
+
+    def _host(self, orchestrator_factory, temp_repo_dir, name, cache_server, mocker, builder, **cache_config):
+        orchestrator = orchestrator_factory({"artifact_store": {"path": os.path.join(temp_repo_dir, name)},
+                                             "remote_cache": {"url": cache_server.url, **cache_config},
+                                             "resilience": {"retry": {"base_delay": 0}}},
+                                            {"binary_go": builder})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"artifacts": self.ARTIFACTS})
+        return orchestrator
+
+    def test_other_host_takes_the_build_from_the_cache(self, orchestrator_factory, fake_clone, temp_repo_dir,
+                                                        cache_server, mocker):
+        repo = {"name": "app", "url": "u", "commit": "main"}
+        first, second = RecordingBuilder(), RecordingBuilder()
+        self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, first).build_repository(
+            repo, "0 * * * *", True, sha="abc123")
+        host_b = self._host(orchestrator_factory, temp_repo_dir, "host-b", cache_server, mocker, second)
+
+        failures = host_b.build_repository(repo, "0 * * * *", True, sha="abc123")
+
+        assert failures == 0
+        assert len(first.workspaces) == 1 and second.workspaces == []
+        stored = host_b.artifact_store.lookup("app")
+        assert [entry["filename"] for entry in stored] == ["app-cli.tar.gz"]
+        with open(stored[0]["path"]) as f:
+            assert f.read() == "cli"
+        # The local history answers for the key from now on
+        record = host_b.history.records("app")[-1]
+        assert record["cached"] == "remote" and record["status"] == "success"
+        assert host_b.history.succeeded(record["key"]) is not None
+
+    def test_other_commit_is_built(self, orchestrator_factory, fake_clone, temp_repo_dir, cache_server, mocker):
+        repo = {"name": "app", "url": "u", "commit": "main"}
+        builder = RecordingBuilder()
+        host = self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, builder)
+        host.build_repository(repo, "0 * * * *", True, sha="abc123")
+
+        host.build_repository(repo, "0 * * * *", True, sha="def456")
+
+        assert len(builder.workspaces) == 2
+
+    def test_unreachable_cache_does_not_fail_builds(self, orchestrator_factory, fake_clone, temp_repo_dir,
+                                                     cache_server, mocker):
+        builder = RecordingBuilder()
+        host = self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, builder)
+        cache_server.close()
+
+        failures = host.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True, sha="abc123")
+
+        assert failures == 0
+        assert len(builder.workspaces) == 1
+        assert host.history.records("app")[-1]["status"] == "success"
+
+    def test_malformed_entry_falls_back_to_building(self, orchestrator_factory, fake_clone, temp_repo_dir,
+                                                    cache_server, mocker):
+        builder = RecordingBuilder()
+        host = self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, builder)
+        mocker.patch.object(host.remote_cache, "get", return_value={"key": "k", "version": 1})
+
+        failures = host.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True, sha="abc123")
+
+        assert failures == 0
+        assert len(builder.workspaces) == 1
+
+    def test_misbehaving_server_does_not_fail_a_published_build(self, orchestrator_factory, fake_clone, temp_repo_dir,
+                                                                cache_server, mocker):
+        import http.client
+        builder = RecordingBuilder()
+        host = self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, builder)
+        mocker.patch.object(host.remote_cache, "put", side_effect=http.client.IncompleteRead(b""))
+
+        failures = host.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True, sha="abc123")
+
+        assert failures == 0
+        assert [record["status"] for record in host.history.records("app")] == ["success"]
+
+    def test_read_only_host_does_not_upload(self, orchestrator_factory, fake_clone, temp_repo_dir, cache_server, mocker):
+        host = self._host(orchestrator_factory, temp_repo_dir, "host-a", cache_server, mocker, RecordingBuilder(), upload=False)
+
+        host.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True, sha="abc123")
+
+        assert [method for method, path in cache_server.requests] == ["GET"]
+
+
+class TestResilience:
+    """Test how an unreachable remote affects a whole run."""
+
+    def test_github_outage_skips_remaining_repositories(self, orchestrator_factory, mocker):
+        """Test once the github.com breaker opens, later repositories fail fast without cloning."""
+        orchestrator = orchestrator_factory({
+            "repositories": [{"name": n, "url": f"https://github.com/org/{n}", "commit": "main"} for n in ("a", "b", "c")],
+            "resilience": {"retry": {"attempts": 3, "base_delay": 0}, "breaker": {"failure_threshold": 5}},
+            "preflight": {"enabled": False},
+        })
+        clone = mocker.patch("lib.github_api.subprocess.run",
+                             side_effect=subprocess.CalledProcessError(128, "git", stderr=b"Could not resolve host"))
+
+        failed = orchestrator.build_artifacts()
+
+        assert failed == ["a", "b", "c"]
+        assert clone.call_count == 5
+
+
+class TestMergeConfig:
+    """Test merging a repository's .build-template.yaml into its template."""
+
+    def test_repository_overrides_are_applied(self, orchestrator_factory, temp_repo_dir):
+        from lib.templates import TemplateResolver
+        os.makedirs(os.path.join(temp_repo_dir, "config", "templates"))
+        with open(os.path.join(temp_repo_dir, "config", "templates", "go.yaml"), "w") as f:
+            f.write("artifacts:\n  - type: binary\n    language: go\n    version: 1.0\nschedule: '{{global_schedule}}'\n")
+        repo_path = os.path.join(temp_repo_dir, "app")
+        os.makedirs(repo_path)
+        with open(os.path.join(repo_path, ".build-template.yaml"), "w") as f:
+            f.write("template: templates/go.yaml\noverrides:\n  artifacts:\n    - type: binary\n      version: '2.0'\n")
+        orchestrator = orchestrator_factory()
+        orchestrator.templates = TemplateResolver(os.path.join(temp_repo_dir, "config"))
+
+        config = orchestrator._merge_config({"schedule": "@daily", "webhook": True}, repo_path)
+
+        assert config["schedule"] == "@daily"
+        assert dict(config["artifacts"][0]) == {"type": "binary", "language": "go", "version": "2.0"}
+
+
+    def test_broken_repository_config_raises_and_removes_the_metadata_clone(self, orchestrator_factory, mocker, temp_repo_dir):
+        from lib.templates import RepoConfigError
+        orchestrator = orchestrator_factory()
+        mocker.patch.object(orchestrator, "_load_template", return_value={"schedule": "0 * * * *", "artifacts": []})
+        metadata_path = os.path.join(temp_repo_dir, "meta")
+        os.makedirs(metadata_path)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.clone_metadata", return_value=metadata_path)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.read_file", return_value="overrides: {}\n")
+
+        with pytest.raises(RepoConfigError, match="missing 'template'"):
+            with orchestrator.resolve_repo_config({"name": "app", "url": "u"}):
+                pass
+        assert not os.path.exists(metadata_path)
+
+
+def _git_repo(path, files):
+    os.makedirs(path)
+    subprocess.run(["git", "init", "-q", "-b", "main", path], check=True)
+    return _git_commit(path, files)
+
+
+def _git_commit(path, files):
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+    subprocess.run(["git", "-C", path, "add", "."], check=True)
+    subprocess.run(["git", "-C", path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "change"], check=True)
+    return subprocess.run(["git", "-C", path, "rev-parse", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+
+
+class TestPlan:
+    """Test dry-run plans and building from a plan file."""
+
+    @pytest.fixture
+    def planned_orchestrator(self, orchestrator_factory, temp_repo_dir):
+        from lib.templates import TemplateResolver
+        os.makedirs(os.path.join(temp_repo_dir, "config", "templates"))
+        with open(os.path.join(temp_repo_dir, "config", "templates", "go.yaml"), "w") as f:
+            f.write("artifacts:\n  - type: binary\n    language: go\n    name: cli\n    docker_image: golang:1.24\n")
+        source = os.path.join(temp_repo_dir, "src")
+        sha = _git_repo(source, {"main.go": "package main // v1"})
+        builder = RecordingBuilder()
+        orchestrator = orchestrator_factory({
+            "repositories": [{"name": "app", "url": f"file://{source}", "commit": "main", "template": "templates/go.yaml"}],
+            "resilience": {"retry": {"base_delay": 0}},
+        }, builders={"binary_go": builder})
+        orchestrator.templates = TemplateResolver(os.path.join(temp_repo_dir, "config"))
+        return orchestrator, builder, source, sha
+
+    def test_plan_round_trip_skips_built_artifacts(self, planned_orchestrator, temp_repo_dir, mocker):
+        """Test an executed plan is recorded, so the next plan has it cached and estimated."""
+        from orchestrator.planner import read_plan, write_plan
+        orchestrator, builder, source, sha = planned_orchestrator
+        mocker.patch.object(orchestrator, "_ensure_image")
+        plan_path = os.path.join(temp_repo_dir, "plan.json")
+
+        write_plan(orchestrator.plan(), plan_path)
+        plan = read_plan(plan_path)
+        entry = plan["repositories"][0]
+        assert entry["sha"] == sha
+        assert entry["artifacts"][0]["builder"] == "binary_go"
+        assert entry["artifacts"][0]["images"] == ["golang:1.24"]
+        assert entry["artifacts"][0]["cached"] is False
+        assert plan["totals"]["unestimated"] == 1
+        # Nothing is looked up again when the plan is built
+        load_template = mocker.spy(orchestrator, "_load_template")
+        assert orchestrator.execute_plan(plan) == []
+        load_template.assert_not_called()
+        assert len(builder.workspaces) == 1
+
+        replan = orchestrator.plan()
+        assert replan["repositories"][0]["artifacts"][0]["cached"] is True
+        assert replan["repositories"][0]["artifacts"][0]["estimate"]["samples"] == 1
+        assert orchestrator.execute_plan(replan) == []
+        assert len(builder.workspaces) == 1
+
+    def test_planned_sha_is_built_after_branch_moves(self, planned_orchestrator, mocker):
+        orchestrator, builder, source, sha = planned_orchestrator
+        mocker.patch.object(orchestrator, "_ensure_image")
+        plan = orchestrator.plan()
+        _git_commit(source, {"main.go": "package main // v2"})
+        subprocess.run(["git", "-C", source, "config", "uploadpack.allowAnySHA1InWant", "true"], check=True)
+        built = []
+        mocker.patch.object(builder, "build", side_effect=lambda path, name, artifact: built.append(
+            open(os.path.join(path, "main.go")).read()) or os.path.join(path, "main.go"))
+
+        assert orchestrator.execute_plan(plan) == []
+
+        assert built == ["package main // v1"]
+        assert [r["sha"] for r in orchestrator.history.records("app")] == [sha]
+
+    def test_planned_script_snapshot_is_built_after_scripts_move(self, orchestrator_factory, fake_clone, temp_repo_dir, mocker):
+        """Test executing a plan builds with the script repository sha it was planned with, not the newest."""
+        from lib.build_context import pinned_script_repo
+        scripts = os.path.join(temp_repo_dir, "scripts")
+        planned_sha = _git_repo(scripts, {"build.sh": "echo v1"})
+        subprocess.run(["git", "-C", scripts, "config", "uploadpack.allowAnySHA1InWant", "true"], check=True)
+        seen = []
+
+        class ScriptRecordingBuilder(RecordingBuilder):
+            def build(self, repo_path, repo_name, artifact):
+                with open(os.path.join(pinned_script_repo("linux-on-ibm-z-scripts"), "build.sh")) as f:
+                    seen.append(f.read())
+                return super().build(repo_path, repo_name, artifact)
+
+        orchestrator = orchestrator_factory({
+            "repositories": [{"name": "app", "url": "u", "commit": "main"}],
+            "script_repositories": [{"name": "linux-on-ibm-z-scripts", "url": f"file://{scripts}"}],
+            "script_cache": {"path": os.path.join(temp_repo_dir, "script-cache"), "check_interval": 0, "keep": 1},
+        }, builders={"script": ScriptRecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"artifacts": [
+            {"type": "script", "name": "pkg", "build_script": {"path": "build.sh"}}]})
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.clone_metadata", return_value=None)
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.head", return_value="a1")
+        mocker.patch("orchestrator.orchestrator.GitHubRepo.read_file", return_value=None)
+        mocker.patch.object(orchestrator, "_head", return_value="a1")
+        plan = orchestrator.plan()
+        # The scripts move on and the planned snapshot is pruned
+        _git_commit(scripts, {"build.sh": "echo v2"})
+        orchestrator.refresh_scripts()
+        assert not os.path.exists(os.path.join(temp_repo_dir, "script-cache", "linux-on-ibm-z-scripts", "snapshots", planned_sha))
+        ls_remote = mocker.spy(orchestrator.script_cache, "remote_sha")
+
+        assert orchestrator.execute_plan(plan) == []
+
+        assert seen == ["echo v1"]
+        ls_remote.assert_not_called()
+        record = orchestrator.history.records("app")[0]
+        assert record["script_sha"] == planned_sha
+        assert record["key"] == plan["repositories"][0]["artifacts"][0]["key"]
+
+    def test_shards_are_balanced_by_estimate(self):
+        from orchestrator.planner import parse_shard, shard_plan
+
+        def entry(name, *seconds):
+            return {"name": name, "artifacts": [
+                {"cached": False, "estimate": {"seconds": s, "bytes": 0, "samples": 1} if s else None} for s in seconds]}
+        plan = {"version": 1, "repositories": [entry("a", 100), entry("b", 50, 40), entry("c", 30), entry("d", None), entry("e", 10)]}
+
+        shards = [shard_plan(plan, *parse_shard(f"{i}/2")) for i in (1, 2)]
+
+        assert [[e["name"] for e in shard["repositories"]] for shard in shards] == [["d"], ["a", "b", "c", "e"]]
+        assert sorted(e["name"] for shard in shards for e in shard["repositories"]) == ["a", "b", "c", "d", "e"]
+        with pytest.raises(ValueError):
+            parse_shard("3/2")
+
+
+class TestBuiltCommit:
+    """Test which commit a build is recorded against."""
+
+    def test_webhook_build_records_the_cloned_head(self, orchestrator_factory, fake_clone, mocker):
+        """Test a branch that moved on after the push is recorded at the commit that was cloned and built."""
+        orchestrator = orchestrator_factory(builders={"binary_go": RecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template",
+                            return_value={"artifacts": [{"type": "binary", "language": "go", "name": "cli"}]})
+        mocker.patch.object(orchestrator, "_head", return_value="b2")
+
+        assert orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True, sha="a1") == 0
+
+        assert [record["sha"] for record in orchestrator.history.records("app")] == ["b2"]
+
+
+class TestScriptRepositories:
+    """Test how builds use the script repository cache."""
+
+    def test_build_pins_and_records_script_snapshot(self, orchestrator_factory, fake_clone, temp_repo_dir, mocker):
+        from lib.build_context import pinned_script_repo
+        scripts = os.path.join(temp_repo_dir, "scripts")
+        script_sha = _git_repo(scripts, {"build.sh": "echo v1"})
+        seen = []
+
+        class ScriptRecordingBuilder(RecordingBuilder):
+            def build(self, repo_path, repo_name, artifact):
+                seen.append(pinned_script_repo("linux-on-ibm-z-scripts"))
+                return super().build(repo_path, repo_name, artifact)
+
+        orchestrator = orchestrator_factory({
+            "script_repositories": [{"name": "linux-on-ibm-z-scripts", "url": f"file://{scripts}"}],
+            "script_cache": {"path": os.path.join(temp_repo_dir, "script-cache")},
+        }, builders={"script": ScriptRecordingBuilder()})
+        mocker.patch.object(orchestrator, "_load_template", return_value={"artifacts": [
+            {"type": "script", "name": "pkg", "build_script": {"path": "build.sh"}}]})
+        mocker.patch.object(orchestrator, "_head", return_value="a1")
+
+        assert orchestrator.build_repository({"name": "app", "url": "u", "commit": "main"}, "0 * * * *", True) == 0
+
+        assert seen == [os.path.join(temp_repo_dir, "script-cache", "linux-on-ibm-z-scripts", "snapshots", script_sha)]
+        assert orchestrator.history.records("app")[0]["script_sha"] == script_sha
@@ -0,0 +1,173 @@
+import pytest
+import json
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from lib.org_scanner import OrgScanner
+
+
+class FakeGitHub:
+    """Local stand-in for the parts of the GitHub API the scanner uses."""
+
+    def __init__(self, repo_count=250, with_template=lambda name: int(name.split("-")[1]) % 5 == 0):
+        self.repos = [{"name": f"repo-{i}", "clone_url": f"https://github.com/org/repo-{i}.git",
+                       "default_branch": "main", "pushed_at": "2026-01-01T00:00:00Z"} for i in range(repo_count)]
+        self.with_template = with_template
+        self.requests = []
+        self.graphql_names = []
+        self.rate_limited = 0
+        # GraphQL queries to answer with errors: "all" fails the whole query, a name fails just that repository
+        self.graphql_failures = set()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        github = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _reply(self, status, body=None, headers=None):
+                payload = json.dumps(body).encode() if body is not None else b""
+                self.send_response(status)
+                headers = dict(headers or {})
+                headers.setdefault("X-RateLimit-Remaining", "4999")
+                headers.setdefault("X-RateLimit-Reset", "2000")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                with github.lock:
+                    github.requests.append((url.path, self.headers.get("If-None-Match")))
+                    if github.rate_limited:
+                        github.rate_limited -= 1
+                        self._reply(403, {"message": "API rate limit exceeded"}, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1000"})
+                        return
+                query = parse_qs(url.query)
+                per_page, page = int(query["per_page"][0]), int(query["page"][0])
+                body = github.repos[(page - 1) * per_page:page * per_page]
+                etag = f'"{hash(json.dumps(body))}"'
+                if self.headers.get("If-None-Match") == etag:
+                    self._reply(304)
+                    return
+                last = (len(github.repos) + per_page - 1) // per_page
+                link = f'<{github.url}{url.path}?per_page={per_page}&page={last}>; rel="last"'
+                self._reply(200, body, {"ETag": etag, "Link": link})
+
+            def do_POST(self):
+                query = json.loads(self.rfile.read(int(self.headers["Content-Length"])))["query"]
+                data = {}
+                errors = []
+                for alias, name in re.findall(r'(r\d+): repository\(owner: "org", name: "([^"]+)"\)', query):
+                    with github.lock:
+                        github.graphql_names.append(name)
+                    if name in github.graphql_failures:
+                        data[alias] = None
+                        errors.append({"type": "TIMEOUT", "path": [alias], "message": "Timeout on validation of query"})
+                    else:
+                        data[alias] = {"object": {"oid": "abc"} if github.with_template(name) else None}
+                if "all" in github.graphql_failures:
+                    self._reply(200, {"data": None, "errors": [{"type": "RATE_LIMITED", "message": "API rate limit exceeded"}]})
+                    return
+                self._reply(200, dict({"data": data}, **({"errors": errors} if errors else {})))
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+@pytest.fixture
+def github():
+    server = FakeGitHub()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def scanner_factory(github, temp_repo_dir):
+    def factory(**kwargs):
+        return OrgScanner("token", api_url=github.url, cache_dir=os.path.join(temp_repo_dir, "cache"), **kwargs)
+    return factory
+
+
+class TestOrgScanner:
+    """Test organization scanning against a local GitHub stand-in."""
+
+    def test_all_pages_are_listed(self, github, scanner_factory):
+        """Test repositories beyond the first page are not dropped."""
+        repos = scanner_factory().list_repositories("org")
+
+        assert len(repos) == 250
+        assert {r["name"] for r in repos} == {r["name"] for r in github.repos}
+
+    def test_only_repositories_with_a_template_are_returned(self, github, scanner_factory):
+        """Test the template check is one batched query per 50 repositories."""
+        repos = scanner_factory().scan("org")
+
+        assert [r["name"] for r in repos] == [f"repo-{i}" for i in range(0, 250, 5)]
+        assert sorted(github.graphql_names) == sorted(r["name"] for r in github.repos)
+
+    def test_unchanged_pages_and_repositories_come_from_the_cache(self, github, scanner_factory):
+        """Test a second scan revalidates pages with ETags and skips the template query."""
+        scanner_factory().scan("org")
+        github.requests.clear()
+        github.graphql_names.clear()
+        github.repos[7]["pushed_at"] = "2026-02-01T00:00:00Z"
+
+        repos = scanner_factory().scan("org")
+
+        assert len(repos) == 50
+        # Every page is revalidated, only the one holding repo-7 changed
+        assert len(github.requests) == 3
+        assert all(etag for _, etag in github.requests)
+        assert github.graphql_names == ["repo-7"]
+
+    def test_rate_limit_waits_for_reset(self, github, scanner_factory):
+        """Test an exhausted rate limit sleeps until X-RateLimit-Reset instead of failing."""
+        github.rate_limited = 1
+        sleeps = []
+        scanner = scanner_factory(sleep=sleeps.append, clock=lambda: 990)
+
+        repos = scanner.list_repositories("org")
+
+        assert len(repos) == 250
+        assert sleeps == [11]
+
+    def test_failed_template_query_is_not_cached(self, github, scanner_factory):
+        """Test a GraphQL error keeps the previous results and is asked again, instead of caching "no template"."""
+        scanner_factory().scan("org")
+        for repo in github.repos[:2]:
+            repo["pushed_at"] = "2026-02-01T00:00:00Z"
+        github.graphql_failures = {"all"}
+        github.graphql_names.clear()
+
+        repos = scanner_factory().scan("org")
+
+        # repo-0 had a template before the failed query
+        assert len(repos) == 50 and repos[0]["name"] == "repo-0"
+        github.graphql_failures = set()
+        github.graphql_names.clear()
+        scanner_factory().scan("org")
+        assert sorted(github.graphql_names) == ["repo-0", "repo-1"]
+
+    def test_repositories_failing_in_a_partial_answer_are_asked_again(self, github, scanner_factory):
+        github.graphql_failures = {"repo-5"}
+
+        repos = scanner_factory().scan("org")
+
+        assert "repo-5" not in [r["name"] for r in repos] and len(repos) == 49
+        github.graphql_failures = set()
+        github.graphql_names.clear()
+        assert len(scanner_factory().scan("org")) == 50
+        assert github.graphql_names == ["repo-5"]
@@ -0,0 +1,120 @@
+import pytest
+import os
+import subprocess
+import yaml
+from lib.templates import TemplateResolver
+from orchestrator.orchestrator import BuildOrchestrator
+from orchestrator.preflight import IMAGE_REFERENCE
+
+GO_TEMPLATE = "artifacts:\n  - type: binary\n    language: go\n    docker_image: golang:1.24.4\n"
+SCRIPT_TEMPLATE = "artifacts:\n  - type: script\n    build_script:\n      path: build.sh\n      docker_image: ubuntu:22.04\n"
+
+
+class StubBuilder:
+    supports_distro_matrix = False
+
+
+def _git_repo(path, files):
+    os.makedirs(path)
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+    subprocess.run(["git", "init", "-q", "-b", "main", path], check=True)
+    subprocess.run(["git", "-C", path, "add", "."], check=True)
+    subprocess.run(["git", "-C", path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], check=True)
+    return f"file://{path}"
+
+
+@pytest.fixture
+def preflight_orchestrator(temp_repo_dir, mocker):
+    """Orchestrator with go and script builders and templates in a temporary config dir."""
+    def factory(repos, script_repos=("linux-on-ibm-z-scripts",)):
+        templates_dir = os.path.join(temp_repo_dir, "config", "templates")
+        os.makedirs(templates_dir, exist_ok=True)
+        for name, content in (("go.yaml", GO_TEMPLATE), ("script.yaml", SCRIPT_TEMPLATE)):
+            with open(os.path.join(templates_dir, name), "w") as f:
+                f.write(content)
+        config_path = os.path.join(temp_repo_dir, "global_config.yaml")
+        with open(config_path, "w") as f:
+            yaml.safe_dump({"repositories": repos, "artifact_store": {"path": os.path.join(temp_repo_dir, "store")},
+                            "resilience": {"retry": {"base_delay": 0}}}, f)
+        mocker.patch.object(BuildOrchestrator, "_clone_scripts", return_value={name: "/tmp/" + name for name in script_repos})
+        mocker.patch.object(BuildOrchestrator, "_load_builders", return_value={"binary_go": StubBuilder(), "script": StubBuilder()})
+        orchestrator = BuildOrchestrator(config_path)
+        orchestrator.templates = TemplateResolver(os.path.join(temp_repo_dir, "config"))
+        return orchestrator
+    return factory
+
+
+class TestPreflight:
+    """Test configuration checks that run before any build."""
+
+    def test_all_problems_are_reported_together(self, preflight_orchestrator, temp_repo_dir):
+        """Test one run reports every misconfigured repository and leaves good ones alone."""
+        root = temp_repo_dir
+        repos = [
+            {"name": "good", "commit": "main", "template": "templates/go.yaml",
+             "url": _git_repo(f"{root}/good", {"main.go": "package main"})},
+            {"name": "rust", "commit": "main", "template": "templates/go.yaml",
+             "url": _git_repo(f"{root}/rust", {".build-template.yaml": "template: templates/go.yaml\noverrides:\n  artifacts:\n    - type: binary\n      language: rust\n"})},
+            {"name": "noscript", "commit": "main", "template": "templates/script.yaml",
+             "url": _git_repo(f"{root}/noscript", {"README": "x"})},
+            {"name": "badtemplate", "commit": "main", "template": "templates/missing.yaml",
+             "url": _git_repo(f"{root}/badtemplate", {"README": "x"})},
+            {"name": "badimage", "commit": "main", "template": "templates/go.yaml",
+             "url": _git_repo(f"{root}/badimage", {".build-template.yaml": "template: templates/go.yaml\noverrides:\n  artifacts:\n    - type: binary\n      docker_image: 'Golang::1'\n"})},
+        ]
+        orchestrator = preflight_orchestrator(repos, script_repos=())
+
+        report = orchestrator.run_preflight()
+
+        assert report.failed_repos == {"rust", "noscript", "badtemplate", "badimage"}
+        text = report.format()
+        assert "rust/binary[0]: no builder for binary_rust" in text
+        assert "noscript/script[0]: script repository linux-on-ibm-z-scripts is not configured" in text
+        assert "noscript/script[0]: build_script.path build.sh does not exist" in text
+        assert "badtemplate: template templates/missing.yaml" in text
+        assert "invalid docker image reference 'Golang::1'" in text
+
+    def test_clone_settings_are_checked(self, preflight_orchestrator, temp_repo_dir):
+        overrides = "template: templates/go.yaml\noverrides:\n  artifacts:\n    - type: binary\n      clone:\n        strategy: shallow\n        paths: [src/, missing]\n"
+        repos = [{"name": "app", "commit": "main", "template": "templates/go.yaml",
+                  "url": _git_repo(f"{temp_repo_dir}/app", {".build-template.yaml": overrides, "src": "x"})}]
+        orchestrator = preflight_orchestrator(repos)
+
+        text = orchestrator.run_preflight().format()
+
+        assert "app/binary[0]: unknown clone.strategy shallow, expected one of metadata, sparse, full" in text
+        assert "clone.paths missing does not exist" in text
+        assert "clone.paths src/" not in text
+
+    def test_unreachable_repository_is_a_warning(self, preflight_orchestrator, temp_repo_dir):
+        """Test a fetch failure does not block the build of that repository."""
+        repos = [{"name": "gone", "commit": "main", "template": "templates/go.yaml", "url": f"file://{temp_repo_dir}/missing"}]
+        orchestrator = preflight_orchestrator(repos)
+
+        report = orchestrator.run_preflight()
+
+        assert report.errors == []
+        assert report.warnings[0][0] == "gone"
+
+    def test_build_skips_repositories_failing_preflight(self, preflight_orchestrator, temp_repo_dir, mocker):
+        """Test misconfigured repositories are not cloned for a build."""
+        repos = [{"name": "noscript", "commit": "main", "template": "templates/script.yaml",
+                  "url": _git_repo(f"{temp_repo_dir}/noscript", {"README": "x"})}]
+        orchestrator = preflight_orchestrator(repos)
+        build = mocker.patch.object(orchestrator, "build_repository")
+
+        assert orchestrator.build_artifacts() == ["noscript"]
+        build.assert_not_called()
+
+    @pytest.mark.parametrize("image,valid", [
+        ("ubuntu:22.04", True),
+        ("ghcr.io/linuxonzapps/kind:v1.0", True),
+        ("registry.example.com:5000/team/app@sha256:" + "a" * 64, True),
+        ("Ubuntu:22.04", False),
+        ("ubuntu::22.04", False),
+        ("ubuntu:", False),
+    ])
+    def test_image_references(self, image, valid):
+        assert bool(IMAGE_REFERENCE.match(image)) == valid
@@ -0,0 +1,105 @@
+import pytest
+import gzip
+import os
+import subprocess
+import sys
+import time
+from lib.build_context import BuildHandle, build_scope
+from lib.process import CommandFailed, OutputTail, run_logged, track_resources
+from monitoring.logger import Logger, log_context
+
+
+@pytest.fixture
+def log_dir(temp_repo_dir):
+    logger = Logger()
+    # The autouse isolated_logs fixture restores the logger afterwards
+    logger.configure(log_dir=temp_repo_dir, console=False)
+    yield temp_repo_dir
+
+
+def _python(code):
+    return [sys.executable, "-c", code]
+
+
+class TestRunLogged:
+    """Test streaming command output to compressed logs."""
+
+    def test_large_output_is_streamed_to_a_compressed_log(self, log_dir):
+        """Test a command printing far more than the tail keeps runs to completion with all output logged."""
+        code = "import sys\nfor i in range(200000): sys.stdout.write(f'line {i}\\n')\nsys.stderr.write('done\\n')"
+        handle = BuildHandle("app", "main")
+
+        with build_scope(handle), log_context(artifact="cli"):
+            run_logged(_python(code), "noisy", tail_bytes=1024, check=True)
+
+        build_dir = os.path.join(log_dir, "builds", f"app-{handle.id}")
+        (log_name,) = os.listdir(build_dir)
+        assert log_name.startswith("cli-noisy-") and log_name.endswith(".log.gz")
+        with gzip.open(os.path.join(build_dir, log_name), "rt") as f:
+            lines = f.read().splitlines()
+        assert len(lines) == 200001
+        assert lines[-1] == "done"
+        assert os.path.getsize(os.path.join(build_dir, log_name)) < 1024 * 1024
+
+    def test_failure_carries_the_end_of_the_output(self, log_dir):
+        code = "import sys\nfor i in range(10000): print(f'step {i}')\nprint('error: linker crashed', file=sys.stderr)\nsys.exit(3)"
+
+        with pytest.raises(CommandFailed) as failure:
+            run_logged(_python(code), "failing", tail_bytes=512, check=True)
+
+        assert failure.value.returncode == 3
+        assert len(failure.value.stderr) == 512
+        message = str(failure.value)
+        assert message.splitlines()[-1] == "error: linker crashed"
+        assert "step 9999" in message
+        assert f"Full log: {failure.value.log_path}" in message
+        assert os.path.exists(failure.value.log_path)
+
+    def test_mocked_failure_without_output(self, log_dir, mocker):
+        """Test a CalledProcessError without captured output still makes a readable failure."""
+        mocker.patch("subprocess.run", side_effect=subprocess.CalledProcessError(1, "docker"))
+
+        with pytest.raises(CommandFailed, match="returned non-zero exit status 1"):
+            run_logged(["docker", "run"], "build", check=True)
+
+    def test_tail_is_bounded(self):
+        tail = OutputTail(max_bytes=8)
+        for chunk in (b"abcdef", b"ghij", b"klm"):
+            tail.append(chunk)
+
+        assert tail.value() == b"fghijklm"
+
+
+class TestContainerMemory:
+    """Test sampling the peak memory of build containers."""
+
+    def test_peak_memory_of_docker_run(self, log_dir, mocker):
+        mocker.patch("lib.process.MEMORY_POLL_SECONDS", 0.02)
+        readings = iter(["200MiB / 8GiB", "1.5GiB / 8GiB", "700MiB / 8GiB"])
+        commands = []
+
+        def docker(cmd, **kwargs):
+            commands.append(cmd)
+            if cmd[:2] == ["docker", "stats"]:
+                return subprocess.CompletedProcess(cmd, 0, stdout=next(readings, "10MiB / 8GiB"))
+            with open(cmd[cmd.index("--cidfile") + 1], "w") as f:
+                f.write("c0ffee")
+            time.sleep(0.3)
+            return subprocess.CompletedProcess(cmd, 0)
+        mocker.patch("subprocess.run", side_effect=docker)
+
+        with track_resources() as usage:
+            run_logged(["docker", "run", "--rm", "ubuntu:22.04", "make"], "build", check=True)
+
+        assert usage.peak_memory == int(1.5 * 1024 ** 3)
+        assert commands[0][:4] == ["docker", "run", "--cidfile", commands[0][3]]
+        assert commands[1][-1] == "c0ffee"
+        assert not os.path.exists(commands[0][3])
+
+    def test_commands_are_unchanged_outside_track_resources(self, log_dir, mocker):
+        mock_run = mocker.patch("subprocess.run")
+
+        run_logged(["docker", "run", "--rm", "ubuntu:22.04"], "build", check=True)
+
+        assert mock_run.call_args[0][0] == ["docker", "run", "--rm", "ubuntu:22.04"]
+
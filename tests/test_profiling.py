@@ -0,0 +1,123 @@
+import pytest
+import os
+import pstats
+import threading
+import time
+from monitoring import profiling
+from monitoring.profiling import Profiler
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def _parse_yaml_like():
+    return _busy(0.05)
+
+
+def _compile_like():
+    return _busy(0.05)
+
+
+@pytest.fixture
+def out_dir(temp_repo_dir):
+    return os.path.join(temp_repo_dir, "profile")
+
+
+class TestProfiler:
+    """Test per-stage profiles and their files."""
+
+    @pytest.mark.skipif(not profiling.PER_THREAD_CPROFILE, reason="cProfile is process-wide from Python 3.12")
+    def test_cprofile_writes_pstats_per_stage(self, out_dir):
+        profiler = Profiler("cprofile")
+        profiler.start()
+        _parse_yaml_like()
+        with profiler.stage("build"):
+            _compile_like()
+
+        paths = profiler.stop(out_dir)
+
+        assert sorted(os.path.basename(path) for path in paths) == ["build.pstats", "orchestrator.pstats"]
+        build = {func[2] for func in pstats.Stats(os.path.join(out_dir, "build.pstats")).stats}
+        outside = {func[2] for func in pstats.Stats(os.path.join(out_dir, "orchestrator.pstats")).stats}
+        assert "_compile_like" in build and "_compile_like" not in outside
+        assert "_parse_yaml_like" in outside and "_parse_yaml_like" not in build
+
+    @pytest.mark.skipif(not profiling.PER_THREAD_CPROFILE, reason="cProfile is process-wide from Python 3.12")
+    def test_stages_of_worker_threads_are_merged(self, out_dir):
+        profiler = Profiler("cprofile")
+        profiler.start()
+
+        def worker():
+            with profiler.stage("build"):
+                _busy(0.02)
+        threads = [threading.Thread(target=worker) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        profiler.stop(out_dir)
+
+        stats = pstats.Stats(os.path.join(out_dir, "build.pstats")).stats
+        (calls,) = [stat[1] for func, stat in stats.items() if func[2] == "_busy"]
+        assert calls == 3
+
+    def test_process_wide_cprofile_splits_stages_by_sampling(self, out_dir, mocker):
+        """Test that where cProfile covers every thread, one process profile is written and stages come from samples."""
+        mocker.patch.object(profiling, "PER_THREAD_CPROFILE", False)
+        profiler = Profiler("cprofile", interval=0.001)
+        profiler.start()
+        with profiler.stage("build"):
+            _compile_like()
+
+        paths = profiler.stop(out_dir)
+
+        names = {os.path.basename(path) for path in paths}
+        assert "process.pstats" in names and "build.pstats" not in names
+        assert "_compile_like" in {func[2] for func in pstats.Stats(os.path.join(out_dir, "process.pstats")).stats}
+        with open(os.path.join(out_dir, "build.collapsed")) as f:
+            assert any("_compile_like (test_profiling.py" in line for line in f)
+
+    def test_sampler_writes_collapsed_stacks_per_stage(self, out_dir):
+        profiler = Profiler("sample", interval=0.001)
+        profiler.start()
+        with profiler.stage("publish"):
+            _compile_like()
+
+        paths = profiler.stop(out_dir)
+
+        assert {os.path.basename(path) for path in paths} >= {"publish.collapsed", "all.collapsed"}
+        with open(os.path.join(out_dir, "publish.collapsed")) as f:
+            lines = f.read().splitlines()
+        assert any("_compile_like (test_profiling.py" in line for line in lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+        with open(os.path.join(out_dir, "all.collapsed")) as f:
+            assert any(line.startswith("publish;") for line in f)
+
+    def test_blocked_threads_are_not_sampled(self, out_dir):
+        profiler = Profiler("sample")
+        event = threading.Event()
+        waiter = threading.Thread(target=event.wait)
+        waiter.start()
+        try:
+            profiler.take_sample(skip=threading.get_ident())
+        finally:
+            event.set()
+            waiter.join()
+
+        assert all("wait (threading.py" not in stack for counts in profiler._samples.values() for stack in counts)
+
+    def test_stage_is_a_no_op_when_not_profiling(self):
+        with profiling.stage("build"):
+            pass
+
+        assert profiling.stop("unused") == []
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError, match="Unknown profiling mode"):
+            Profiler("perf")
@@ -0,0 +1,86 @@
+import pytest
+import os
+import subprocess
+from lib import ramdisk
+from lib.ramdisk import RamDisk, filesystem_type
+
+MOUNTS = """sysfs /sys sysfs rw 0 0
+/dev/sda1 / ext4 rw 0 0
+tmpfs /dev/shm tmpfs rw,size=65536k 0 0
+zab-ramdisk /var/lib/zab\\040ram tmpfs rw,size=1024k 0 0
+"""
+
+
+@pytest.fixture
+def mounts(temp_repo_dir, mocker):
+    path = os.path.join(temp_repo_dir, "mounts")
+    with open(path, "w") as f:
+        f.write(MOUNTS)
+    mocker.patch.object(ramdisk, "MOUNTS_FILE", path)
+
+
+@pytest.fixture
+def open_ramdisk(temp_repo_dir, mocker):
+    """A RamDisk on a plain directory, taken for a tmpfs with 1G free."""
+    def factory(budget="100M"):
+        mocker.patch("lib.ramdisk.filesystem_type", return_value="tmpfs")
+        disk = RamDisk(os.path.join(temp_repo_dir, "ram"), budget=budget, headroom=1.5)
+        mocker.patch.object(disk, "free", return_value=1024 ** 3)
+        assert disk.open()
+        return disk
+    return factory
+
+
+class TestFilesystemType:
+
+    def test_longest_mount_point_wins(self, mounts):
+        assert filesystem_type("/dev/shm/zab") == "tmpfs"
+        assert filesystem_type("/dev/shmem") == "ext4"
+        assert filesystem_type("/var/lib/zab ram/builds") == "tmpfs"
+        assert filesystem_type("/tmp") == "ext4"
+
+
+class TestRamDisk:
+    """Test builds are placed on the ramdisk only when their estimate fits."""
+
+    def test_reservations_share_the_budget(self, open_ramdisk):
+        disk = open_ramdisk(budget="100M")
+
+        with disk.reserve(40 * 1024 ** 2) as first:
+            assert first == disk.path
+            assert disk.reserved == 60 * 1024 ** 2
+            # 60M more would exceed the budget
+            with disk.reserve(40 * 1024 ** 2) as second:
+                assert second is None
+        assert disk.reserved == 0
+        with disk.reserve(40 * 1024 ** 2) as third:
+            assert third == disk.path
+
+    def test_builds_without_history_run_on_disk(self, open_ramdisk):
+        disk = open_ramdisk()
+
+        with disk.reserve(None) as path:
+            assert path is None
+
+    def test_full_tmpfs_refuses_reservations(self, open_ramdisk):
+        disk = open_ramdisk(budget="10G")
+        with disk.reserve(1024 ** 3) as path:
+            assert path is None
+
+    def test_reservation_is_released_when_the_build_fails(self, open_ramdisk):
+        disk = open_ramdisk()
+        with pytest.raises(RuntimeError):
+            with disk.reserve(1024):
+                raise RuntimeError("build failed")
+        assert disk.reserved == 0
+
+    def test_tmpfs_is_mounted_unless_there(self, temp_repo_dir, mocker):
+        mocker.patch("lib.ramdisk.filesystem_type", return_value="ext4")
+        run = mocker.patch("lib.ramdisk.subprocess.run",
+                           side_effect=subprocess.CalledProcessError(32, "mount", stderr=b"permission denied"))
+        disk = RamDisk(os.path.join(temp_repo_dir, "ram"), budget="1G")
+
+        assert not disk.open()
+        assert run.call_args.args[0][:5] == ["mount", "-t", "tmpfs", "-o", f"size={1024 ** 3},mode=1777"]
+        with disk.reserve(1024) as path:
+            assert path is None
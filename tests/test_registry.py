@@ -0,0 +1,91 @@
+import pytest
+import os
+import subprocess
+import sys
+import yaml
+from builders.registry import BuilderRegistry
+from orchestrator.orchestrator import BuildOrchestrator
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import time budget for the orchestrator module, far above the ~50ms it takes
+STARTUP_BUDGET_SECONDS = 1.0
+
+
+class CountingBuilder:
+    supports_distro_matrix = False
+    instances = 0
+
+    def __init__(self):
+        # Imported by the registry under its own module name, so count on the class actually used
+        type(self).instances += 1
+
+
+class TestBuilderRegistry:
+    """Test lazy loading of builders by key."""
+
+    def test_builders_are_imported_on_first_use_only(self):
+        configured = []
+        registry = BuilderRegistry({"counting": "tests.test_registry.CountingBuilder"},
+                                   configure=configured.append, entry_points=False)
+
+        assert "counting" in registry
+        assert registry.loaded == []
+        builder = registry["counting"]
+        assert registry.get("counting") is builder
+        assert type(builder).instances == 1
+        assert configured == [builder]
+        assert registry.loaded == ["counting"]
+
+    def test_builtin_builders_are_reachable(self):
+        registry = BuilderRegistry(entry_points=False)
+
+        assert set(registry) == {"script", "binary_go", "binary_java"}
+        assert type(registry["binary_java"]).__name__ == "JavaBinaryBuilder"
+
+    def test_broken_builder_is_missing(self):
+        registry = BuilderRegistry({"binary_go": "builders.binary.missing_builder:GoBuilder"}, entry_points=False)
+
+        assert registry.get("binary_go") is None
+        assert "binary_go" not in registry
+        assert registry.get("binary_rust") is None
+
+    def test_plugins_replace_builtins_and_config_replaces_plugins(self, mocker):
+        from importlib.metadata import EntryPoint
+        plugins = [EntryPoint("binary_go", "tests.test_registry:CountingBuilder", "zab.builders"),
+                   EntryPoint("script", "tests.test_registry:CountingBuilder", "zab.builders")]
+        mocker.patch("importlib.metadata.entry_points", return_value=plugins)
+        registry = BuilderRegistry({"script": "builders.script.loz_script_builder.ScriptBuilder"})
+
+        assert type(registry["binary_go"]).__name__ == "CountingBuilder"
+        assert type(registry["script"]).__name__ == "ScriptBuilder"
+
+    def test_script_builder_gets_script_repositories(self, temp_repo_dir, mocker):
+        """Test the instance used for builds is the one wired to the script repositories."""
+        config_path = os.path.join(temp_repo_dir, "global_config.yaml")
+        with open(config_path, "w") as f:
+            yaml.safe_dump({"artifact_store": {"path": os.path.join(temp_repo_dir, "store")}}, f)
+        mocker.patch.object(BuildOrchestrator, "_clone_scripts", return_value={"scripts": "/tmp/scripts"})
+
+        orchestrator = BuildOrchestrator(config_path)
+
+        assert orchestrator.builders.loaded == []
+        assert orchestrator.builders.get("script").script_repo_paths == {"scripts": "/tmp/scripts"}
+
+    def test_startup_imports_no_builders(self, tmp_path):
+        """Test importing the orchestrator stays within budget and leaves builders and requests unimported."""
+        code = (
+            "import sys, time\n"
+            "start = time.perf_counter()\n"
+            "import orchestrator.orchestrator\n"
+            "elapsed = time.perf_counter() - start\n"
+            "print(elapsed)\n"
+            "print(' '.join(m for m in ('requests', 'lib.org_scanner', 'builders.script.loz_script_builder',"
+            " 'builders.binary.go_binary_builder', 'builders.binary.java_binary_builder') if m in sys.modules))\n"
+        )
+        # Away from the repository, where the logger would create logs/
+        result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=dict(os.environ, PYTHONPATH=ROOT),
+                                capture_output=True, text=True, check=True)
+        elapsed, imported = (result.stdout.splitlines() + [""])[:2]
+
+        assert imported == ""
+        assert float(elapsed) < STARTUP_BUDGET_SECONDS
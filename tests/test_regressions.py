@@ -0,0 +1,80 @@
+import pytest
+import os
+from lib.build_history import BuildHistory
+from lib.regressions import RegressionDetector
+
+
+@pytest.fixture
+def history(temp_repo_dir):
+    return BuildHistory(os.path.join(temp_repo_dir, "history.jsonl"))
+
+
+def _builds(history, seconds, artifact="cli", **fields):
+    for value in seconds:
+        history.record(repo="app", artifact=artifact, status="success", seconds=value, **fields)
+
+
+class TestRegressionDetector:
+    """Test flagging builds well above their rolling baseline."""
+
+    def test_doubled_duration_is_flagged(self, history):
+        _builds(history, [600, 620, 590, 610, 605, 615])
+        detector = RegressionDetector(history)
+
+        (regression,) = detector.check("app", "cli", {"seconds": 1250})
+
+        assert regression.metric == "seconds"
+        assert regression.baseline == 607.5
+        assert regression.samples == 6
+        assert "2.1x the median 608s of the last 6 builds" in regression.describe()
+
+    def test_normal_variation_is_not_flagged(self, history):
+        _builds(history, [600, 700, 550, 650, 620, 580])
+        detector = RegressionDetector(history)
+
+        assert detector.check("app", "cli", {"seconds": 720}) == []
+
+    def test_noisy_artifact_needs_a_larger_jump(self, history):
+        """Test the threshold scales with how much the artifact's builds vary."""
+        _builds(history, [300, 900, 400, 1000, 500, 800])
+        detector = RegressionDetector(history)
+
+        assert detector.check("app", "cli", {"seconds": 1200}) == []
+        assert len(detector.check("app", "cli", {"seconds": 2400})) == 1
+
+    def test_small_absolute_increase_is_ignored(self, history):
+        _builds(history, [2, 2, 2, 2, 2])
+        detector = RegressionDetector(history)
+
+        assert detector.check("app", "cli", {"seconds": 10}) == []
+
+    def test_too_little_history(self, history):
+        _builds(history, [600, 600, 600])
+        detector = RegressionDetector(history, min_samples=5)
+
+        assert detector.check("app", "cli", {"seconds": 6000}) == []
+
+    def test_failed_builds_and_other_artifacts_are_not_the_baseline(self, history):
+        _builds(history, [600] * 5)
+        _builds(history, [60] * 5, artifact="server")
+        history.record(repo="app", artifact="cli", status="failed", seconds=5)
+        detector = RegressionDetector(history)
+
+        assert detector.check("app", "server", {"seconds": 90}) == []
+        assert detector.check("app", "cli", {"seconds": 700}) == []
+
+    def test_size_and_peak_memory(self, history):
+        _builds(history, [600] * 5, bytes=50 * 1024 ** 2, peak_memory=1024 ** 3)
+        detector = RegressionDetector(history)
+
+        regressions = detector.check("app", "cli", {"seconds": 600, "bytes": 51 * 1024 ** 2, "peak_memory": 3 * 1024 ** 3})
+
+        assert [r.metric for r in regressions] == ["peak_memory"]
+        assert "peak_memory 3.0G is 3.0x the median 1.0G" in regressions[0].describe()
+
+    def test_baseline_is_the_last_window_builds(self, history):
+        """Test a lasting change becomes the new baseline."""
+        _builds(history, [600] * 5 + [1200] * 5)
+        detector = RegressionDetector(history, window=5)
+
+        assert detector.check("app", "cli", {"seconds": 1250}) == []
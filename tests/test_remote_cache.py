@@ -0,0 +1,98 @@
+import pytest
+import hashlib
+import json
+import os
+from lib.artifact_store import ArtifactStore
+from lib.remote_cache import RemoteCache
+
+KEY = "k" * 64
+
+
+def _artifact(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, "wb") as f:
+        f.write(content)
+    return {'path': path, 'digest': hashlib.sha256(content).hexdigest(), 'distro': "rhel-9"}
+
+
+class TestRemoteCache:
+    """Test the HTTP protocol against a stand-in cache server."""
+
+    def test_put_then_get_round_trip(self, cache_server, temp_repo_dir):
+        cache = RemoteCache(cache_server.url)
+        file = _artifact(temp_repo_dir, "app-1.0.tar.gz", b"artifact")
+
+        cache.put(KEY, {'repo': "app", 'seconds': 12.5}, [file])
+        entry = cache.get(KEY)
+
+        assert entry['repo'] == "app" and entry['seconds'] == 12.5
+        assert entry['files'] == [{'name': "app-1.0.tar.gz", 'digest': file['digest'], 'size': 8, 'distro': "rhel-9"}]
+        # The file is there before the entry that names it
+        assert [request for request in cache_server.requests if request[0] == "PUT"] == [
+            ("PUT", f"/zab/cas/{file['digest']}"), ("PUT", f"/zab/ac/{KEY}")]
+
+    def test_files_already_cached_are_not_uploaded_again(self, cache_server, temp_repo_dir):
+        cache = RemoteCache(cache_server.url)
+        file = _artifact(temp_repo_dir, "app.tar.gz", b"same")
+        cache.put(KEY, {}, [file])
+
+        cache.put("other", {}, [file])
+
+        assert [path for method, path in cache_server.requests if method == "PUT"].count(f"/zab/cas/{file['digest']}") == 1
+
+    def test_miss(self, cache_server):
+        assert RemoteCache(cache_server.url).get(KEY) is None
+        # A 404 is an answer, not retried
+        assert len(cache_server.requests) == 1
+
+    def test_server_errors_are_retried(self, cache_server):
+        cache_server.failures = [503]
+
+        assert RemoteCache(cache_server.url).get(KEY) is None
+        assert len(cache_server.requests) == 2
+
+    def test_entry_for_another_key_is_rejected(self, cache_server):
+        cache_server.blobs[f"ac/{KEY}"] = json.dumps({'key': "other", 'version': 1, 'files': []}).encode()
+
+        with pytest.raises(ValueError, match="not a version 1 entry"):
+            RemoteCache(cache_server.url).get(KEY)
+
+    @pytest.mark.parametrize("entry", [
+        {'files': None},
+        {'files': []},
+        {'files': [{'name': "../../etc/passwd", 'digest': "a" * 64}]},
+        {'files': [{'name': "app.tar.gz", 'digest': "not a digest"}]},
+        {'files': [{'name': "app.tar.gz", 'digest': "a" * 64}], 'seconds': "slow"},
+    ])
+    def test_malformed_entry_is_rejected(self, cache_server, entry):
+        cache_server.blobs[f"ac/{KEY}"] = json.dumps(dict(entry, key=KEY, version=1)).encode()
+
+        with pytest.raises(ValueError, match=f"Remote cache entry {KEY}"):
+            RemoteCache(cache_server.url).get(KEY)
+
+    def test_fetch_verifies_downloads_into_the_store(self, cache_server, temp_repo_dir):
+        cache = RemoteCache(cache_server.url)
+        file = _artifact(temp_repo_dir, "app-1.0.tar.gz", b"artifact")
+        entry = cache.put(KEY, {}, [file])
+        store = ArtifactStore(os.path.join(temp_repo_dir, "store"))
+
+        paths = cache.fetch(entry, store, "app", "1.0", "main")
+
+        assert [os.path.relpath(path, store.root) for path in paths] == [os.path.join("views", "app", "1.0", "rhel-9", "app-1.0.tar.gz")]
+        assert store.lookup("app")[0]['digest'] == file['digest']
+
+    def test_corrupt_download_is_rejected(self, cache_server, temp_repo_dir):
+        cache = RemoteCache(cache_server.url)
+        file = _artifact(temp_repo_dir, "app.tar.gz", b"artifact")
+        cache_server.blobs[f"cas/{file['digest']}"] = b"tampered"
+
+        with pytest.raises(ValueError, match="expected"):
+            cache.download(file['digest'], temp_repo_dir, "download.tar.gz")
+        assert not os.path.exists(os.path.join(temp_repo_dir, "download.tar.gz"))
+
+    def test_token_is_sent(self, cache_server, mocker):
+        urlopen = mocker.spy(__import__("urllib.request").request, "urlopen")
+
+        RemoteCache(cache_server.url, token="secret").get(KEY)
+
+        assert urlopen.call_args.args[0].get_header("Authorization") == "Bearer secret"
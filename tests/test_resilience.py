@@ -0,0 +1,199 @@
+import pytest
+import os
+import shutil
+import subprocess
+from lib.github_api import GitHubRepo
+from lib.resilience import CircuitOpenError, Resilience, RetryPolicy, is_transient, remote_of
+
+
+class Flaky:
+    """Stand-in for a remote that fails a number of times before it answers."""
+
+    def __init__(self, failures, result="ok"):
+        self.failures = failures
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, *args, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise subprocess.CalledProcessError(128, "git", stderr=b"Could not resolve host")
+        return self.result(*args, **kwargs) if callable(self.result) else self.result
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def resilience(clock):
+    sleeps = []
+    instance = Resilience(RetryPolicy(attempts=3, base_delay=1, max_delay=3), failure_threshold=4,
+                          reset_seconds=60, sleep=sleeps.append, clock=clock)
+    instance.sleeps = sleeps
+    return instance
+
+
+class TestRemoteOf:
+    """Test mapping targets to the remote whose breaker they use."""
+
+    @pytest.mark.parametrize("target,remote", [
+        ("https://github.com/linuxonzapps/kind", "github.com"),
+        ("git@github.com:linuxonzapps/kind.git", "github.com"),
+        ("ghcr.io/linuxonzapps/kind:1.0", "ghcr.io"),
+        ("registry.example.com:5000/app", "registry.example.com:5000"),
+        ("localhost/app:dev", "localhost"),
+        ("ubuntu:22.04", "docker.io"),
+        ("library/ubuntu", "docker.io"),
+        ("github.com", "github.com"),
+    ])
+    def test_remote_of(self, target, remote):
+        assert remote_of(target) == remote
+
+
+class TestResilience:
+    """Test retries with backoff and per-remote circuit breakers."""
+
+    def test_transient_failures_are_retried(self, resilience):
+        """Test an idempotent call succeeds after failures, backing off in between."""
+        flaky = Flaky(failures=2)
+
+        assert resilience.call("github.com", flaky) == "ok"
+        assert flaky.calls == 3
+        assert len(resilience.sleeps) == 2
+        assert resilience.sleeps[0] <= 1 and resilience.sleeps[1] <= 2
+
+    def test_gives_up_after_attempts(self, resilience):
+        flaky = Flaky(failures=5)
+
+        with pytest.raises(subprocess.CalledProcessError):
+            resilience.call("github.com", flaky)
+        assert flaky.calls == 3
+
+    def test_non_idempotent_call_is_not_retried(self, resilience):
+        """Test retry=False calls once but still counts towards the breaker."""
+        flaky = Flaky(failures=1)
+
+        with pytest.raises(subprocess.CalledProcessError):
+            resilience.call("github.com", flaky, retry=False)
+        assert flaky.calls == 1
+        assert resilience.breaker("github.com").failures == 1
+
+    def test_other_errors_are_not_retried(self, resilience):
+        def broken():
+            raise ValueError("bad config")
+
+        with pytest.raises(ValueError):
+            resilience.call("github.com", broken)
+        assert resilience.breaker("github.com").failures == 0
+
+    @pytest.mark.parametrize("error", [
+        subprocess.CalledProcessError(128, "git", stderr=b"fatal: Remote branch nope not found in upstream origin"),
+        subprocess.CalledProcessError(1, "gh", stderr=b"HTTP 422: Validation Failed (tag_name already exists)"),
+        FileNotFoundError("gh"),
+    ])
+    def test_deterministic_failures_are_not_retried_or_counted(self, resilience, error):
+        """Test a failure the remote answered with is raised at once and leaves the breaker alone."""
+        calls = []
+
+        def fail():
+            calls.append(1)
+            raise error
+
+        for _ in range(5):
+            with pytest.raises(type(error)):
+                resilience.call("github.com", fail)
+        assert len(calls) == 5
+        assert resilience.breaker("github.com").failures == 0
+        assert resilience.breaker("github.com").state == "closed"
+
+    @pytest.mark.parametrize("error,transient", [
+        (subprocess.CalledProcessError(128, "git", stderr=b"fatal: unable to access: Could not resolve host: github.com"), True),
+        (subprocess.CalledProcessError(1, "gh", stderr="HTTP 502: Bad Gateway"), True),
+        (subprocess.CalledProcessError(1, "docker", stderr=b"manifest unknown"), False),
+        (subprocess.CalledProcessError(1, "docker"), False),
+        (subprocess.TimeoutExpired("git", 60), True),
+        (ConnectionResetError(), True),
+    ])
+    def test_is_transient(self, error, transient):
+        assert is_transient(error) is transient
+
+    def test_open_breaker_fails_fast(self, resilience):
+        """Test an outage stops calls to that remote only."""
+        outage = Flaky(failures=100)
+        with pytest.raises(subprocess.CalledProcessError):
+            resilience.call("https://github.com/a/b", outage)
+        with pytest.raises(CircuitOpenError):
+            resilience.call("https://github.com/a/c", outage)
+
+        assert outage.calls == 4
+        assert resilience.breaker("github.com").state == "open"
+        with pytest.raises(CircuitOpenError):
+            resilience.call("github.com", outage)
+        assert outage.calls == 4
+        assert resilience.call("ghcr.io/org/image:1", Flaky(failures=0)) == "ok"
+
+    def test_half_open_trial_closes_or_reopens(self, resilience, clock):
+        """Test one trial call after the reset period decides the breaker state."""
+        outage = Flaky(failures=100)
+        for error in (subprocess.CalledProcessError, CircuitOpenError):
+            with pytest.raises(error):
+                resilience.call("github.com", outage)
+
+        clock.now += 61
+        assert resilience.breaker("github.com").state == "half-open"
+        with pytest.raises(subprocess.CalledProcessError):
+            resilience.call("github.com", Flaky(failures=1), retry=False)
+        assert resilience.breaker("github.com").state == "open"
+
+        clock.now += 61
+        assert resilience.call("github.com", Flaky(failures=0)) == "ok"
+        assert resilience.breaker("github.com").state == "closed"
+
+
+class TestClone:
+    """Test cloning through the resilience layer against a flaky local remote."""
+
+    def test_clone_survives_transient_failures(self, temp_repo_dir, mocker):
+        """Test a clone is retried into a clean directory after failed attempts."""
+        origin = os.path.join(temp_repo_dir, "origin")
+        subprocess.run(["git", "init", "-q", "-b", "main", origin], check=True)
+        with open(os.path.join(origin, "main.go"), "w") as f:
+            f.write("package main")
+        subprocess.run(["git", "-C", origin, "add", "."], check=True)
+        subprocess.run(["git", "-C", origin, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init"], check=True)
+
+        real_run = subprocess.run
+
+        def partial_then_fail(cmd, **kwargs):
+            # A dropped connection leaves a half-written checkout behind
+            with open(os.path.join(cmd[-1], "partial"), "w") as f:
+                f.write("x")
+            raise subprocess.CalledProcessError(128, cmd, stderr=b"early EOF")
+
+        calls = []
+
+        def run(cmd, **kwargs):
+            if cmd[:2] == ["git", "clone"]:
+                calls.append(cmd)
+                if len(calls) <= 2:
+                    return partial_then_fail(cmd, **kwargs)
+            return real_run(cmd, **kwargs)
+
+        mocker.patch("lib.github_api.subprocess.run", side_effect=run)
+        path = GitHubRepo(f"file://{origin}").clone("main")
+        try:
+            assert len(calls) == 3
+            assert os.path.exists(os.path.join(path, "main.go"))
+            assert not os.path.exists(os.path.join(path, "partial"))
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,95 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from orchestrator.scheduler import CronExpression, Scheduler, jitter_offset
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+class TestCronExpression:
+    """Test cron parsing and next-run computation."""
+
+    @pytest.mark.parametrize("expression,after,expected", [
+        ("0 * * * *", _utc(2026, 1, 1, 10, 0), _utc(2026, 1, 1, 11, 0)),
+        ("*/15 * * * *", _utc(2026, 1, 1, 10, 7), _utc(2026, 1, 1, 10, 15)),
+        ("30 2 * * *", _utc(2026, 1, 1, 3, 0), _utc(2026, 1, 2, 2, 30)),
+        ("0 3 * * SAT", _utc(2026, 1, 1, 0, 0), _utc(2026, 1, 3, 3, 0)),
+        ("0 0 1 FEB *", _utc(2026, 3, 5, 0, 0), _utc(2027, 2, 1, 0, 0)),
+        ("0 9-17/4 * * 1-5", _utc(2026, 1, 2, 17, 30), _utc(2026, 1, 5, 9, 0)),
+        ("@nightly", _utc(2026, 1, 1, 12, 0), _utc(2026, 1, 2, 0, 0)),
+        ("0 0 * * 7", _utc(2026, 1, 1, 0, 0), _utc(2026, 1, 4, 0, 0)),
+    ])
+    def test_next_after(self, expression, after, expected):
+        assert CronExpression(expression).next_after(after) == expected
+
+    def test_day_fields_are_ored_when_both_restricted(self):
+        """Test cron's day-of-month OR day-of-week rule."""
+        cron = CronExpression("0 0 13 * FRI")
+        assert cron.matches(_utc(2026, 1, 13, 0, 0))  # Tuesday the 13th
+        assert cron.matches(_utc(2026, 1, 16, 0, 0))  # Friday
+
+    @pytest.mark.parametrize("expression", ["* * * *", "61 * * * *", "*/0 * * * *", "0 0 31 2 *", "0 0 * FOO *"])
+    def test_invalid_expressions(self, expression):
+        with pytest.raises(ValueError):
+            CronExpression(expression).next_after(_utc(2026, 1, 1))
+
+
+class TestScheduler:
+    """Test scheduled triggering with jitter and busy skipping."""
+
+    class Orchestrator:
+        def __init__(self, schedules):
+            self.schedules = schedules
+
+        def repository_schedule(self, repo):
+            return self.schedules[repo["name"]]
+
+    def _scheduler(self, schedules, statuses=None, jitter=0):
+        self.now = _utc(2026, 1, 1, 0, 0, 30)
+        self.submitted = []
+        statuses = statuses or {}
+
+        def submit(repo_name, source):
+            self.submitted.append((repo_name, source))
+            return statuses.get(repo_name, "queued")
+        scheduler = Scheduler(self.Orchestrator(schedules), submit, jitter_seconds=jitter, clock=lambda: self.now)
+        scheduler.load([{"name": name} for name in schedules])
+        return scheduler
+
+    def test_repos_follow_their_own_schedules(self):
+        """Test cheap repos can run often while heavy ones run nightly."""
+        scheduler = self._scheduler({"opa": "*/10 * * * *", "envoy": "@nightly"})
+
+        triggered = []
+        for _ in range(24 * 6):
+            self.now += timedelta(minutes=10)
+            triggered += scheduler.tick()
+
+        assert triggered.count("opa") == 24 * 6
+        assert triggered.count("envoy") == 1
+        assert all(source == "schedule" for _, source in self.submitted)
+
+    def test_jitter_spreads_start_times(self):
+        """Test repos sharing a schedule get stable, different offsets."""
+        names = ["envoy", "elasticsearch", "bazel", "spark"]
+        scheduler = self._scheduler({name: "0 2 * * *" for name in names}, jitter=900)
+
+        runs = {name: scheduler.next_run(name) for name in names}
+
+        assert len(set(runs.values())) > 1
+        for name, run in runs.items():
+            assert run == _utc(2026, 1, 1, 2, 0) + jitter_offset(name, 900)
+            assert timedelta(0) <= run - _utc(2026, 1, 1, 2, 0) <= timedelta(seconds=900)
+
+    def test_busy_repo_skips_tick(self):
+        """Test a tick is skipped while the previous build is still running."""
+        scheduler = self._scheduler({"envoy": "0 * * * *"}, statuses={"envoy": "busy"})
+
+        self.now = _utc(2026, 1, 1, 1, 0, 5)
+        assert scheduler.tick() == []
+        assert scheduler.next_run("envoy") == _utc(2026, 1, 1, 2, 0)
+
+    def test_invalid_schedule_is_not_loaded(self):
+        scheduler = self._scheduler({"opa": "every hour"})
+        assert scheduler.entries == {}
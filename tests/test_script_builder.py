@@ -327,3 +327,98 @@ class TestScriptBuilder:
         # This test documents that behavior
         with pytest.raises(subprocess.CalledProcessError):
             builder.publish(artifact_path, "test-app", artifact)
+
+    @patch('lib.checksum.generate_checksum')
+    def test_publish_with_recompression(self, mock_checksum, temp_repo_dir, mocker):
+        """Test recompressed tarballs are published next to the .tar.gz."""
+        artifact_path = os.path.join(temp_repo_dir, "test-app-1.0.0-linux-s390x.tar.gz")
+        with open(artifact_path, "w") as f:
+            f.write("fake tarball")
+        zst_path = os.path.join(temp_repo_dir, "test-app-1.0.0-linux-s390x.tar.zst")
+
+        mock_checksum.return_value = "abc123"
+        mock_recompress = mocker.patch('lib.compression.recompress_tarballs', return_value=[{"output": zst_path}])
+        mock_run = mocker.patch('subprocess.run')
+
+        builder = ScriptBuilder()
+        artifact = {"version": "1.0.0", "recompress": {"codecs": ["zstd"]}}
+        builder.publish(artifact_path, "test-app", artifact)
+
+        mock_recompress.assert_called_once()
+        gh_call = mock_run.call_args[0][0]
+        assert "test-app-1.0.0-linux-s390x.tar.gz" in [os.path.basename(a) for a in gh_call]
+        assert zst_path in gh_call
+        assert f"{zst_path}.sha256" in gh_call
+
+    @patch('lib.checksum.generate_checksum')
+    def test_publish_recompressed_without_gz(self, mock_checksum, temp_repo_dir, mocker):
+        """Test keep_gz: false publishes only the recompressed tarball."""
+        artifact_path = os.path.join(temp_repo_dir, "test-app-1.0.0-linux-s390x.tar.gz")
+        with open(artifact_path, "w") as f:
+            f.write("fake tarball")
+        xz_path = os.path.join(temp_repo_dir, "test-app-1.0.0-linux-s390x.tar.xz")
+
+        mock_checksum.return_value = "abc123"
+        mocker.patch('lib.compression.recompress_tarballs', return_value=[{"output": xz_path}])
+        mock_run = mocker.patch('subprocess.run')
+
+        builder = ScriptBuilder()
+        artifact = {"version": "1.0.0", "recompress": {"codecs": ["xz"], "keep_gz": False}}
+        builder.publish(artifact_path, "test-app", artifact)
+
+        gh_call = mock_run.call_args[0][0]
+        assert xz_path in gh_call
+        assert not any(a.endswith(".tar.gz") for a in gh_call)
+
+    @patch('lib.checksum.generate_checksum')
+    def test_publish_variants_single_release(self, mock_checksum, temp_repo_dir, mocker):
+        """Test several distro builds are published to one release in one pass."""
+        artifact_paths = []
+        for distro in ("ubuntu-22.04", "rhel-9.4"):
+            workspace = os.path.join(temp_repo_dir, distro)
+            os.makedirs(workspace)
+            artifact_path = os.path.join(workspace, "test-app-1.0.0-linux-s390x.tar.gz")
+            for path in (artifact_path, f"{artifact_path}.sha256"):
+                with open(path, "w") as f:
+                    f.write(distro)
+            with open(os.path.join(workspace, ".distro_zab.txt"), "w") as f:
+                f.write(f"{distro}\n")
+            artifact_paths.append(artifact_path)
+
+        mock_checksum.side_effect = ["sum-ubuntu", "sum-rhel"]
+        mock_run = mocker.patch('subprocess.run')
+
+        builder = ScriptBuilder()
+        assets = builder.publish_variants(artifact_paths, "test-app", {"version": "1.0.0"})
+
+        mock_run.assert_called_once()
+        gh_call = mock_run.call_args[0][0]
+        assert "create" in gh_call
+        for distro in ("ubuntu-22.04", "rhel-9.4"):
+            expected = os.path.join(temp_repo_dir, distro, f"test-app-1.0.0-{distro}-linux-s390x.tar.gz")
+            assert expected in gh_call
+            assert expected in assets
+
+    @patch('lib.checksum.generate_checksum')
+    def test_publish_variants_skips_identical(self, mock_checksum, temp_repo_dir, mocker):
+        """Test a byte-identical variant is not uploaded twice."""
+        artifact_paths = []
+        for distro in ("ubuntu-22.04", "ubuntu-24.04"):
+            workspace = os.path.join(temp_repo_dir, distro)
+            os.makedirs(workspace)
+            artifact_path = os.path.join(workspace, "test-app-1.0.0-linux-s390x.tar.gz")
+            for path in (artifact_path, f"{artifact_path}.sha256"):
+                with open(path, "w") as f:
+                    f.write("same")
+            with open(os.path.join(workspace, ".distro_zab.txt"), "w") as f:
+                f.write(f"{distro}\n")
+            artifact_paths.append(artifact_path)
+
+        mock_checksum.return_value = "same-sum"
+        mock_run = mocker.patch('subprocess.run')
+
+        builder = ScriptBuilder()
+        builder.publish_variants(artifact_paths, "test-app", {"version": "1.0.0"})
+
+        gh_call = mock_run.call_args[0][0]
+        assert len([a for a in gh_call if a.endswith(".tar.gz")]) == 1
@@ -0,0 +1,142 @@
+import pytest
+import os
+import subprocess
+import threading
+from lib import script_cache
+from lib.resilience import CircuitOpenError
+from lib.script_cache import ScriptRepoCache
+
+
+class FakeClock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _commit(path, files):
+    os.makedirs(path, exist_ok=True)
+    if not os.path.isdir(os.path.join(path, ".git")):
+        subprocess.run(["git", "init", "-q", "-b", "main", path], check=True)
+    for name, content in files.items():
+        with open(os.path.join(path, name), "w") as f:
+            f.write(content)
+    subprocess.run(["git", "-C", path, "add", "."], check=True)
+    subprocess.run(["git", "-C", path, "-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "change"], check=True)
+    return subprocess.run(["git", "-C", path, "rev-parse", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def scripts_remote(temp_repo_dir):
+    path = os.path.join(temp_repo_dir, "scripts")
+    return path, f"file://{path}", _commit(path, {"build.sh": "echo v1"})
+
+
+class TestScriptRepoCache:
+    """Test the freshness-checked script repository cache."""
+
+    def test_new_commit_is_fetched_into_a_new_snapshot(self, scripts_remote, temp_repo_dir):
+        path, url, first_sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=60, clock=clock)
+
+        first_path, sha = cache.sync("scripts", url)
+        assert sha == first_sha
+        second_sha = _commit(path, {"build.sh": "echo v2"})
+        # Within the interval the remote is not asked
+        assert cache.sync("scripts", url) == (first_path, first_sha)
+        clock.now += 61
+        second_path, sha = cache.sync("scripts", url)
+
+        assert sha == second_sha
+        assert cache.current("scripts") == (second_path, second_sha)
+        # A build that started on the old snapshot still sees the old scripts
+        with open(os.path.join(first_path, "build.sh")) as f:
+            assert f.read() == "echo v1"
+        with open(os.path.join(second_path, "build.sh")) as f:
+            assert f.read() == "echo v2"
+
+    def test_unchanged_remote_is_not_fetched(self, scripts_remote, temp_repo_dir, mocker):
+        path, url, sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=60, clock=clock)
+        cache.sync("scripts", url)
+        run = mocker.spy(script_cache.subprocess, "run")
+        clock.now += 61
+
+        assert cache.sync("scripts", url)[1] == sha
+        assert [call.args[0][:2] for call in run.call_args_list] == [["git", "ls-remote"]]
+
+    def test_unreachable_remote_keeps_last_snapshot(self, scripts_remote, temp_repo_dir):
+        path, url, sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=60, clock=clock)
+        snapshot = cache.sync("scripts", url)
+        os.rename(path, path + "-gone")
+        clock.now += 61
+
+        assert cache.sync("scripts", url) == snapshot
+        # Without a snapshot to fall back on, the failure surfaces
+        with pytest.raises((subprocess.CalledProcessError, CircuitOpenError)):
+            cache.sync("other", url)
+
+    def test_old_snapshots_are_pruned(self, scripts_remote, temp_repo_dir):
+        path, url, sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=0, keep=2, clock=clock)
+        shas = [cache.sync("scripts", url)[1]]
+        for version in (2, 3):
+            _commit(path, {"build.sh": f"echo v{version}"})
+            clock.now += 1
+            shas.append(cache.sync("scripts", url)[1])
+
+        assert sorted(os.listdir(os.path.join(temp_repo_dir, "cache", "scripts", "snapshots"))) == sorted(shas[1:])
+
+    def test_pinned_snapshots_are_not_pruned(self, scripts_remote, temp_repo_dir):
+        """Test a snapshot a running build uses outlives keep."""
+        path, url, sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=0, keep=1, clock=clock)
+        in_use, _ = cache.sync("scripts", url)
+        for version in (2, 3):
+            _commit(path, {"build.sh": f"echo v{version}"})
+            clock.now += 1
+            current, _ = cache.sync("scripts", url, pinned={in_use})
+
+        assert sorted(os.listdir(os.path.join(temp_repo_dir, "cache", "scripts", "snapshots"))) == sorted(
+            os.path.basename(p) for p in (in_use, current))
+
+    def test_stale_snapshots_spare_the_current_one(self, scripts_remote, temp_repo_dir):
+        """Test garbage collection sees only superseded snapshots, and cannot remove one a sync made current."""
+        path, url, sha = scripts_remote
+        clock = FakeClock()
+        cache = ScriptRepoCache(os.path.join(temp_repo_dir, "cache"), check_interval=0, clock=clock)
+        first_path, _ = cache.sync("scripts", url)
+        _commit(path, {"build.sh": "echo v2"})
+        clock.now += 1
+        second_path, _ = cache.sync("scripts", url)
+
+        assert cache.stale_snapshots() == [("scripts", first_path)]
+        cache.remove_snapshot("scripts", second_path)
+        cache.remove_snapshot("scripts", first_path)
+        assert os.path.isdir(second_path)
+        assert not os.path.exists(first_path)
+
+    def test_concurrent_syncs_fetch_once(self, scripts_remote, temp_repo_dir, mocker):
+        """Test orchestrators sharing a cache directory serialise on its lock."""
+        path, url, sha = scripts_remote
+        root = os.path.join(temp_repo_dir, "cache")
+        update = mocker.spy(ScriptRepoCache, "_update")
+        results = []
+
+        def sync():
+            results.append(ScriptRepoCache(root).sync("scripts", url))
+        threads = [threading.Thread(target=sync) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert update.call_count == 1
+        assert len(set(results)) == 1
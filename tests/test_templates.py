@@ -0,0 +1,98 @@
+import pytest
+import os
+import re
+import yaml
+from lib import templates
+from lib.templates import TemplateError, TemplateResolver, freeze, thaw, validate_config
+
+SCRIPT_TEMPLATE = """
+artifacts:
+  - type: script
+    image_name: "{{repo_name}}-image"
+    build_script:
+      path: build.sh
+      docker_image: ubuntu:22.04
+  - type: binary
+    language: go
+    version: 1.0
+schedule: "{{global_schedule}}"
+webhook: "{{global_webhook}}"
+"""
+
+
+@pytest.fixture
+def resolver(temp_repo_dir):
+    os.makedirs(os.path.join(temp_repo_dir, "templates"))
+    with open(os.path.join(temp_repo_dir, "templates", "script.yaml"), "w") as f:
+        f.write(SCRIPT_TEMPLATE)
+    return TemplateResolver(config_dir=temp_repo_dir)
+
+
+class TestTemplateResolver:
+    """Test cached template parsing and resolution."""
+
+    def test_template_is_parsed_once(self, resolver, mocker):
+        """Test repeated loads for many repositories reuse one parse."""
+        load = mocker.spy(templates.yaml, "load")
+
+        specs = [resolver.load("templates/script.yaml", f"repo-{i}", "0 * * * *", True) for i in range(100)]
+
+        assert load.call_count == 1
+        assert specs[7]["artifacts"][0]["image_name"] == "repo-7-image"
+        assert specs[0]["schedule"] == "0 * * * *"
+        assert specs[0]["webhook"] is True
+        # Artifacts without placeholders are the very same frozen object
+        assert specs[0]["artifacts"][1] is specs[1]["artifacts"][1]
+
+    def test_edited_template_is_reparsed(self, resolver, temp_repo_dir):
+        """Test a changed mtime invalidates the cached parse."""
+        path = os.path.join(temp_repo_dir, "templates", "script.yaml")
+        resolver.load("templates/script.yaml", "app", "0 * * * *", True)
+        with open(path, "w") as f:
+            f.write("artifacts: []\nschedule: '@nightly'\n")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        assert resolver.load("templates/script.yaml", "app", "0 * * * *", True)["schedule"] == "@nightly"
+
+    def test_specs_are_immutable(self, resolver):
+        spec = resolver.load("templates/script.yaml", "app", "0 * * * *", True)
+
+        with pytest.raises(TypeError):
+            spec["artifacts"][0]["type"] = "binary"
+        assert thaw(spec)["artifacts"][0]["build_script"] == {"path": "build.sh", "docker_image": "ubuntu:22.04"}
+
+    def test_overrides_are_matched_by_type(self, resolver):
+        """Test overrides update every artifact of their type, later ones winning."""
+        template = resolver.load("templates/script.yaml", "app", "0 * * * *", True)
+        overrides = freeze([{"type": "binary", "version": "2.0"}, {"type": "binary", "docker_image": "golang:1.24"},
+                            {"type": "binary", "version": "2.1"}, {"type": "rpm", "version": "9"}])
+
+        merged = resolver.apply_overrides(template, overrides)
+
+        assert dict(merged["artifacts"][1]) == {"type": "binary", "language": "go", "version": "2.1", "docker_image": "golang:1.24"}
+        assert merged["artifacts"][0] is template["artifacts"][0]
+        assert template["artifacts"][1]["version"] == 1.0
+
+    def test_c_loader_is_preferred(self):
+        if yaml.__with_libyaml__:
+            assert templates.SafeLoader is yaml.CSafeLoader
+
+
+class TestValidateConfig:
+    """Test the compiled config schema."""
+
+    def test_valid_config(self, resolver):
+        validate_config(resolver.load("templates/script.yaml", "app", "0 * * * *", True))
+
+    @pytest.mark.parametrize("config,message", [
+        ({}, "missing required 'artifacts'"),
+        ({"artifacts": {"type": "binary"}}, "artifacts: expected list, got dict"),
+        ({"artifacts": [{"language": "go"}]}, "artifacts[0]: missing required 'type'"),
+        ({"artifacts": [{"type": "script", "build_script": {"args": "-y"}}]}, "artifacts[0].build_script: missing required 'path'"),
+        ({"artifacts": [{"type": "binary", "version": True}]}, "artifacts[0].version: expected float/int/str, got bool"),
+        ({"artifacts": [{"type": "script", "distros": [1]}]}, "artifacts[0].distros[0]: expected dict/str, got int"),
+    ])
+    def test_invalid_configs(self, config, message):
+        with pytest.raises(TemplateError, match=re.escape(message)):
+            validate_config(freeze(config), "app")
@@ -0,0 +1,126 @@
+import pytest
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from lib.build_context import submit_with_context
+from lib.process import run_logged
+from monitoring.logger import log_context
+from monitoring.tracing import Tracer
+
+
+@pytest.fixture
+def tracer(mocker):
+    """A fresh tracer in place of the shared one."""
+    tracer = Tracer()
+    mocker.patch("monitoring.tracing.TRACER", tracer)
+    return tracer
+
+
+def _by_name(tracer):
+    return {span.name: span for span in tracer.finished()}
+
+
+class TestTracer:
+    """Test span collection, export and the end-of-run report."""
+
+    def test_spans_nest_across_executor_threads(self, tracer):
+        """Test spans opened in submit_with_context() workers are children of the submitting span."""
+        with tracer.span("run", "run"):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [submit_with_context(executor, self._work, tracer, name) for name in ("cli", "server")]
+                [future.result() for future in futures]
+
+        spans = _by_name(tracer)
+        assert spans["cli"].parent_id == spans["run"].id
+        assert spans["server"].parent_id == spans["run"].id
+        assert spans["cli"].thread_id != spans["run"].thread_id
+
+    @staticmethod
+    def _work(tracer, name):
+        with tracer.span(name, "artifact"):
+            time.sleep(0.01)
+
+    def test_spans_carry_log_context_and_errors(self, tracer):
+        with log_context(repo="app", artifact="cli"), pytest.raises(ValueError):
+            with tracer.span("build"):
+                raise ValueError("boom")
+
+        (span,) = tracer.finished()
+        assert span.args == {"repo": "app", "artifact": "cli", "error": "ValueError"}
+        assert span.describe() == "stage build [app/cli]"
+
+    def test_chrome_trace_export(self, tracer, temp_repo_dir):
+        with tracer.span("run", "run"):
+            with tracer.span("checkout"):
+                pass
+        path = os.path.join(temp_repo_dir, "trace.json")
+
+        tracer.write(path)
+
+        with open(path) as f:
+            trace = json.load(f)
+        complete = [event for event in trace["traceEvents"] if event["ph"] == "X"]
+        assert [event["name"] for event in complete] == ["checkout", "run"]
+        assert all(event["dur"] >= 0 and event["ts"] >= 0 for event in complete)
+        assert complete[0]["args"]["parent_id"] == complete[1]["args"]["span_id"]
+        assert any(event["ph"] == "M" and event["name"] == "thread_name" for event in trace["traceEvents"])
+
+    def test_critical_path_follows_the_longest_chain(self, tracer):
+        """Test the critical path goes through the concurrent artifact that finished last."""
+        with tracer.span("run", "run"):
+            with tracer.span("checkout"):
+                time.sleep(0.01)
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                futures = [submit_with_context(executor, self._artifact, tracer, name, seconds)
+                           for name, seconds in (("fast", 0.01), ("slow", 0.1))]
+                [future.result() for future in futures]
+
+        path = [(depth, span.name) for depth, span in tracer.critical_path()]
+
+        assert path == [(0, "run"), (1, "checkout"), (1, "slow"), (2, "slow-build")]
+
+    @staticmethod
+    def _artifact(tracer, name, seconds):
+        with tracer.span(name, "artifact"):
+            with tracer.span(f"{name}-build"):
+                time.sleep(seconds)
+
+    def test_summary_lists_slowest_leaf_spans(self, tracer):
+        with tracer.span("run", "run"):
+            for name, seconds in (("clone", 0.03), ("config", 0.0), ("compile", 0.06)):
+                with tracer.span(name):
+                    time.sleep(seconds)
+
+        summary = tracer.summary(top=2).splitlines()
+
+        assert summary[0] == "Critical path:"
+        slowest = summary[summary.index("Slowest 2 spans:") + 1:]
+        assert [line.split()[-1] for line in slowest] == ["compile", "clone"]
+
+    def test_disabled_tracer_records_nothing(self, tracer):
+        tracer.configure(enabled=False)
+
+        with tracer.span("build") as span:
+            assert span is None
+
+        assert tracer.finished() == []
+
+    def test_oldest_spans_are_dropped_beyond_max_spans(self, tracer):
+        tracer.configure(max_spans=2)
+
+        for name in ("a", "b", "c"):
+            with tracer.span(name):
+                pass
+
+        assert [span.name for span in tracer.finished()] == ["b", "c"]
+
+    def test_builder_commands_are_traced(self, tracer):
+        with tracer.span("build"):
+            run_logged([sys.executable, "-c", "print('hello')"], "build-script", check=True)
+
+        spans = _by_name(tracer)
+        assert spans["build-script"].category == "command"
+        assert spans["build-script"].parent_id == spans["build"].id
+        assert spans["build-script"].args["output_bytes"] == 6
@@ -0,0 +1,74 @@
+import pytest
+import os
+from lib.workspace import active_workspaces, create_workspace, remove_workspace
+
+
+class TestWorkspace:
+    """Test private per-job workspaces."""
+
+    def test_workspace_is_independent_copy(self, temp_repo_dir):
+        """Test writes in a workspace do not reach the source or other workspaces."""
+        os.makedirs(os.path.join(temp_repo_dir, "src"))
+        with open(os.path.join(temp_repo_dir, "src", "main.go"), "w") as f:
+            f.write("package main")
+
+        first = create_workspace(temp_repo_dir, label="ubuntu-22.04")
+        second = create_workspace(temp_repo_dir, label="rhel-9.4")
+        try:
+            with open(os.path.join(first, "src", "main.go"), "w") as f:
+                f.write("changed")
+            with open(os.path.join(first, "out.tar.gz"), "w") as f:
+                f.write("first")
+
+            with open(os.path.join(second, "src", "main.go")) as f:
+                assert f.read() == "package main"
+            with open(os.path.join(temp_repo_dir, "src", "main.go")) as f:
+                assert f.read() == "package main"
+            assert not os.path.exists(os.path.join(second, "out.tar.gz"))
+            assert "ubuntu-22.04" in os.path.basename(first)
+        finally:
+            remove_workspace(first)
+            remove_workspace(second)
+        assert not os.path.exists(first)
+
+    def test_hardlink_workspace_shares_inodes(self, temp_repo_dir):
+        """Test the hardlink strategy links files instead of copying them."""
+        source = os.path.join(temp_repo_dir, "main.go")
+        with open(source, "w") as f:
+            f.write("package main")
+
+        workspace = create_workspace(temp_repo_dir, strategy="hardlink")
+        try:
+            assert os.stat(os.path.join(workspace, "main.go")).st_ino == os.stat(source).st_ino
+        finally:
+            remove_workspace(workspace)
+
+    def test_overlay_workspace_keeps_lower_layer(self, temp_repo_dir):
+        """Test writes to an overlay workspace never reach the snapshot."""
+        import subprocess
+        with open(os.path.join(temp_repo_dir, "main.go"), "w") as f:
+            f.write("package main")
+        try:
+            workspace = create_workspace(temp_repo_dir, strategy="overlay")
+        except (subprocess.CalledProcessError, OSError):
+            pytest.skip("overlayfs mounts not permitted here")
+        try:
+            with open(os.path.join(workspace, "main.go"), "w") as f:
+                f.write("changed")
+            with open(os.path.join(temp_repo_dir, "main.go")) as f:
+                assert f.read() == "package main"
+        finally:
+            remove_workspace(workspace)
+        assert not os.path.exists(os.path.dirname(workspace))
+
+    def test_active_workspaces_are_tracked(self, temp_repo_dir):
+        """Test workspaces count as active from creation until removal, so garbage collection spares them."""
+        workspace = create_workspace(temp_repo_dir, label="gc")
+        assert workspace in active_workspaces()
+
+        remove_workspace(workspace)
+        assert workspace not in active_workspaces()
+
+    def test_unknown_strategy(self, temp_repo_dir):
+        with pytest.raises(ValueError, match="Unknown workspace strategy"):
+            create_workspace(temp_repo_dir, strategy="zfs")